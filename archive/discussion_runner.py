@@ -0,0 +1,260 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import yaml
+from crewai import Agent, Task, Crew, LLM
+
+# --------------------------------------------------------------------
+# 1. 共有レートリミッター・レスポンスキャッシュ
+# --------------------------------------------------------------------
+class RateLimiter:
+    """全パネル共通のレート制限（1分あたりの呼び出し数と同時実行数）"""
+
+    def __init__(self, rpm=0, max_concurrent=8):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+        self.waited = 0.0
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        if self.interval:
+            # 呼び出しの開始時刻を等間隔に割り当てる（バーストでクォータを使い切らないため）
+            with self.lock:
+                now = time.monotonic()
+                slot = max(now, self.next_slot)
+                self.next_slot = slot + self.interval
+                self.waited += slot - now
+            if slot > now:
+                time.sleep(slot - now)
+        return self
+
+    def __exit__(self, *exc):
+        self.semaphore.release()
+        return False
+
+class ResponseCache:
+    """同じプロンプトへの応答を保存し、再実行時にAPIを呼ばずに返すキャッシュ（SQLite）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at TEXT NOT NULL)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(model, temperature, messages):
+        payload = json.dumps([model, temperature, messages], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, response):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+                (key, response, datetime.datetime.now().isoformat(timespec="seconds")),
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class PanelLLM(LLM):
+    """共有のレートリミッターとキャッシュを通してAPIを呼ぶLLM"""
+
+    def __init__(self, limiter, cache=None, max_retries=3, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+        self.cache = cache
+        self.max_retries = max_retries
+        self.api_calls = 0
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None):
+        key = None
+        if self.cache is not None and not tools:
+            key = ResponseCache.make_key(self.model, self.temperature, messages)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.limiter:
+                    self.api_calls += 1
+                    response = super().call(messages, tools=tools, callbacks=callbacks, available_functions=available_functions)
+                break
+            except Exception as e:
+                # 429（クォータ超過）だけは待ってから再試行する
+                if attempt >= self.max_retries or not re.search(r"429|rate.?limit|quota", str(e), re.IGNORECASE):
+                    raise
+                time.sleep(min(2 ** attempt * 5, 60))
+
+        if key is not None and isinstance(response, str):
+            self.cache.put(key, response)
+        return response
+
+# --------------------------------------------------------------------
+# 2. 設定ファイルからパネルを組み立て
+# --------------------------------------------------------------------
+def load_config(path):
+    """YAML設定を読み込み、必須項目を確認"""
+    with open(path, encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+
+    for key in ("agents", "turns", "topics"):
+        if not config.get(key):
+            raise ValueError(f"設定ファイルに {key} がありません: {path}")
+    for i, turn in enumerate(config["turns"]):
+        if turn.get("agent") not in config["agents"]:
+            raise ValueError(f"turns[{i}] のエージェント {turn.get('agent')} が agents にありません")
+    return config
+
+def build_panel(config, llm):
+    """1トピック分のエージェントとタスクを作成（エージェントはパネルごとに独立）"""
+    agents = {
+        agent_id: Agent(
+            role=spec["role"],
+            goal=spec["goal"],
+            backstory=spec["backstory"],
+            verbose=False,
+            allow_delegation=False,
+            llm=llm,
+        )
+        for agent_id, spec in config["agents"].items()
+    }
+    tasks = [
+        Task(
+            description=turn["description"],
+            expected_output=turn.get("expected_output", "300-400文字程度の発言"),
+            agent=agents[turn["agent"]],
+        )
+        for turn in config["turns"]
+    ]
+    return agents, tasks
+
+def run_panel(config, topic, limiter, cache):
+    """1トピックのパネルディスカッションを実行し、発言の一覧を返す"""
+    llm_config = config.get("llm", {})
+    llm = PanelLLM(
+        limiter,
+        cache,
+        model=llm_config.get("model", "gemini/gemini-2.5-flash"),
+        api_key=os.environ.get("GOOGLE_API_KEY"),
+        temperature=llm_config.get("temperature", 0.7),
+    )
+    agents, tasks = build_panel(config, llm)
+    crew = Crew(agents=list(agents.values()), tasks=tasks, verbose=False)
+
+    started = time.perf_counter()
+    result = crew.kickoff(inputs={"topic": topic})
+    turns = [
+        {
+            "agent": turn["agent"],
+            "label": turn.get("label", config["agents"][turn["agent"]]["role"]),
+            "text": output.raw,
+        }
+        for turn, output in zip(config["turns"], result.tasks_output)
+    ]
+    return {
+        "topic": topic,
+        "turns": turns,
+        "elapsed_sec": round(time.perf_counter() - started, 2),
+        "api_calls": llm.api_calls,
+        "total_tokens": getattr(result.token_usage, "total_tokens", 0),
+    }
+
+# --------------------------------------------------------------------
+# 3. メイン実行部分
+# --------------------------------------------------------------------
+def main():
+    """設定ファイルの全トピックを並行実行し、結果をJSONLに書き出す"""
+    parser = argparse.ArgumentParser(description="設定ファイル駆動のパネルディスカッション一括実行")
+    parser.add_argument("config", help="パネル設定（YAML）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="同時に実行するパネル数")
+    parser.add_argument("--rpm", type=int, default=0, help="全パネル合計の1分あたりLLM呼び出し数（0で無制限）")
+    parser.add_argument("--max-concurrent", type=int, default=8, help="同時に送るLLM呼び出し数の上限")
+    parser.add_argument("--cache", default="discussion_logs/response_cache.sqlite3", help="レスポンスキャッシュ（SQLite）")
+    parser.add_argument("--no-cache", action="store_true", help="キャッシュを使わない")
+    parser.add_argument("--output", help="出力先JSONL（既定: discussion_logs/<設定名>_<日時>.jsonl）")
+    parser.add_argument("--topic", action="append", help="設定ファイルのtopicsの代わりに使うトピック（複数指定可）")
+    args = parser.parse_args()
+
+    if not os.environ.get("GOOGLE_API_KEY"):
+        print("❌ GOOGLE_API_KEY環境変数が設定されていません")
+        return 1
+
+    config = load_config(args.config)
+    topics = args.topic or config["topics"]
+    name = os.path.splitext(os.path.basename(args.config))[0]
+    output_path = args.output or os.path.join(
+        "discussion_logs", f"{name}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    )
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    limiter = RateLimiter(rpm=args.rpm, max_concurrent=args.max_concurrent)
+    cache = None if args.no_cache else ResponseCache(args.cache)
+
+    print("=" * 60)
+    print(f"🤖 パネルディスカッション一括実行: {name}")
+    print(f"📋 {len(topics)}トピック × {len(config['turns'])}発言 | 並行{args.workers}パネル | "
+          f"{f'{args.rpm}回/分' if args.rpm else 'レート制限なし'}")
+    print("=" * 60)
+
+    started = time.perf_counter()
+    completed = failed = 0
+    api_calls = 0
+    write_lock = threading.Lock()
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(run_panel, config, topic, limiter, cache): topic for topic in topics}
+        for future in as_completed(futures):
+            topic = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ {topic}: {e}")
+                continue
+            completed += 1
+            api_calls += record["api_calls"]
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+            print(f"✅ [{completed + failed}/{len(topics)}] {topic}（{record['elapsed_sec']}秒・API {record['api_calls']}回）")
+
+    elapsed = time.perf_counter() - started
+    print("-" * 60)
+    print(f"🎉 完了 {completed} / 失敗 {failed} | {elapsed:.1f}秒 | {completed / elapsed * 60 if elapsed else 0:.1f}パネル/分")
+    print(f"📡 API呼び出し {api_calls}回 | レート制限の待ち {limiter.waited:.1f}秒")
+    if cache:
+        print(f"💾 キャッシュ ヒット {cache.hits}回 / ミス {cache.misses}回")
+        cache.close()
+    print(f"📁 出力: {output_path}")
+    return 0 if not failed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
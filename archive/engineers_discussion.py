@@ -1,5 +1,11 @@
 import os
+import time
+import datetime
 from crewai import Agent, Task, Crew, LLM
+from crewai.utilities.events import crewai_event_bus, LLMStreamChunkEvent
+
+# DISCUSSION_STREAM=1 で発言を生成中のトークンから逐次表示する
+STREAM_OUTPUT = os.environ.get("DISCUSSION_STREAM", "").lower() in ("1", "true", "yes", "on")
 
 # --------------------------------------------------------------------
 # 1. LLM（大規模言語モデル）のセットアップ
@@ -15,7 +21,8 @@ def setup_llm():
         llm = LLM(
             model="gemini/gemini-2.5-flash",
             api_key=api_key,
-            temperature=0.7
+            temperature=0.7,
+            stream=STREAM_OUTPUT
         )
         print("✅ LLM初期化成功")
         return llm
@@ -180,7 +187,72 @@ def create_conversation_tasks(developer_a, developer_b, developer_c, developer_d
     return [task1, task2, task3, task4, task5]
 
 # --------------------------------------------------------------------
-# 4. メイン実行部分
+# 4. 発言の逐次記録
+# --------------------------------------------------------------------
+class DiscussionRecorder:
+    """各タスクの完了時に発言を表示し、すぐにファイルへ保存する
+
+    途中のタスクで失敗しても、それまでに完了した発言はディスクに残る。
+    発言ごとに所要時間とトークン数も記録する。
+    """
+
+    def __init__(self, labels, log_dir="discussion_logs"):
+        self.labels = labels
+        os.makedirs(log_dir, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        self.log_file = os.path.join(log_dir, f"engineers_discussion_{timestamp}.md")
+        self.completed = 0
+        self.total_tokens = 0
+        self.last_finished = time.perf_counter()
+        # エージェントごとの累計トークン数（同じエージェントが複数回発言するので差分を取る）
+        self.token_marks = {}
+
+        with open(self.log_file, "w", encoding="utf-8") as f:
+            f.write(f"# AI時代のデベロッパーキャリア ディスカッション\n開始時刻: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+
+    def start(self):
+        """ディスカッション開始時刻を記録"""
+        self.last_finished = time.perf_counter()
+
+    def callback_for(self, index, agent):
+        """タスクに設定する完了コールバックを作成"""
+        def on_complete(output):
+            self.record(index, agent, output)
+        return on_complete
+
+    def record(self, index, agent, output):
+        """1つの発言を表示・保存"""
+        now = time.perf_counter()
+        # sequentialなので、前の発言の完了からこの発言の完了までがこのタスクの所要時間
+        latency = now - self.last_finished
+        self.last_finished = now
+
+        total = agent._token_process.get_summary().total_tokens
+        tokens = total - self.token_marks.get(id(agent), 0)
+        self.token_marks[id(agent)] = total
+        self.total_tokens += tokens
+        self.completed += 1
+
+        label = self.labels[index] if index < len(self.labels) else f"エージェント{index+1}の発言"
+        header = f"{label}（{latency:.1f}秒・{tokens}トークン）"
+        if STREAM_OUTPUT:
+            print()
+        print("-" * 60)
+        print(header)
+        print("-" * 60)
+        print(output.raw)
+        print()
+
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            f.write(f"## {header}\n\n{output.raw}\n\n")
+            f.flush()
+
+def print_stream_chunk(source, event):
+    """ストリーミング中のトークンをそのまま表示"""
+    print(event.chunk, end="", flush=True)
+
+# --------------------------------------------------------------------
+# 5. メイン実行部分
 # --------------------------------------------------------------------
 def main():
     """メイン実行関数"""
@@ -208,12 +280,25 @@ def main():
     tasks = create_conversation_tasks(developer_a, developer_b, developer_c, developer_d)
     print("✅ 5つの会話タスクを作成しました")
     
+    # 各タスクの完了時に発言を表示・保存
+    agent_names = [
+        "シニアソフトウェアエンジニア（40代）の発言",
+        "シニアバックエンドデベロッパー（30代後半）の発言", 
+        "シニアフロントエンドデベロッパー（40代）の発言",
+        "ジュニアデベロッパー（20代）の発言",
+        "シニアソフトウェアエンジニア（40代）のアドバイス"
+    ]
+    recorder = DiscussionRecorder(agent_names)
+    for i, task in enumerate(tasks):
+        task.callback = recorder.callback_for(i, task.agent)
+    print(f"📁 発言は完了するたびに {recorder.log_file} へ保存されます")
+    
     # クルー作成
     print("\n🚀 クルー結成中...")
     crew = Crew(
         agents=[developer_a, developer_b, developer_c, developer_d],
         tasks=tasks,
-        verbose=True
+        verbose=not STREAM_OUTPUT
     )
     print("✅ 4人のエンジニアクルーを結成しました")
     
@@ -222,37 +307,23 @@ def main():
     print("-" * 60)
     
     try:
-        result = crew.kickoff()
+        recorder.start()
+        if STREAM_OUTPUT:
+            with crewai_event_bus.scoped_handlers():
+                crewai_event_bus.register_handler(LLMStreamChunkEvent, print_stream_chunk)
+                crew.kickoff()
+        else:
+            crew.kickoff()
         
         print("\n" + "=" * 60)
         print("🎉 ディスカッション完了！")
+        print(f"📊 {recorder.completed}発言 | 合計{recorder.total_tokens}トークン")
+        print(f"📁 保存先: {recorder.log_file}")
         print("=" * 60)
-        print("\n📝 会話の結果:")
-        
-        # 各タスクの結果を個別に表示
-        if hasattr(result, 'tasks_output') and result.tasks_output:
-            agent_names = [
-                "シニアソフトウェアエンジニア（40代）の発言",
-                "シニアバックエンドデベロッパー（30代後半）の発言", 
-                "シニアフロントエンドデベロッパー（40代）の発言",
-                "ジュニアデベロッパー（20代）の発言",
-                "シニアソフトウェアエンジニア（40代）のアドバイス"
-            ]
-            
-            for i, task_output in enumerate(result.tasks_output):
-                print("-" * 60)
-                if i < len(agent_names):
-                    print(agent_names[i])
-                else:
-                    print(f"エージェント{i+1}の発言")
-                print("-" * 60)
-                print(task_output.raw)
-                print()
-        
-        print("-" * 60)
         
     except Exception as e:
         print(f"\n❌ エラーが発生しました: {e}")
+        print(f"💾 完了済みの{recorder.completed}発言は {recorder.log_file} に保存済みです")
         print("\n🔍 詳細なエラー情報:")
         import traceback
         traceback.print_exc()
@@ -0,0 +1,299 @@
+# CrewAI人狼ゲーム - ゲーム横断の統計分析（NumPyによるベクトル演算）
+import sys
+import time
+import sqlite3
+import argparse
+import numpy as np
+from werewolf_catalog import CATALOG_PATH
+from werewolf_search import TranscriptIndex
+
+# 役職・陣営のコード（配列の値として使う）
+ROLES = ['werewolf', 'madman', 'fortune_teller', 'knight', 'citizen']
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+WEREWOLF = ROLE_CODES['werewolf']
+FORTUNE_TELLER = ROLE_CODES['fortune_teller']
+
+# 陣営（狂人は人狼陣営）
+TEAMS = ['village', 'werewolves']
+ROLE_TEAM = np.array([1, 1, 0, 0, 0], dtype=np.int8)
+VILLAGE_ROLE = ROLE_TEAM == 0
+
+MAX_SEATS = 9
+NO_VALUE = -1
+
+# 記録されていない統計をレポートで「未記録」と表示するときの説明
+NOT_RECORDED = {
+    'winner': "勝敗を記録したゲームがありません。勝者は予算切れで打ち切ったゲームの判定時にしか記録されません",
+    'deaths': "死亡者を記録したゲームがありません。ゲーム本体は死亡者を記録していません",
+}
+
+# 投票発言「【投票】○○に投票します。」から投票先をSQLite側で切り出す（Pythonで1行ずつ解析しない）
+VOTES_QUERY = """
+WITH marked AS (
+    SELECT game_id, day, speaker, substr(text, instr(text, '【投票】') + 4) AS rest
+    FROM speeches
+    WHERE phase = 'vote' AND instr(text, '【投票】') > 0
+), targets AS (
+    SELECT game_id, day, speaker, trim(substr(rest, 1, instr(rest, 'に投票') - 1)) AS target
+    FROM marked
+    WHERE instr(rest, 'に投票') > 0
+)
+SELECT t.game_id, t.day, voter.seat, target.seat
+FROM targets t
+JOIN games g ON g.game_id = t.game_id
+JOIN game_players voter ON voter.game_id = t.game_id AND voter.player = t.speaker
+JOIN game_players target ON target.game_id = t.game_id AND target.player =
+    CASE WHEN t.target LIKE '%さん' THEN substr(t.target, 1, length(t.target) - 2) ELSE t.target END
+{where}
+"""
+
+# --------------------------------------------------------------------
+# 1. ゲームデータの読み込み
+# --------------------------------------------------------------------
+class GameArrays:
+    """複数ゲームの配役・勝敗・投票をNumPy配列にまとめたもの
+
+    game_ids: (G,)       カタログのgame_id
+    winner:   (G,)       0=村人陣営, 1=人狼陣営, -1=不明
+    days:     (G,)       経過日数
+    roles:    (G, S)     席ごとの役職コード（空席は-1）
+    survived: (G, S)     生存していれば1（死亡者を記録しないゲームでは全員1）
+    votes:    (G, D, S)  日ごと・投票者ごとの投票先の席（投票なしは-1）
+    """
+
+    def __init__(self, game_ids, winner, days, roles, survived, votes):
+        self.game_ids = game_ids
+        self.winner = winner
+        self.days = days
+        self.roles = roles
+        self.survived = survived
+        self.votes = votes
+
+    def __len__(self):
+        return len(self.game_ids)
+
+def load_games(db_path=CATALOG_PATH, mode=None, since=None, until=None, finished_only=True, game_ids=None):
+    """カタログと発言インデックスから全ゲームを配列に読み込む（SQLは3回だけ）"""
+    # 発言テーブルが無い古いカタログでも動くように作成しておく
+    TranscriptIndex(db_path).close()
+    conn = sqlite3.connect(db_path, timeout=30)
+
+    conditions = []
+    params = []
+    if mode:
+        conditions.append("g.mode = ?")
+        params.append(mode)
+    if since:
+        conditions.append("g.started_at >= ?")
+        params.append(since)
+    if until:
+        conditions.append("g.started_at < ?")
+        params.append(until)
+    if finished_only:
+        conditions.append("g.finished_at IS NOT NULL")
+    if game_ids is not None:
+        conditions.append(f"g.game_id IN ({', '.join('?' * len(game_ids)) or 'NULL'})")
+        params.extend(game_ids)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    # ゲーム単位の情報
+    game_rows = conn.execute(
+        f"""SELECT g.game_id,
+                   CASE g.winner WHEN 'village' THEN 0 WHEN 'werewolves' THEN 1 ELSE -1 END,
+                   g.days
+            FROM games g {where} ORDER BY g.game_id""",
+        params,
+    ).fetchall()
+    games = np.array(game_rows, dtype=np.int64).reshape(-1, 3)
+    game_ids = games[:, 0]
+    count = len(game_ids)
+    max_days = int(games[:, 2].max()) if count else 0
+
+    # 席ごとの配役
+    role_case = " ".join(f"WHEN '{role}' THEN {code}" for role, code in ROLE_CODES.items())
+    player_rows = conn.execute(
+        f"""SELECT p.game_id, p.seat, CASE p.role {role_case} ELSE -1 END, p.survived
+            FROM game_players p JOIN games g ON g.game_id = p.game_id {where}""",
+        params,
+    ).fetchall()
+    players = np.array(player_rows, dtype=np.int64).reshape(-1, 4)
+
+    # 投票
+    vote_rows = conn.execute(VOTES_QUERY.format(where=where), params).fetchall()
+    votes_flat = np.array(vote_rows, dtype=np.int64).reshape(-1, 4)
+    conn.close()
+
+    # game_idを配列の行番号に変換し、まとめて散布代入する
+    roles = np.full((count, MAX_SEATS), NO_VALUE, dtype=np.int8)
+    survived = np.zeros((count, MAX_SEATS), dtype=np.int8)
+    votes = np.full((count, max(max_days, 1), MAX_SEATS), NO_VALUE, dtype=np.int8)
+
+    if len(players):
+        rows = np.searchsorted(game_ids, players[:, 0])
+        seats = players[:, 1]
+        in_range = seats < MAX_SEATS
+        roles[rows[in_range], seats[in_range]] = players[in_range, 2]
+        survived[rows[in_range], seats[in_range]] = players[in_range, 3]
+
+    if len(votes_flat):
+        rows = np.searchsorted(game_ids, votes_flat[:, 0])
+        day_index = votes_flat[:, 1] - 1
+        valid = (day_index >= 0) & (day_index < votes.shape[1]) & (votes_flat[:, 2] < MAX_SEATS) & (votes_flat[:, 3] < MAX_SEATS)
+        votes[rows[valid], day_index[valid], votes_flat[valid, 2]] = votes_flat[valid, 3]
+
+    return GameArrays(game_ids, games[:, 1].astype(np.int8), games[:, 2].astype(np.int16), roles, survived, votes)
+
+# --------------------------------------------------------------------
+# 2. 集計関数（ゲームごとのPythonループは使わない）
+# --------------------------------------------------------------------
+def vote_matrix(data, day):
+    """指定日の投票者×投票先の行列（全ゲーム合計、席番号ベース）"""
+    day_votes = data.votes[:, day - 1, :]
+    voters = np.broadcast_to(np.arange(MAX_SEATS), day_votes.shape)
+    cast = day_votes >= 0
+    matrix = np.zeros((MAX_SEATS, MAX_SEATS), dtype=np.int64)
+    np.add.at(matrix, (voters[cast], day_votes[cast]), 1)
+    return matrix
+
+def role_vote_matrix(data):
+    """投票者の役職×投票先の役職の行列（全日・全ゲーム合計）"""
+    voter_roles = np.broadcast_to(data.roles[:, None, :], data.votes.shape)
+    target_roles = np.take_along_axis(
+        np.broadcast_to(data.roles[:, None, :], data.votes.shape),
+        np.clip(data.votes, 0, None).astype(np.int64),
+        axis=2,
+    )
+    cast = (data.votes >= 0) & (voter_roles >= 0) & (target_roles >= 0)
+    matrix = np.zeros((len(ROLES), len(ROLES)), dtype=np.int64)
+    np.add.at(matrix, (voter_roles[cast], target_roles[cast]), 1)
+    return matrix
+
+def plurality_targets(data):
+    """日ごとの最多得票の席（同数なら若い席、投票なしは-1）: (G, D)"""
+    one_hot = data.votes[..., None] == np.arange(MAX_SEATS)
+    tally = one_hot.sum(axis=2)
+    top = tally.argmax(axis=2)
+    return np.where(tally.max(axis=2) > 0, top, NO_VALUE)
+
+def first_werewolf_voted_day(data):
+    """人狼が初めて最多得票になった日（1始まり、無ければ0）: (G,)"""
+    top = plurality_targets(data)
+    top_roles = np.take_along_axis(data.roles, np.clip(top, 0, None), axis=1)
+    hit = (top >= 0) & (top_roles == WEREWOLF)
+    return np.where(hit.any(axis=1), hit.argmax(axis=1) + 1, 0)
+
+def win_rates(data):
+    """陣営ごとの勝率（勝者が判定されたゲームのみ）"""
+    decided = data.winner >= 0
+    total = int(decided.sum())
+    wins = np.bincount(data.winner[decided], minlength=len(TEAMS))
+    return {team: (wins[i] / total if total else float('nan')) for i, team in enumerate(TEAMS)}, total
+
+def role_outcome_table(data):
+    """役職×勝敗のテーブル: (役職数, 2) 列0=勝ち, 列1=負け"""
+    decided = (data.winner >= 0)[:, None] & (data.roles >= 0)
+    player_team = ROLE_TEAM[np.clip(data.roles, 0, None)]
+    won = player_team == data.winner[:, None]
+    table = np.zeros((len(ROLES), 2), dtype=np.int64)
+    np.add.at(table, (data.roles[decided], (~won[decided]).astype(np.int64)), 1)
+    return table
+
+def villager_vote_accuracy(data):
+    """村人陣営の投票のうち人狼に入った割合（全体と日別）"""
+    voter_roles = np.broadcast_to(data.roles[:, None, :], data.votes.shape)
+    target_roles = np.take_along_axis(
+        np.broadcast_to(data.roles[:, None, :], data.votes.shape),
+        np.clip(data.votes, 0, None).astype(np.int64),
+        axis=2,
+    )
+    village_votes = (data.votes >= 0) & (voter_roles >= 0) & VILLAGE_ROLE[np.clip(voter_roles, 0, None)]
+    correct = village_votes & (target_roles == WEREWOLF)
+
+    per_day_total = village_votes.sum(axis=(0, 2))
+    per_day_correct = correct.sum(axis=(0, 2))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        per_day = per_day_correct / per_day_total
+    total = village_votes.sum()
+    overall = correct.sum() / total if total else float('nan')
+    return overall, per_day, int(total)
+
+def deaths_recorded(data):
+    """死亡者が記録されているゲーム（誰か1人でも死亡扱いの席がある）: (G,)
+
+    survived の既定値は1なので、死亡者を記録しないゲームでは全員が生存扱いになる。
+    そのようなゲームを生存率の集計に含めると、常に全員生存として数えてしまう。
+    """
+    return ((data.survived == 0) & (data.roles >= 0)).any(axis=1)
+
+def fortune_teller_survival(data):
+    """占い師がゲーム終了時に生存していた割合（死亡者が記録されたゲームのみ。無ければNaN）"""
+    is_fortune_teller = data.roles == FORTUNE_TELLER
+    games_with_ft = is_fortune_teller.any(axis=1) & deaths_recorded(data)
+    alive = (is_fortune_teller & (data.survived == 1)).any(axis=1)
+    count = int(games_with_ft.sum())
+    return (alive[games_with_ft].mean() if count else float('nan')), count
+
+# --------------------------------------------------------------------
+# 3. レポート
+# --------------------------------------------------------------------
+def format_report(data):
+    """集計結果をテキストレポートにまとめる"""
+    lines = [f"📊 分析対象: {len(data)}ゲーム"]
+
+    rates, decided = win_rates(data)
+    if decided:
+        lines.append(f"🏆 勝率（勝敗判定あり {decided}ゲーム）: 村人陣営 {rates['village']:.1%} | 人狼陣営 {rates['werewolves']:.1%}")
+    else:
+        lines.append(f"🏆 勝率: 未記録（{NOT_RECORDED['winner']}）")
+
+    accuracy, per_day, vote_count = villager_vote_accuracy(data)
+    day_text = " | ".join(f"{d + 1}日目 {rate:.1%}" for d, rate in enumerate(per_day) if not np.isnan(rate))
+    lines.append(f"🎯 村人陣営の人狼投票率: {accuracy:.1%}（{vote_count}票） {day_text}")
+
+    first_day = first_werewolf_voted_day(data)
+    found = first_day > 0
+    mean_day = first_day[found].mean() if found.any() else float('nan')
+    lines.append(f"🐺 人狼が最多得票になったゲーム: {found.mean() if len(data) else float('nan'):.1%}（平均 {mean_day:.2f}日目）")
+
+    survival, ft_games = fortune_teller_survival(data)
+    if ft_games:
+        lines.append(f"🔮 占い師の生存率: {survival:.1%}（死亡者の記録あり {ft_games}ゲーム）")
+    else:
+        lines.append(f"🔮 占い師の生存率: 未記録（{NOT_RECORDED['deaths']}）")
+
+    lines.append("\n役職別の勝敗:")
+    table = role_outcome_table(data)
+    if not table.any():
+        lines.append(f"  未記録（{NOT_RECORDED['winner']}）")
+    for code, role in enumerate(ROLES if table.any() else []):
+        wins, losses = table[code]
+        total = wins + losses
+        lines.append(f"  {role:<15} 勝ち {wins:>6} | 負け {losses:>6} | 勝率 {wins / total if total else float('nan'):.1%}")
+
+    lines.append("\n投票者の役職 → 投票先の役職:")
+    matrix = role_vote_matrix(data)
+    lines.append("  " + " " * 15 + "".join(f"{role[:8]:>10}" for role in ROLES))
+    for code, role in enumerate(ROLES):
+        lines.append(f"  {role:<15}" + "".join(f"{n:>10}" for n in matrix[code]))
+    return "\n".join(lines)
+
+def main():
+    """カタログ全体の統計を表示"""
+    parser = argparse.ArgumentParser(description="人狼ゲームのゲーム横断統計")
+    parser.add_argument("--db", default=CATALOG_PATH)
+    parser.add_argument("--mode", choices=["open", "anonymous"])
+    parser.add_argument("--since", help="YYYY-MM-DD 以降")
+    parser.add_argument("--until", help="YYYY-MM-DD より前")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    data = load_games(args.db, mode=args.mode, since=args.since, until=args.until)
+    loaded = time.perf_counter()
+    report = format_report(data)
+    finished = time.perf_counter()
+
+    print(report)
+    print(f"\n⏱️ 読み込み {loaded - started:.2f}秒 | 集計 {finished - loaded:.2f}秒")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+# CrewAI人狼ゲーム - ルールベースのボットプレイヤー
+import os
+import numpy as np
+from werewolf_config import env_number
+from werewolf_validator import OutputSpec, FORMAT_VERBS
+
+# ボットに置き換えられる役職（人狼と占い師はLLMのまま）
+BOT_ROLES = ('citizen', 'madman', 'knight')
+
+# --------------------------------------------------------------------
+# 1. 疑い度の計算（情報整理表から）
+# --------------------------------------------------------------------
+def suspicion_scores(ledger, day, candidates):
+    """情報整理表から各候補者の疑い度を計算（黒出し+3・白出し-2・前日の得票+1/票）"""
+    scores = {name: 0.0 for name in candidates}
+    if ledger is None:
+        return scores
+
+    stored = min(ledger.fortune_count, len(ledger.fortune))
+    for _, _, target, result in ledger.fortune[:stored]:
+        name = ledger.players[target]
+        if name in scores:
+            scores[name] += 3.0 if result == 1 else -2.0
+
+    tally = ledger.vote_tally(day - 1)
+    for seat in np.flatnonzero(tally):
+        name = ledger.players[seat]
+        if name in scores:
+            scores[name] += float(tally[seat])
+    return scores
+
+# --------------------------------------------------------------------
+# 2. ボットクラス
+# --------------------------------------------------------------------
+class BotPlayer:
+    """LLMの代わりに定型の判断で発言・投票・夜行動をするプレイヤー（市民の投票ヒューリスティック）
+
+    出力はLLMのタスクと同じ形式（【投票】○○に投票します。など）で、形式はタスクの説明文から読み取る。
+    """
+
+    def __init__(self, name, role, game_state):
+        self.name = name
+        self.role = role
+        self.game_state = game_state
+        self.rng = game_state.rng
+
+    def respond(self, task, kind):
+        """タスクの種類に応じた出力を返す"""
+        spec = OutputSpec.from_task(task, kind)
+        others = [name for name in spec.candidates if name != self.name]
+        if kind == 'vote':
+            return self.vote(spec, others)
+        if kind == 'night_action':
+            return self.night_action(spec, others)
+        return self.discuss(others)
+
+    def pick_suspect(self, others):
+        """最も疑わしい候補者（同点はランダム）"""
+        if not others:
+            return None
+        scores = suspicion_scores(self.game_state.ledger, self.game_state.day_count, others)
+        best = max(scores.values())
+        return self.rng.choice([name for name, score in scores.items() if score == best])
+
+    def reason_for(self, target):
+        """疑っている理由の定型文"""
+        ledger = self.game_state.ledger
+        if ledger is not None and target in ledger.index:
+            seat = ledger.index[target]
+            stored = min(ledger.fortune_count, len(ledger.fortune))
+            if ((ledger.fortune[:stored, 2] == seat) & (ledger.fortune[:stored, 3] == 1)).any():
+                return f"{target}さんには人狼だという占い結果が出ているからです。"
+            if ledger.vote_tally(self.game_state.day_count - 1)[seat] > 0:
+                return f"前日に{target}さんへ票が集まっており、その後の弁明にも納得できなかったからです。"
+        return f"{target}さんの発言は様子見が多く、村のための情報がほとんど出ていないからです。"
+
+    def discuss(self, others):
+        target = self.pick_suspect(others)
+        if target is None:
+            return "まだ判断材料が少ないので、皆さんの意見を聞いてから考えたいと思います。"
+        return (
+            f"私は{target}さんが一番怪しいと思います。{self.reason_for(target)}"
+            f"{target}さんには、昨日から今日にかけて誰を疑っているのか、その理由と一緒に説明してほしいです。"
+            "占い師を名乗る人がいれば、結果をすべて出してもらえると推理が進むと思います。"
+        )
+
+    def vote(self, spec, others):
+        target = self.pick_suspect(others)
+        if target is None:
+            return "【投票】今回は棄権します。\n理由：投票できる相手がいないためです。"
+        return f"【投票】{target}に投票します。\n理由：{self.reason_for(target)}"
+
+    def night_action(self, spec, others):
+        return "（今夜は行動を見送ります）"
+
+class KnightBot(BotPlayer):
+    """ランダムに護衛先を選ぶ騎士（昼は市民と同じ判断）"""
+
+    def night_action(self, spec, others):
+        if not spec.tag or not others:
+            return super().night_action(spec, others)
+        target = self.rng.choice(others)
+        return f"【{spec.tag}】{target}{FORMAT_VERBS[spec.tag]}。理由：誰が狙われるか読めないので、今夜は{target}さんを守ります。"
+
+class MadmanBot(BotPlayer):
+    """初日に占い師を騙り、毎日ランダムな相手に黒出しする狂人"""
+
+    def __init__(self, name, role, game_state):
+        super().__init__(name, role, game_state)
+        self.fake_blacks = []
+
+    def fake_target(self, others):
+        """その日の黒出し先（日ごとに1人、まだ黒出ししていない相手から選ぶ）"""
+        day = self.game_state.day_count
+        if len(self.fake_blacks) < day:
+            fresh = [name for name in others if name not in self.fake_blacks] or others
+            self.fake_blacks.append(self.rng.choice(fresh) if fresh else None)
+        return self.fake_blacks[day - 1]
+
+    def discuss(self, others):
+        target = self.fake_target(others)
+        if target is None:
+            return super().discuss(others)
+        if self.game_state.day_count == 1:
+            return (
+                f"私は占い師COします。昨夜{target}さんを占った結果、人狼でした。"
+                f"{target}さんは今日の処刑先として最優先だと思います。他に占い師を名乗る人がいれば、その人は偽物です。"
+            )
+        return (
+            f"占い師として今日の結果を報告します。{target}さんは人狼でした。"
+            f"これまでの黒出しと合わせて、{target}さんから順に処刑していきましょう。"
+        )
+
+    def vote(self, spec, others):
+        target = self.fake_target(others)
+        if target is None:
+            return super().vote(spec, others)
+        return f"【投票】{target}に投票します。\n理由：私の占いで{target}さんが人狼と出たからです。"
+
+BOT_CLASSES = {'citizen': BotPlayer, 'madman': MadmanBot, 'knight': KnightBot}
+
+# --------------------------------------------------------------------
+# 3. テンプレートのゲームマスター
+# --------------------------------------------------------------------
+# 朝の発表の言い回し（毎日同じ文にならないよう、部品ごとにランダムに選ぶ）
+GM_OPENINGS = (
+    "{day}日目の朝を迎えました。",
+    "皆さん、おはようございます。{day}日目の朝です。",
+    "夜が明け、{day}日目が始まりました。",
+    "静かな夜が終わり、{day}日目の朝がやってきました。",
+)
+GM_FIRST_NIGHT = (
+    "初日の夜は襲撃が行われないため、全員が無事に朝を迎えています。",
+    "初日なので犠牲者はいません。まずはお互いの様子をよく観察しましょう。",
+)
+GM_PEACEFUL_NIGHT = (
+    "昨夜は誰も犠牲になりませんでした。",
+    "昨夜の犠牲者はいません。平和な朝となりました。",
+    "幸いにも、昨夜は誰も命を落としませんでした。",
+)
+GM_VICTIMS = (
+    "残念ながら、昨夜{victims}さんが無残な姿で発見されました。",
+    "悲しいお知らせです。昨夜{victims}さんが犠牲になりました。",
+)
+GM_ALIVE = (
+    "現在の生存者は{count}名、{names}です。",
+    "生き残っているのは{names}の{count}名です。",
+)
+GM_CLOSINGS = (
+    "それでは議論を始めてください。人狼を見つけ出しましょう。",
+    "村の平和のため、活発な議論をお願いします。",
+    "怪しい人物はいないか、しっかり話し合ってください。議論開始です。",
+    "夕方の投票に向けて、議論を始めましょう。",
+)
+
+class GameMasterBot:
+    """ゲームの状態から朝の発表を組み立てるゲームマスター（LLMを呼ばない）
+
+    日数・生存者・死亡者はゲームの状態にすべてあるので、定型文の組み合わせで発表する。
+    """
+
+    def __init__(self, game_state):
+        self.name = 'game_master'
+        self.role = 'game_master'
+        self.game_state = game_state
+        self.rng = game_state.rng
+        self.announced_dead = []
+        self.last_used = {}
+
+    def respond(self, task, kind):
+        return self.announce()
+
+    def pick(self, pool):
+        """言い回しを1つ選ぶ（前日と同じ文は避ける）"""
+        choices = [text for text in pool if text != self.last_used.get(pool)] or list(pool)
+        self.last_used[pool] = self.rng.choice(choices)
+        return self.last_used[pool]
+
+    def announce(self):
+        """朝の発表（前回の発表から増えた死亡者を昨夜の犠牲者として伝える）"""
+        day = self.game_state.day_count
+        alive = [name for name in self.game_state.alive_players if name != 'game_master']
+        victims = [name for name in self.game_state.dead_players if name not in self.announced_dead]
+        self.announced_dead.extend(victims)
+
+        if day == 1:
+            night = self.pick(GM_FIRST_NIGHT)
+        elif victims:
+            night = self.pick(GM_VICTIMS).format(victims="さん、".join(victims))
+        else:
+            night = self.pick(GM_PEACEFUL_NIGHT)
+        return "".join((
+            self.pick(GM_OPENINGS).format(day=day),
+            night,
+            self.pick(GM_ALIVE).format(count=len(alive), names="、".join(alive)),
+            self.pick(GM_CLOSINGS),
+        ))
+
+# --------------------------------------------------------------------
+# 4. ボット席の割り当て
+# --------------------------------------------------------------------
+def assign_bot_seats(game_state, agents, count=None):
+    """市民・狂人・騎士の中からcount席をボットにし、{エージェントのid: ボット}を返す
+
+    環境変数:
+        WEREWOLF_BOT_SEATS  ボットにする席数（既定: 0、最大は市民・狂人・騎士の人数）
+    """
+    count = env_number("WEREWOLF_BOT_SEATS", 0) if count is None else count
+    eligible = [name for name in game_state.alive_players if game_state.player_role_mapping.get(name) in BOT_ROLES]
+    if count <= 0:
+        return {}
+    if count > len(eligible):
+        print(f"⚠️ ボットにできるのは市民・狂人・騎士の{len(eligible)}席までです（指定: {count}）")
+        count = len(eligible)
+
+    bots = {}
+    for name in sorted(game_state.rng.sample(eligible, count), key=game_state.alive_players.index):
+        role = game_state.player_role_mapping[name]
+        bots[id(agents[name])] = BOT_CLASSES[role](name, role, game_state)
+    return bots
+
+def assign_game_master(game_state, agents, mode=None):
+    """ゲームマスターをテンプレートで動かす場合は{エージェントのid: ボット}を返す
+
+    環境変数:
+        WEREWOLF_GM_MODE  template=定型文で発表（既定、LLM呼び出しなし） / llm=LLMのゲームマスターが発表
+    """
+    mode = (os.environ.get("WEREWOLF_GM_MODE") or "template") if mode is None else mode
+    if mode.strip().lower() == "llm":
+        return {}
+    return {id(agents['game_master']): GameMasterBot(game_state)}
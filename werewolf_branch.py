@@ -0,0 +1,277 @@
+# CrewAI人狼ゲーム - 記録したゲームからの分岐実行（what-if）
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import subprocess
+import collections
+from werewolf_config import env_flag
+
+REPLAY_DIR = "warewolf_logs/replays"
+BRANCH_DIR = "warewolf_logs/branches"
+GAME_SCRIPTS = {
+    "open": "werewolf_game_open_mode.py",
+    "anonymous": "werewolf_game_anonymous_mode.py",
+}
+# 記録に残さない（分岐の実行ごとに変わる）環境変数
+BRANCH_ENV_KEYS = ("WEREWOLF_RECORD", "WEREWOLF_REPLAY", "WEREWOLF_FORK_AT", "WEREWOLF_BRANCH", "WEREWOLF_BRANCH_RESULT", "WEREWOLF_SEED")
+
+# --------------------------------------------------------------------
+# 1. 応答の記録と再生
+# --------------------------------------------------------------------
+def response_key(task, kind):
+    """タスクの応答を引くキー（種類・エージェント・プロンプトが同じなら同じ応答を返す）"""
+    text = f"{kind}\0{task.agent.role}\0{task.description}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class BranchPoint:
+    """ゲームの全タスクの最終応答を記録し、分岐実行では分岐点までの応答を記録から再生する
+
+    ゲームは「シード＋LLMの応答」で決まるので、同じシードで分岐点までの応答を記録から返せば、
+    ゲーム状態・発言記録・乱数の状態をLLMを呼ばずに分岐点まで再構成できる（記録が分岐点のスナップショット）。
+    分岐点で乱数を分岐ごとに切り替え、以降だけ実際にLLMを呼ぶので、K本の分岐の費用は分岐後の呼び出しだけで済む。
+    ボット席は乱数を消費するので再生せず、毎回実行する（LLMは呼ばない）。
+
+    環境変数:
+        WEREWOLF_RECORD         1で全タスクの最終応答を warewolf_logs/replays/ に記録する（分岐の元になる）（既定: 無効）
+        WEREWOLF_REPLAY         分岐元の記録ファイル（werewolf_branch.py が設定）
+        WEREWOLF_FORK_AT        分岐点のフェーズ（例: 2日目_投票）。このフェーズが始まるまで記録を再生する
+        WEREWOLF_BRANCH         分岐番号（分岐点以降の乱数を分岐ごとに変える）
+        WEREWOLF_BRANCH_RESULT  分岐の結果（JSON）の書き出し先（werewolf_branch.py が設定）
+    """
+
+    def __init__(self, game_label, record=None, replay_path=None, fork_at=None, branch=None, replay_dir=REPLAY_DIR, log=print):
+        self.record = env_flag("WEREWOLF_RECORD") if record is None else record
+        self.replay_path = os.environ.get("WEREWOLF_REPLAY") if replay_path is None else replay_path
+        self.fork_at = os.environ.get("WEREWOLF_FORK_AT", "") if fork_at is None else fork_at
+        self.branch = int(os.environ.get("WEREWOLF_BRANCH") or 0) if branch is None else branch
+        self.result_path = os.environ.get("WEREWOLF_BRANCH_RESULT")
+        self.log = log
+        self.lock = threading.Lock()
+        self.phase = "準備"
+        self.stats = collections.Counter()
+
+        # 分岐元の応答（キーごとに記録順のキュー。同じプロンプトが複数回あっても順番に返す）
+        self.cache = collections.defaultdict(collections.deque)
+        self.replaying = bool(self.replay_path)
+        if self.replaying:
+            for entry in load_replay(self.replay_path)["responses"]:
+                self.cache[entry["key"]].append(entry["text"])
+
+        self.file = None
+        self.path = None
+        if self.record:
+            os.makedirs(replay_dir, exist_ok=True)
+            label = os.path.splitext(os.path.basename(game_label))[0]
+            self.path = os.path.join(replay_dir, f"{label}.replay.jsonl")
+
+    @property
+    def enabled(self):
+        return self.record or bool(self.replay_path)
+
+    def attach(self, guard):
+        """KickoffGuardの各タスクを記録・再生させる"""
+        guard.replay = self if self.enabled else None
+
+    def start(self, mode, seed):
+        """記録ファイルの先頭に、再現に必要な情報（モード・シード・設定）を書く"""
+        if not self.record:
+            return
+        env = {key: value for key, value in os.environ.items() if key.startswith("WEREWOLF_") and key not in BRANCH_ENV_KEYS}
+        self.file = open(self.path, "w", encoding="utf-8")
+        self._write({"mode": mode, "seed": seed, "env": env, "forked_from": self.replay_path, "fork_at": self.fork_at or None})
+
+    def _write(self, entry):
+        if self.file is None:
+            return
+        with self.lock:
+            self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.file.flush()
+
+    def begin(self, name, game_state):
+        """フェーズの開始。分岐点に着いたら再生をやめ、乱数を分岐ごとに切り替える"""
+        self.phase = name
+        self._write({"phase": name})
+        if not self.replaying or name != self.fork_at:
+            return
+        self.replaying = False
+        self.cache.clear()
+        game_state.rng.seed(f"{game_state.seed}/{self.branch}")
+        self.log(f"🔀 {name}で分岐しました（分岐{self.branch}・記録から再生 {self.stats['replayed']}回）")
+
+    def key(self, task, kind):
+        """タスクの応答を引くキー（予算による文字数の短縮などでプロンプトを書き換える前に求める）"""
+        return response_key(task, kind)
+
+    def lookup(self, key, kind):
+        """分岐点より前なら記録した応答を返す（記録に無ければNoneで、実際に呼び出す）"""
+        if not self.replaying:
+            return None
+        with self.lock:
+            queue = self.cache.get(key)
+            if not queue:
+                # 記録時とプロンプトが変わっている（設定やコードの違い）。このタスクは実際に呼び出す
+                self.stats["diverged"] += 1
+                return None
+            self.stats["replayed"] += 1
+            text = queue.popleft()
+        # 分岐の記録にも分岐前の応答を残し、分岐からさらに分岐できるようにする
+        self._write({"key": key, "kind": kind, "phase": self.phase, "text": text})
+        return text
+
+    def store(self, key, kind, text):
+        """実行したタスクの最終応答を記録"""
+        with self.lock:
+            self.stats["live"] += 1
+        self._write({"key": key, "kind": kind, "phase": self.phase, "text": text})
+
+    def finish(self, game_state):
+        """記録を閉じ、分岐実行なら結果を書き出す"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if not self.result_path:
+            return
+        ledger = game_state.ledger
+        top_votes = {}
+        if ledger is not None:
+            for day in range(1, game_state.day_count + 1):
+                tally = ledger.vote_tally(day)
+                if tally.any():
+                    top_votes[day] = [ledger.players[seat] for seat in range(len(tally)) if tally[seat] == tally.max()]
+        result = {
+            "branch": self.branch,
+            "winner": game_state.winner,
+            "days": game_state.day_count,
+            "top_votes": top_votes,
+            "replayed": self.stats["replayed"],
+            "live": self.stats["live"],
+            "diverged": self.stats["diverged"],
+        }
+        with open(self.result_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+
+    def format_report(self):
+        """記録・再生の統計"""
+        parts = [f"記録から再生 {self.stats['replayed']}回", f"実行 {self.stats['live']}回"]
+        if self.stats["diverged"]:
+            parts.append(f"記録と食い違い {self.stats['diverged']}回")
+        if self.path:
+            parts.append(f"記録: {self.path}")
+        return "🔀 分岐: " + " | ".join(parts)
+
+def load_replay(path):
+    """記録ファイルを {header, phases, responses} に読み込む"""
+    with open(path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    if not entries or "seed" not in entries[0]:
+        raise ValueError(f"記録ファイルの形式が不正です: {path}")
+    phases = [entry["phase"] for entry in entries[1:] if set(entry) == {"phase"}]
+    responses = [entry for entry in entries[1:] if "key" in entry]
+    return {"header": entries[0], "phases": phases, "responses": responses}
+
+# --------------------------------------------------------------------
+# 2. 分岐の並行実行
+# --------------------------------------------------------------------
+def run_branches(replay_path, fork_at, branches, out_dir):
+    """分岐点から先をK本並行で実行し、分岐ごとの結果を返す"""
+    replay = load_replay(replay_path)
+    header = replay["header"]
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), GAME_SCRIPTS[header["mode"]])
+    os.makedirs(out_dir, exist_ok=True)
+
+    # 記録時の設定で再現する（分岐の実行に関わる変数だけ差し替える）
+    base_env = {key: value for key, value in os.environ.items() if not key.startswith("WEREWOLF_")}
+    base_env.update(header["env"])
+    processes = []
+    for branch in range(branches):
+        result_path = os.path.join(out_dir, f"branch_{branch:02d}.json")
+        env = dict(
+            base_env,
+            WEREWOLF_SEED=str(header["seed"]),
+            WEREWOLF_REPLAY=replay_path,
+            WEREWOLF_FORK_AT=fork_at,
+            WEREWOLF_BRANCH=str(branch),
+            WEREWOLF_BRANCH_RESULT=result_path,
+            WEREWOLF_RECORD="1",  # 分岐からさらに分岐できるように記録する
+        )
+        with open(os.path.join(out_dir, f"branch_{branch:02d}.out"), "w", encoding="utf-8") as out:
+            processes.append((branch, result_path, subprocess.Popen([sys.executable, script], env=env, stdout=out, stderr=subprocess.STDOUT)))
+
+    results = []
+    for branch, result_path, process in processes:
+        process.wait()
+        if os.path.exists(result_path):
+            with open(result_path, encoding="utf-8") as f:
+                results.append(json.load(f))
+        else:
+            results.append({"branch": branch, "error": f"終了コード {process.returncode}"})
+    return replay, results
+
+def format_branches(replay, results, fork_at):
+    """分岐ごとの結果と、分岐しなかった場合との費用の比較"""
+    trunk_calls = len(replay["responses"])
+    shared_phases = set(["準備"] + replay["phases"][:replay["phases"].index(fork_at)])
+    prefix_calls = sum(1 for entry in replay["responses"] if entry["phase"] in shared_phases)
+    winners = collections.Counter(result.get("winner") or "判定なし" for result in results if "error" not in result)
+    lines = []
+    for result in results:
+        if "error" in result:
+            lines.append(f"  分岐{result['branch']}: ❌ 失敗（{result['error']}）")
+            continue
+        votes = " / ".join(f"{day}日目 {'・'.join(names)}" for day, names in result["top_votes"].items()) or "投票なし"
+        lines.append(
+            f"  分岐{result['branch']}: 勝者 {result['winner'] or '判定なし'} | {result['days']}日 | 最多票 {votes} | "
+            f"再生 {result['replayed']}回・新規 {result['live']}回" + (f"・食い違い {result['diverged']}回" if result["diverged"] else "")
+        )
+    live_calls = sum(result.get("live", 0) for result in results)
+    lines.append(f"🏆 勝者の分布: {', '.join(f'{winner} {count}本' for winner, count in winners.items())}")
+    lines.append(
+        f"💰 新規のタスク実行 {live_calls}回（分岐ごとに全ゲームをやり直すと約{trunk_calls * len(results)}回、"
+        f"共有した分岐前の {prefix_calls}回×{len(results)}本を再生で節約）"
+    )
+    return "\n".join(lines)
+
+# --------------------------------------------------------------------
+# 3. メイン実行部分
+# --------------------------------------------------------------------
+def main():
+    """記録したゲームを指定フェーズで分岐させ、K本の続きを並行で実行"""
+    parser = argparse.ArgumentParser(description="記録したゲームからの分岐実行（what-if）")
+    parser.add_argument("replay", nargs="?", help="分岐元の記録ファイル（WEREWOLF_RECORD=1 で実行したゲームの warewolf_logs/replays/*.replay.jsonl）")
+    parser.add_argument("--at", help="分岐点のフェーズ（例: 2日目_投票 = 2日目の投票の直前）")
+    parser.add_argument("--branches", type=int, default=4, help="分岐の本数")
+    args = parser.parse_args()
+
+    if not args.replay:
+        paths = sorted(os.listdir(REPLAY_DIR)) if os.path.isdir(REPLAY_DIR) else []
+        if not paths:
+            print("❌ 記録がありません。WEREWOLF_RECORD=1 でゲームを実行してください")
+            return 1
+        print("📼 記録したゲーム:")
+        for name in paths:
+            print(f"  {os.path.join(REPLAY_DIR, name)}")
+        return 0
+
+    replay = load_replay(args.replay)
+    if args.at not in replay["phases"]:
+        print(f"❌ 分岐点 {args.at} は記録にありません。指定できるフェーズ: {', '.join(replay['phases'])}")
+        return 1
+
+    label = re.sub(r'[^\w.-]', '_', os.path.basename(args.replay).split(".")[0])
+    out_dir = os.path.join(BRANCH_DIR, f"{label}_{args.at}_{time.strftime('%Y%m%d_%H%M%S')}")
+    print("=" * 60)
+    print(f"🔀 {args.replay} を {args.at} で{args.branches}本に分岐（{replay['header']['mode']}モード・シード {replay['header']['seed']}）")
+    print("=" * 60)
+    started = time.perf_counter()
+    replay, results = run_branches(args.replay, args.at, args.branches, out_dir)
+    print(format_branches(replay, results, args.at))
+    print(f"⏱️ {time.perf_counter() - started:.0f}秒 | 📁 各分岐の出力: {out_dir}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
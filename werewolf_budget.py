@@ -0,0 +1,157 @@
+# CrewAI人狼ゲーム - 実行時間・呼び出し回数・トークンの予算と段階的な縮退
+import os
+import time
+import numpy as np
+from werewolf_config import env_number
+from werewolf_validator import LENGTH_PATTERN
+from werewolf_llm_guard import clone_task
+from werewolf_llm_client import create_llm
+
+# 縮退の段階（いずれかの予算の消費率がこの値を超えたら次の段階へ）
+DEGRADE_STEPS = (
+    (0.5, "発言を短く"),
+    (0.7, "安価なモデルに切り替え・GMの発表を定型文に"),
+    (0.85, "議論の発言者を半分に"),
+)
+# 発言を短くする段階での、要求文字数の倍率
+SHORTEN_RATIO = 0.6
+
+# --------------------------------------------------------------------
+# 1. 予算切れの判定勝ち
+# --------------------------------------------------------------------
+def adjudicate(ledger, day, role_of):
+    """直近の投票で最多票を集めた人の陣営から勝敗を判定し、(勝者, 理由)を返す
+
+    最多票が人狼なら村人陣営、人狼以外（同票を含む）なら人狼陣営の判定勝ち。投票が無ければ(None, 理由)。
+    """
+    if ledger is None:
+        return None, "投票の記録が無いため判定できません"
+    for vote_day in range(day, 0, -1):
+        tally = ledger.vote_tally(vote_day)
+        if not tally.any():
+            continue
+        top = np.flatnonzero(tally == tally.max())
+        if len(top) > 1:
+            names = "・".join(ledger.players[seat] for seat in top)
+            return "werewolves", f"{vote_day}日目の投票が{names}で同票となり、村の意見がまとまらなかったため"
+        target = ledger.players[top[0]]
+        if role_of(target) == 'werewolf':
+            return "village", f"{vote_day}日目の投票で人狼の{target}に最多票が集まっていたため"
+        return "werewolves", f"{vote_day}日目の投票で人狼ではない{target}に最多票が集まっていたため"
+    return None, "まだ投票が行われていないため判定できません"
+
+# --------------------------------------------------------------------
+# 2. 予算管理クラス
+# --------------------------------------------------------------------
+class GameBudget:
+    """1ゲームの実行時間・LLM呼び出し回数・トークン数の予算を監視し、残りが少なくなったら段階的に縮退する
+
+    縮退の段階（いずれかの予算の消費率で決まる）:
+        50%〜  発言の要求文字数を短くする
+        70%〜  安価なモデルに切り替え、LLMのゲームマスターの発表を定型文にする
+        85%〜  議論の発言者を半分にする
+        100%   ゲームを打ち切り、直近の投票から判定勝ちを決める
+
+    環境変数:
+        WEREWOLF_BUDGET_SECONDS      1ゲームの実行時間の上限（秒、既定: 0=無制限）
+        WEREWOLF_BUDGET_CALLS        1ゲームのLLM呼び出し回数の上限（既定: 0=無制限）
+        WEREWOLF_BUDGET_TOKENS       1ゲームのトークン数の上限（既定: 0=無制限）
+        WEREWOLF_BUDGET_CHEAP_MODEL  縮退時に切り替えるモデル（既定: WEREWOLF_FALLBACK_MODEL、無ければ切り替えない）
+    """
+
+    def __init__(self, seconds=None, calls=None, tokens=None, cheap_model=None):
+        self.seconds = env_number("WEREWOLF_BUDGET_SECONDS", 0.0, float) if seconds is None else seconds
+        self.calls = env_number("WEREWOLF_BUDGET_CALLS", 0) if calls is None else calls
+        self.tokens = env_number("WEREWOLF_BUDGET_TOKENS", 0) if tokens is None else tokens
+        if cheap_model is None:
+            cheap_model = os.environ.get("WEREWOLF_BUDGET_CHEAP_MODEL") or os.environ.get("WEREWOLF_FALLBACK_MODEL", "")
+        self.cheap_model = cheap_model
+        self._cheap_llm = None
+        self.guard = None
+        self.started = time.perf_counter()
+        self.level = 0
+        self.history = []
+        self.stopped = False
+        self.adjudication = None
+
+    @property
+    def enabled(self):
+        return bool(self.seconds or self.calls or self.tokens)
+
+    def attach(self, guard):
+        """KickoffGuardの呼び出し回数・トークン数を監視し、各タスクの実行前に縮退を適用させる"""
+        self.guard = guard
+        guard.budget = self
+
+    def usage(self):
+        """予算ごとの(名前, 消費量, 上限)"""
+        elapsed = time.perf_counter() - self.started
+        calls = self.guard.calls if self.guard else 0
+        tokens = self.guard.tokens if self.guard else 0
+        return [
+            (name, used, limit)
+            for name, used, limit in (("時間", elapsed, self.seconds), ("呼び出し", calls, self.calls), ("トークン", tokens, self.tokens))
+            if limit
+        ]
+
+    def consumed(self):
+        """最も消費の進んでいる予算の消費率（0〜）"""
+        return max((used / limit for _, used, limit in self.usage()), default=0.0)
+
+    def update(self):
+        """消費率から縮退の段階を更新し、段階が上がったときは説明文を返す"""
+        if not self.enabled:
+            return None
+        ratio = self.consumed()
+        level = sum(1 for threshold, _ in DEGRADE_STEPS if ratio >= threshold)
+        if level <= self.level:
+            return None
+        self.level = level
+        _, label = DEGRADE_STEPS[level - 1]
+        self.history.append((level, ratio, label))
+        return f"💸 予算の{ratio:.0%}を消費したため縮退します（段階{level}: {label}）"
+
+    def exhausted(self):
+        """いずれかの予算を使い切ったか（一度使い切ったら以後はずっとTrue）"""
+        if not self.stopped and self.enabled and self.consumed() >= 1.0:
+            self.stopped = True
+        return self.stopped
+
+    def adjust(self, task, kind):
+        """縮退の段階に応じたタスクを返す（要求文字数の短縮・安価なモデルのエージェントのコピー）"""
+        if self.level >= 1:
+            task.description = LENGTH_PATTERN.sub(
+                lambda m: f"{max(20, int(int(m.group(1)) * SHORTEN_RATIO))}-{max(30, int(int(m.group(2)) * SHORTEN_RATIO))}文字程度",
+                task.description,
+            )
+        if self.level >= 2 and self.cheap_model:
+            if self._cheap_llm is None:
+                self._cheap_llm = create_llm(self.cheap_model, timeout=self.guard.timeout if self.guard else None)
+            return clone_task(task, llm=self._cheap_llm)
+        return task
+
+    def skip_narration(self, kind):
+        """省略できる演出（LLMのゲームマスターの発表）を定型文にするか"""
+        return self.level >= 2 and kind == 'announcement'
+
+    def cut_discussion(self, spoken, total):
+        """議論の発言者を半分に減らす段階で、規定の人数が発言し終えたか"""
+        return self.level >= 3 and spoken >= max(1, (total + 1) // 2)
+
+    def finish(self, game_state, role_of):
+        """予算切れで打ち切ったゲームの勝敗を判定してゲーム状態に記録し、説明文を返す"""
+        winner, reason = adjudicate(game_state.ledger, game_state.day_count, role_of)
+        game_state.game_over = True
+        game_state.winner = winner
+        self.adjudication = (winner, reason)
+        label = {"village": "村人陣営", "werewolves": "人狼陣営"}.get(winner, "判定なし")
+        return f"⌛ 予算を使い切ったため{game_state.day_count}日目でゲームを打ち切ります。判定: {label}（{reason}）"
+
+    def format_report(self):
+        """予算の消費状況と縮退の記録"""
+        usage = " | ".join(
+            f"{name} {used:.0f}/{limit:.0f}秒" if name == "時間" else f"{name} {used}/{limit}"
+            for name, used, limit in self.usage()
+        )
+        steps = ", ".join(f"段階{level}({ratio:.0%}で{label})" for level, ratio, label in self.history) or "なし"
+        return f"💸 予算: {usage} | 縮退: {steps}"
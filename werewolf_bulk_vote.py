@@ -0,0 +1,146 @@
+# CrewAI人狼ゲーム - 一括投票モード（全員の投票を1回のLLM呼び出しで決める）
+import re
+import json
+from crewai import Agent, Task
+from werewolf_config import env_flag
+from werewolf_validator import OutputSpec, OutputValidator, snap_name
+
+# 1人分の人物像としてプロンプトに載せる最大文字数
+PERSONA_MAX_CHARS = 300
+JSON_ARRAY = re.compile(r'\[.*\]', re.DOTALL)
+# 1票分の理由に求める文字数（個別の投票と同じく OutputValidator で日本語・長さを検証する）
+REASON_MIN_CHARS = 80
+REASON_MAX_CHARS = 120
+
+# --------------------------------------------------------------------
+# 1. 応答の解析
+# --------------------------------------------------------------------
+def parse_bulk_votes(text, voters, candidates, validator=None):
+    """JSON配列の応答から {投票者: (投票先, 理由)} を取り出す（不正な項目は含めない）
+
+    投票者は名前が完全に一致するものだけ受け付ける（誤字を別の人の票にしないため）。
+    理由は個別の投票と同じく日本語・文字数を検証し、直せない項目は含めない（その人は個別に投票する）。
+    """
+    validator = validator or OutputValidator(reasks=0)
+    match = JSON_ARRAY.search(str(text))
+    if not match:
+        return {}
+    try:
+        entries = json.loads(match.group(0))
+    except ValueError:
+        return {}
+    if not isinstance(entries, list):
+        return {}
+
+    votes = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        voter = str(entry.get("voter", "")).strip().removesuffix("さん")
+        if voter not in voters or voter in votes:
+            continue
+        target = snap_name(str(entry.get("target", "")), [name for name in candidates if name != voter])
+        if target is None:
+            continue
+        spec = OutputSpec("bulk_vote", REASON_MIN_CHARS, REASON_MAX_CHARS, candidates=candidates)
+        reason, repairs, problems = validator.check(spec, str(entry.get("reason", "")))
+        validator.record("bulk_vote", repairs, problems, False)
+        if problems:
+            continue
+        votes[voter] = (target, reason)
+    return votes
+
+# --------------------------------------------------------------------
+# 2. 一括投票クラス
+# --------------------------------------------------------------------
+class BulkVoter:
+    """生存者全員の投票を1回のLLM呼び出しでまとめて決める
+
+    各投票者の人物像（エージェントのrole・goal・backstory）と本人だけが知っている情報（秘密チャンネル）を
+    1つのプロンプトに並べ、{voter, target, reason} の配列で答えさせる。
+    形式が崩れた項目や、理由が日本語・文字数の検証を通らない項目の投票者だけ、通常どおり個別に投票させる。
+    エージェントごとの情報の分離は弱くなるので、大量の対戦でコストを下げたいとき向け。
+
+    環境変数:
+        WEREWOLF_BULK_VOTE  1で一括投票を有効化（既定: 無効）
+    """
+
+    def __init__(self, llm, enabled=None):
+        self.enabled = env_flag("WEREWOLF_BULK_VOTE") if enabled is None else enabled
+        self.llm = llm
+        self.batches = 0
+        self.batched_votes = 0
+        self.fallback_votes = 0
+
+    def build_prompt(self, voters, candidates, agents, game_state):
+        """全投票者分の人物像と秘密の情報を並べたプロンプト"""
+        ledger_text = game_state.ledger.render(game_state.day_count) if game_state.ledger else ""
+        sections = []
+        for voter in voters:
+            agent = agents[voter]
+            goal = re.sub(r'\s+', ' ', str(agent.goal)).strip()
+            persona = re.sub(r'\s+', ' ', str(agent.backstory)).strip()[:PERSONA_MAX_CHARS]
+            private = game_state.channels.render_for(voter) if game_state.channels else ""
+            sections.append(
+                f"### {voter}\n"
+                f"役職・人物: {agent.role}\n"
+                f"目標: {goal}\n"
+                f"人物像: {persona}\n"
+                f"本人だけが知っている情報: {private or 'なし'}"
+            )
+        players = "\n\n".join(sections)
+        return f"""
+        あなたは人狼ゲームの進行役として、以下の{len(voters)}人のプレイヤーの処刑投票をまとめて決めてください。
+        各プレイヤーは、自分の人物像・目標と「本人だけが知っている情報」だけをもとに投票します。
+        他のプレイヤーの秘密の情報や役職を、その人の判断に使ってはいけません。
+
+        投票候補者: {', '.join(candidates)}
+
+        {ledger_text}
+
+        ## プレイヤー一覧
+        {players}
+
+        ## 出力形式
+        次の形式のJSON配列だけを出力してください（前後に説明文やコードブロックを付けないこと）。
+        [{{"voter": "投票者の名前", "target": "投票先の名前", "reason": "日本語で{REASON_MIN_CHARS}-{REASON_MAX_CHARS}文字程度の理由"}}]
+        - 上の{len(voters)}人全員について1件ずつ出力する（voterは上の名前をそのまま書く）
+        - 投票先は投票候補者の中から、自分以外の1人を選ぶ
+        - reasonは必ず日本語で書く
+        """
+
+    def collect(self, guard, voters, candidates, agents, game_state):
+        """1回の呼び出しで投票を集め、{投票者: 投票の発言}を返す（返らなかった投票者は個別に投票させる）"""
+        if not self.enabled:
+            return {}
+        # ボット席はLLMを使わないので、一括投票には含めない
+        voters = [voter for voter in voters if id(agents[voter]) not in guard.bots]
+        if len(voters) < 2:
+            return {}
+
+        task = Task(
+            description=self.build_prompt(voters, candidates, agents, game_state),
+            expected_output="全投票者の投票先と理由のJSON配列",
+            agent=Agent(
+                role="投票の取りまとめ役",
+                goal="各プレイヤーの立場と知識に忠実に、全員の投票を正しい形式でまとめる",
+                backstory="人狼ゲームの進行役として、プレイヤーごとの視点を取り違えずに判断を代筆できます。",
+                verbose=False,
+                allow_delegation=False,
+                llm=self.llm,
+            ),
+        )
+        result = guard.kickoff(task, "bulk_vote", validate=False)
+        votes = parse_bulk_votes(str(result), voters, candidates, guard.validator)
+
+        self.batches += 1
+        self.batched_votes += len(votes)
+        self.fallback_votes += len(voters) - len(votes)
+        return {voter: f"【投票】{target}に投票します。\n理由：{reason}" for voter, (target, reason) in votes.items()}
+
+    def format_report(self):
+        """一括投票の統計"""
+        return (
+            f"🗳️ 一括投票: {self.batches}回の呼び出しで{self.batched_votes}票 | "
+            f"形式・理由の不正で個別に投票 {self.fallback_votes}票"
+        )
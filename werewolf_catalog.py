@@ -0,0 +1,321 @@
+# CrewAI人狼ゲーム - ゲームログのカタログ（SQLite）・圧縮・ローテーション
+import os
+import sys
+import gzip
+import json
+import shutil
+import sqlite3
+import datetime
+import argparse
+from werewolf_config import env_number
+
+LOG_DIR = "warewolf_logs"
+CATALOG_PATH = os.path.join(LOG_DIR, "catalog.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+    mode        TEXT NOT NULL,
+    seed        INTEGER,
+    started_at  TEXT NOT NULL,
+    finished_at TEXT,
+    winner      TEXT,
+    days        INTEGER NOT NULL DEFAULT 0,
+    llm_calls   INTEGER NOT NULL DEFAULT 0,
+    roster      TEXT NOT NULL,
+    log_path    TEXT,
+    compressed  INTEGER NOT NULL DEFAULT 0,
+    size_bytes  INTEGER NOT NULL DEFAULT 0,
+    rotated_at  TEXT,
+    aborted     INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS game_players (
+    game_id INTEGER NOT NULL REFERENCES games(game_id) ON DELETE CASCADE,
+    seat    INTEGER NOT NULL,
+    player  TEXT NOT NULL,
+    role    TEXT NOT NULL,
+    survived INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (game_id, seat)
+);
+CREATE INDEX IF NOT EXISTS idx_games_mode_started ON games(mode, started_at);
+CREATE INDEX IF NOT EXISTS idx_games_winner ON games(winner, started_at);
+CREATE INDEX IF NOT EXISTS idx_games_seed ON games(seed);
+CREATE INDEX IF NOT EXISTS idx_games_housekeeping ON games(compressed, finished_at);
+CREATE INDEX IF NOT EXISTS idx_players_role ON game_players(role, player);
+CREATE INDEX IF NOT EXISTS idx_players_player ON game_players(player);
+CREATE INDEX IF NOT EXISTS idx_players_game_player ON game_players(game_id, player);
+"""
+
+# --------------------------------------------------------------------
+# 1. ユーティリティ関数
+# --------------------------------------------------------------------
+def now_iso():
+    """現在時刻をISO形式の文字列で返す（秒単位）"""
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+def open_log(path):
+    """ログファイルをテキストとして開く（.gzは展開せずにストリーム読み出し）"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def iter_log_lines(path):
+    """ログファイルを1行ずつ読み出す（圧縮ログもディスクに展開しない）"""
+    with open_log(path) as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+def compress_file(path):
+    """ファイルをgzip圧縮して元ファイルを削除し、圧縮後のパスを返す"""
+    gz_path = path + ".gz"
+    # 並行するゲームが同じログを同時に圧縮しても一時ファイルがぶつからないよう、プロセスごとに分ける
+    tmp_path = f"{gz_path}.{os.getpid()}.tmp"
+    with open(path, "rb") as src, gzip.open(tmp_path, "wb", compresslevel=9) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    # 書き込み途中のファイルが見えないよう、完成してから置き換える
+    os.replace(tmp_path, gz_path)
+    if os.path.exists(path):
+        os.remove(path)
+    return gz_path
+
+# --------------------------------------------------------------------
+# 2. カタログクラス
+# --------------------------------------------------------------------
+class GameCatalog:
+    """ゲームの一覧（モード・シード・配役・勝者・日数・呼び出し回数・ログの場所）をSQLiteで管理"""
+
+    def __init__(self, db_path=CATALOG_PATH):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        # 複数プロセスから同時にゲームを登録できるよう、WALモードで待ち時間を長めに取る
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.commit()
+
+    def _migrate(self):
+        """古いカタログに後から追加した列を足す"""
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(game_players)")}
+        if "survived" not in columns:
+            self.conn.execute("ALTER TABLE game_players ADD COLUMN survived INTEGER NOT NULL DEFAULT 1")
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(games)")}
+        if "aborted" not in columns:
+            self.conn.execute("ALTER TABLE games ADD COLUMN aborted INTEGER NOT NULL DEFAULT 0")
+
+    def close(self):
+        self.conn.close()
+
+    def register_game(self, mode, seed, log_path, player_roles):
+        """ゲーム開始時に登録し、game_idを返す（player_roles: {プレイヤー名: 役職}）"""
+        roster = list(player_roles.keys())
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO games (mode, seed, started_at, roster, log_path) VALUES (?, ?, ?, ?, ?)",
+                (mode, seed, now_iso(), json.dumps(roster, ensure_ascii=False), log_path),
+            )
+            game_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO game_players (game_id, seat, player, role) VALUES (?, ?, ?, ?)",
+                [(game_id, seat, name, role) for seat, (name, role) in enumerate(player_roles.items())],
+            )
+        return game_id
+
+    def finish_game(self, game_id, winner, days, llm_calls, dead_players=(), aborted=False):
+        """ゲーム終了時に結果を記録（winner: "village" / "werewolves" / None）
+
+        例外やCtrl+Cで途中で止まったゲームは aborted=True で記録する（終了済みとして圧縮・ローテーションの対象になる）。
+        """
+        row = self.conn.execute("SELECT log_path FROM games WHERE game_id = ?", (game_id,)).fetchone()
+        size = os.path.getsize(row["log_path"]) if row and row["log_path"] and os.path.exists(row["log_path"]) else 0
+        with self.conn:
+            self.conn.execute(
+                "UPDATE games SET finished_at = ?, winner = ?, days = ?, llm_calls = ?, size_bytes = ?, aborted = ? WHERE game_id = ?",
+                (now_iso(), winner, days, llm_calls, size, int(aborted), game_id),
+            )
+            self.conn.executemany(
+                "UPDATE game_players SET survived = 0 WHERE game_id = ? AND player = ?",
+                [(game_id, name) for name in dead_players],
+            )
+
+    def get_game(self, game_id):
+        """1ゲーム分の情報を配役付きで取得"""
+        row = self.conn.execute("SELECT * FROM games WHERE game_id = ?", (game_id,)).fetchone()
+        if row is None:
+            return None
+        game = dict(row)
+        game["roster"] = json.loads(game["roster"])
+        game["roles"] = {
+            r["player"]: r["role"]
+            for r in self.conn.execute("SELECT player, role FROM game_players WHERE game_id = ? ORDER BY seat", (game_id,))
+        }
+        return game
+
+    def list_games(self, mode=None, winner=None, seed=None, player=None, role=None, since=None, until=None, limit=50):
+        """条件に合うゲームを新しい順に取得（すべてインデックスで絞り込む）"""
+        conditions = []
+        params = []
+        if mode:
+            conditions.append("g.mode = ?")
+            params.append(mode)
+        if winner:
+            conditions.append("g.winner = ?")
+            params.append(winner)
+        if seed is not None:
+            conditions.append("g.seed = ?")
+            params.append(seed)
+        if since:
+            conditions.append("g.started_at >= ?")
+            params.append(since)
+        if until:
+            conditions.append("g.started_at < ?")
+            params.append(until)
+        if player or role:
+            # 「○○が人狼だったゲーム」などは配役テーブルのインデックスで引く
+            sub = "SELECT game_id FROM game_players WHERE 1=1"
+            if role:
+                sub += " AND role = ?"
+                params.append(role)
+            if player:
+                sub += " AND player = ?"
+                params.append(player)
+            conditions.append(f"g.game_id IN ({sub})")
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT g.* FROM games g {where} ORDER BY g.started_at DESC, g.game_id DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self.conn.execute(query, params)]
+
+    def compress_finished(self, exclude_game_id=None):
+        """終了済みで未圧縮のログをgzip圧縮し、圧縮した件数を返す"""
+        rows = self.conn.execute(
+            "SELECT game_id, log_path FROM games WHERE compressed = 0 AND finished_at IS NOT NULL AND rotated_at IS NULL"
+        ).fetchall()
+        count = 0
+        for row in rows:
+            path = row["log_path"]
+            if row["game_id"] == exclude_game_id or not path or not os.path.exists(path):
+                continue
+            try:
+                gz_path = compress_file(path)
+            except FileNotFoundError:
+                # 別のプロセスが先に圧縮して元ファイルを消した
+                continue
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE games SET log_path = ?, compressed = 1, size_bytes = ? WHERE game_id = ?",
+                    (gz_path, os.path.getsize(gz_path), row["game_id"]),
+                )
+            count += 1
+        return count
+
+    def rotate(self, max_age_days=0, max_total_mb=0):
+        """古いログを削除（経過日数と合計サイズの上限）。カタログの行は統計用に残す"""
+        removed = []
+
+        if max_age_days:
+            cutoff = (datetime.datetime.now() - datetime.timedelta(days=max_age_days)).isoformat(timespec="seconds")
+            rows = self.conn.execute(
+                "SELECT game_id, log_path FROM games WHERE rotated_at IS NULL AND finished_at IS NOT NULL AND started_at < ?",
+                (cutoff,),
+            ).fetchall()
+            removed.extend(rows)
+
+        if max_total_mb:
+            limit_bytes = max_total_mb * 1024 * 1024
+            removed_ids = {row["game_id"] for row in removed}
+            total = 0
+            # 新しいものから順に合計し、上限を超えた古いログを削除対象にする
+            for row in self.conn.execute(
+                "SELECT game_id, log_path, size_bytes FROM games WHERE rotated_at IS NULL AND finished_at IS NOT NULL "
+                "ORDER BY started_at DESC, game_id DESC"
+            ):
+                if row["game_id"] in removed_ids:
+                    continue
+                total += row["size_bytes"]
+                if total > limit_bytes:
+                    removed.append(row)
+
+        for row in removed:
+            if row["log_path"] and os.path.exists(row["log_path"]):
+                os.remove(row["log_path"])
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE games SET rotated_at = ?, log_path = NULL, size_bytes = 0 WHERE game_id = ?",
+                    (now_iso(), row["game_id"]),
+                )
+        return len(removed)
+
+    def maintain(self, exclude_game_id=None):
+        """ゲーム開始時のメンテナンス（圧縮とローテーション）
+
+        環境変数:
+            WEREWOLF_LOG_MAX_AGE_DAYS  この日数より古いログを削除（既定: 0=削除しない）
+            WEREWOLF_LOG_MAX_TOTAL_MB  ログ合計がこのサイズを超えたら古い順に削除（既定: 0=無制限）
+        """
+        compressed = self.compress_finished(exclude_game_id=exclude_game_id)
+        rotated = self.rotate(
+            max_age_days=env_number("WEREWOLF_LOG_MAX_AGE_DAYS", 0),
+            max_total_mb=env_number("WEREWOLF_LOG_MAX_TOTAL_MB", 0),
+        )
+        return compressed, rotated
+
+# --------------------------------------------------------------------
+# 3. コマンドライン
+# --------------------------------------------------------------------
+def main():
+    """カタログの検索・ログ表示・メンテナンス"""
+    parser = argparse.ArgumentParser(description="人狼ゲームログのカタログ")
+    parser.add_argument("--db", default=CATALOG_PATH, help="カタログのパス")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = sub.add_parser("list", help="ゲーム一覧")
+    list_parser.add_argument("--mode", choices=["open", "anonymous"])
+    list_parser.add_argument("--winner")
+    list_parser.add_argument("--seed", type=int)
+    list_parser.add_argument("--player")
+    list_parser.add_argument("--role")
+    list_parser.add_argument("--since", help="YYYY-MM-DD 以降")
+    list_parser.add_argument("--until", help="YYYY-MM-DD より前")
+    list_parser.add_argument("--limit", type=int, default=50)
+
+    show_parser = sub.add_parser("show", help="ログを表示（圧縮ログもそのまま読める）")
+    show_parser.add_argument("game_id", type=int)
+
+    maintain_parser = sub.add_parser("maintain", help="ログの圧縮とローテーション")
+    maintain_parser.add_argument("--max-age-days", type=int, default=0)
+    maintain_parser.add_argument("--max-total-mb", type=int, default=0)
+
+    args = parser.parse_args()
+    catalog = GameCatalog(args.db)
+
+    if args.command == "list":
+        games = catalog.list_games(
+            mode=args.mode, winner=args.winner, seed=args.seed, player=args.player,
+            role=args.role, since=args.since, until=args.until, limit=args.limit,
+        )
+        for game in games:
+            print(
+                f"#{game['game_id']:>5} {game['started_at']} {game['mode']:<9} seed={game['seed']} "
+                f"勝者={game['winner'] or '-'} {game['days']}日 {game['llm_calls']}回 {game['log_path'] or '(削除済み)'}"
+                f"{' (中断)' if game['aborted'] else ''}"
+            )
+        print(f"📋 {len(games)}件")
+    elif args.command == "show":
+        game = catalog.get_game(args.game_id)
+        if game is None or not game["log_path"]:
+            print(f"❌ ゲーム#{args.game_id}のログが見つかりません")
+            sys.exit(1)
+        for line in iter_log_lines(game["log_path"]):
+            print(line)
+    elif args.command == "maintain":
+        compressed = catalog.compress_finished()
+        rotated = catalog.rotate(args.max_age_days, args.max_total_mb)
+        print(f"🗜️ 圧縮: {compressed}件 | 🗑️ 削除: {rotated}件")
+
+    catalog.close()
+
+if __name__ == "__main__":
+    main()
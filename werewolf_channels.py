@@ -0,0 +1,108 @@
+# CrewAI人狼ゲーム - 陣営・役職ごとの秘密チャンネル（保持期間つき）
+import re
+import collections
+from werewolf_config import env_number
+from werewolf_ledger import find_player
+from werewolf_validator import TARGET_PATTERN
+
+# --------------------------------------------------------------------
+# 1. チャンネルクラス
+# --------------------------------------------------------------------
+class PrivateChannel:
+    """メンバーだけがプロンプトで見られる短い記録（直近の数件・数日分のみ保持）"""
+
+    def __init__(self, name, title, members, max_entries=6, max_chars=200, retention_days=None):
+        self.name = name
+        self.title = title
+        self.members = set(members)
+        self.max_chars = max_chars
+        # Noneならゲーム全体の保持日数に従い、0なら日数では破棄しない（件数の上限のみ）
+        self.retention_days = retention_days
+        # (日, 発言者, 本文) を古い順に保持し、上限を超えたら古いものから捨てる
+        self.entries = collections.deque(maxlen=max_entries)
+
+    def post(self, day, speaker, text):
+        """記録を追加（改行・空白を詰め、長すぎる本文は切り詰める）"""
+        compact = re.sub(r'\s+', ' ', str(text)).strip()
+        if len(compact) > self.max_chars:
+            compact = compact[: self.max_chars - 1] + "…"
+        self.entries.append((day, speaker, compact))
+
+    def trim_before(self, day):
+        """指定日より前の記録を破棄"""
+        while self.entries and self.entries[0][0] < day:
+            self.entries.popleft()
+
+    def render(self):
+        """プロンプト用のテキスト（記録が無ければ空文字）"""
+        if not self.entries:
+            return ""
+        lines = [self.title]
+        lines.extend(
+            f"{day}日目 {speaker}: {text}" if speaker else f"{day}日目: {text}"
+            for day, speaker, text in self.entries
+        )
+        return "\n".join(lines)
+
+# --------------------------------------------------------------------
+# 2. ゲーム全体のチャンネル管理
+# --------------------------------------------------------------------
+class PrivateChannels:
+    """人狼チャット・占い結果・護衛履歴などのチャンネルをまとめて管理
+
+    夜の行動の結果をチャンネルに記録し、タスクの実行直前にメンバーのプロンプトにだけ差し込む。
+    夜のログ全体を送り直す代わりに、数百トークンの要点だけを渡す。
+
+    環境変数:
+        WEREWOLF_CHANNEL_RETENTION_DAYS  チャンネルの記録を保持する日数（既定: 3）
+    """
+
+    def __init__(self, retention_days=None):
+        self.retention_days = env_number("WEREWOLF_CHANNEL_RETENTION_DAYS", 3) if retention_days is None else retention_days
+        self.channels = {}
+
+    def open(self, name, title, members, max_entries=6, max_chars=200, retention_days=None):
+        """チャンネルを作成（retention_daysを指定するとそのチャンネルだけ保持日数を変える）"""
+        self.channels[name] = PrivateChannel(name, title, members, max_entries, max_chars, retention_days)
+        return self.channels[name]
+
+    def post(self, name, day, speaker, text):
+        """チャンネルに記録（チャンネルが無ければ何もしない）"""
+        channel = self.channels.get(name)
+        if channel is not None:
+            channel.post(day, speaker, text)
+            retention_days = self.retention_days if channel.retention_days is None else channel.retention_days
+            if retention_days:
+                channel.trim_before(day - retention_days + 1)
+
+    def render_for(self, member):
+        """メンバーが見られるチャンネルの内容"""
+        return "\n\n".join(
+            text for text in (channel.render() for channel in self.channels.values() if member in channel.members) if text
+        )
+
+    def inject(self, task, member):
+        """タスクの説明文の末尾にメンバー向けのチャンネル内容を差し込む"""
+        text = self.render_for(member)
+        if text:
+            task.description = f"{task.description}\n\n{text}\n"
+        return task
+
+    def record_night_action(self, day, actor, text, candidates, role_of, labels):
+        """占い・護衛の発言から対象を読み取り、結果をチャンネルに記録して(種類, 対象)を返す
+
+        role_of(player)で本当の役職を返す関数を渡す（占い結果は人狼かどうかだけを伝える）。
+        labels は {'werewolf': '人狼', 'human': '人間', 'guard': '護衛'} のように結果の表記を指定する。
+        """
+        match = TARGET_PATTERN.search(text)
+        others = [name for name in candidates if name != actor]
+        target = find_player(match.group(2), others) if match else None
+        if target is None:
+            return None, None
+
+        if match.group(1) in ('占い', '調査'):
+            result = labels['werewolf'] if role_of(target) == 'werewolf' else labels['human']
+            self.post('fortune', day, "", f"{target} → {result}")
+            return 'fortune', (target, role_of(target) == 'werewolf')
+        self.post('knight', day, "", f"{target}を{labels['guard']}")
+        return 'knight', target
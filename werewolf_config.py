@@ -0,0 +1,31 @@
+# CrewAI人狼ゲーム - 環境変数による設定の読み取り
+import os
+import random
+
+# --------------------------------------------------------------------
+# 1. 環境変数ユーティリティ
+# --------------------------------------------------------------------
+def env_flag(name, default=False):
+    """環境変数を真偽値として読み取る（1/true/yes/on を真とみなす）"""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+def env_number(name, default, cast=int):
+    """環境変数を数値として読み取る（不正な値は既定値）"""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        print(f"⚠️ {name}の値が不正です（{value}）。既定値{default}を使用します")
+        return default
+
+def resolve_seed():
+    """ゲームの乱数シードを決定（WEREWOLF_SEED があれば使い、無ければ新規に生成）"""
+    seed = env_number("WEREWOLF_SEED", None)
+    if seed is None:
+        seed = random.SystemRandom().randrange(2**31)
+    return seed
@@ -0,0 +1,110 @@
+# CrewAI人狼ゲーム - 議論の収束判定（早期終了）
+import re
+import collections
+from werewolf_config import env_number
+from werewolf_ledger import find_player
+
+# 疑い・告発を表す言い回し（この語を含む文に出てきたプレイヤーを疑われているとみなす）
+ACCUSATION_WORDS = ('怪しい', '疑わしい', '疑って', '疑い', '人狼だと', '人狼では', '人狼でした', '黒', '処刑', '吊', '投票したい', '投票します')
+# 疑いを否定する言い回し（この語を含む文は数えない）
+DENIAL_WORDS = ('怪しくない', '疑っていない', '白', '信じ', '人狼ではない', '人狼ではありません')
+
+# --------------------------------------------------------------------
+# 1. 告発の簡易解析
+# --------------------------------------------------------------------
+def parse_accusations(text, candidates):
+    """発言から疑っている相手を取り出す（文ごとに判定し、同じ相手は1回まで）"""
+    targets = []
+    for sentence in re.split(r'[。\n！!？?]', text):
+        if not any(word in sentence for word in ACCUSATION_WORDS):
+            continue
+        if any(word in sentence for word in DENIAL_WORDS):
+            continue
+        target = find_player(sentence, candidates)
+        if target and target not in targets:
+            targets.append(target)
+    return targets
+
+# --------------------------------------------------------------------
+# 2. 議論の収束判定クラス
+# --------------------------------------------------------------------
+class DiscussionController:
+    """発言ごとに疑いの集中度を計算し、村の意見が固まったら議論を打ち切る
+
+    各発言者の疑いは合計1になるよう按分し（1人が何人も名指ししても影響は同じ）、
+    最も疑われている人の割合が閾値を超えたら残りの発言を省略して投票に進む。
+
+    環境変数:
+        WEREWOLF_CONSENSUS_THRESHOLD     早期終了する集中度（0〜1、既定: 0=無効、目安: 0.6）
+        WEREWOLF_CONSENSUS_MIN_SPEAKERS  早期終了を判定するまでに必要な発言者数（既定: 生存者の半数）
+    """
+
+    def __init__(self, threshold=None, min_speakers=None):
+        self.threshold = env_number("WEREWOLF_CONSENSUS_THRESHOLD", 0.0, float) if threshold is None else threshold
+        self.min_speakers = env_number("WEREWOLF_CONSENSUS_MIN_SPEAKERS", 0) if min_speakers is None else min_speakers
+        self.day = None
+        self.speakers = 0
+        self.suspicion = collections.Counter()
+        self.accusers = 0
+        self.saved_calls = 0
+        self.early_stops = []
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def start_day(self, day):
+        """日が変わったら集計をリセット"""
+        self.day = day
+        self.speakers = 0
+        self.suspicion = collections.Counter()
+        self.accusers = 0
+
+    def record(self, day, speaker, text, candidates):
+        """1人分の発言を集計"""
+        if day != self.day:
+            self.start_day(day)
+        self.speakers += 1
+        targets = [target for target in parse_accusations(text, candidates) if target != speaker]
+        if targets:
+            self.accusers += 1
+            for target in targets:
+                self.suspicion[target] += 1 / len(targets)
+
+    def listener(self, candidates_of):
+        """WerewolfLoggerに登録するリスナーを作成（candidates_of()で現在の生存者を返す）"""
+        def on_event(event):
+            if event.get("type") == "speech" and event.get("phase") == "discussion":
+                self.record(event["day"], event["speaker"], event["text"], candidates_of())
+        return on_event
+
+    def concentration(self):
+        """(最も疑われている人, その人への疑いの割合)"""
+        total = sum(self.suspicion.values())
+        if not total:
+            return None, 0.0
+        target, score = self.suspicion.most_common(1)[0]
+        return target, score / total
+
+    def should_stop(self, remaining, alive_count):
+        """残りの発言を省略してよいか判定し、省略する場合は省略数を記録"""
+        if not self.enabled or remaining <= 0:
+            return False
+        min_speakers = self.min_speakers or (alive_count + 1) // 2
+        if self.speakers < min_speakers or self.accusers < 2:
+            return False
+        target, share = self.concentration()
+        if share < self.threshold:
+            return False
+        self.saved_calls += remaining
+        self.early_stops.append((self.day, target, share, remaining))
+        return True
+
+    def format_report(self):
+        """早期終了の記録"""
+        if not self.early_stops:
+            return f"🤝 議論の早期終了: なし（閾値 {self.threshold:.2f}）"
+        days = ", ".join(
+            f"{day}日目→{target}({share:.0%}・{saved}発言省略)" for day, target, share, saved in self.early_stops
+        )
+        return f"🤝 議論の早期終了: {len(self.early_stops)}回 | 省略したLLM呼び出し {self.saved_calls}回 | {days}"
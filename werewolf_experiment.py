@@ -0,0 +1,223 @@
+# CrewAI人狼ゲーム - A/B実験（同じシードで交互に実行し、差が有意になったら打ち切る）
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import subprocess
+import yaml
+import numpy as np
+from werewolf_catalog import CATALOG_PATH
+from werewolf_analytics import load_games, villager_vote_accuracy, first_werewolf_voted_day
+
+EXPERIMENT_DIR = "warewolf_logs/experiments"
+GAME_SCRIPTS = {
+    "open": "werewolf_game_open_mode.py",
+    "anonymous": "werewolf_game_anonymous_mode.py",
+}
+LOG_FILE_PATTERN = re.compile(r'📝 ログファイル作成: (\S+)')
+# 事後確率をモンテカルロで求めるときのサンプル数
+POSTERIOR_SAMPLES = 20000
+
+# --------------------------------------------------------------------
+# 1. 指標（1ゲームから0〜1の値を1つ求める。求められなければNone）
+# --------------------------------------------------------------------
+def village_accuracy(data):
+    """村人陣営の投票のうち人狼に入った割合"""
+    accuracy, _, votes = villager_vote_accuracy(data)
+    return float(accuracy) if votes else None
+
+def werewolf_found(data):
+    """いずれかの日に人狼が最多得票になったか"""
+    return float(first_werewolf_voted_day(data)[0] > 0)
+
+# 勝敗はゲームが記録しない（予算切れの判定時しか決まらない）ため、勝率は指標にしない
+METRICS = {
+    "village_accuracy": ("村人陣営の人狼投票率", village_accuracy),
+    "werewolf_found": ("人狼が最多得票になったゲームの割合", werewolf_found),
+}
+
+# --------------------------------------------------------------------
+# 2. 逐次検定（ベイズ）
+# --------------------------------------------------------------------
+class SequentialTest:
+    """2つの変種の指標をベータ分布で逐次更新し、差がはっきりした時点で打ち切る
+
+    1ゲームを1回の観測として、指標の値 x（0〜1）を成功 x・失敗 1-x として加える
+    （投票率のように割合の指標でも、1ゲーム内の投票どうしの相関で確信度を過大評価しない）。
+    覗き見のたびに判定してよいよう、SPRTではなくベイズの事後確率と期待損失で止める。
+
+    打ち切りの条件（各変種 min_games 以上の観測がそろってから）:
+        P(B > A) >= 1 - alpha  → Bが優れている
+        P(B > A) <= alpha      → Aが優れている
+        期待損失 < loss        → どちらを選んでも差は実質的に無い
+    """
+
+    def __init__(self, alpha=0.05, loss=0.002, min_games=5, seed=0):
+        self.alpha = alpha
+        self.loss = loss
+        self.min_games = min_games
+        self.rng = np.random.default_rng(seed)
+        # 一様事前分布 Beta(1, 1)
+        self.params = {"A": [1.0, 1.0], "B": [1.0, 1.0]}
+        self.counts = {"A": 0, "B": 0}
+
+    def update(self, variant, value):
+        self.params[variant][0] += value
+        self.params[variant][1] += 1.0 - value
+        self.counts[variant] += 1
+
+    def mean(self, variant):
+        a, b = self.params[variant]
+        return a / (a + b)
+
+    def posterior(self):
+        """(P(B > A), Aを選んだときの期待損失, Bを選んだときの期待損失)"""
+        draws_a = self.rng.beta(*self.params["A"], POSTERIOR_SAMPLES)
+        draws_b = self.rng.beta(*self.params["B"], POSTERIOR_SAMPLES)
+        prob_b = float((draws_b > draws_a).mean())
+        loss_a = float(np.maximum(draws_b - draws_a, 0).mean())
+        loss_b = float(np.maximum(draws_a - draws_b, 0).mean())
+        return prob_b, loss_a, loss_b
+
+    def decision(self):
+        """打ち切るなら結論の文字列、続けるならNone"""
+        if min(self.counts.values()) < self.min_games:
+            return None
+        prob_b, loss_a, loss_b = self.posterior()
+        if prob_b >= 1 - self.alpha:
+            return "B"
+        if prob_b <= self.alpha:
+            return "A"
+        if min(loss_a, loss_b) < self.loss:
+            return "同等"
+        return None
+
+# --------------------------------------------------------------------
+# 3. ゲームの実行
+# --------------------------------------------------------------------
+def find_game(log_path, db_path=CATALOG_PATH):
+    """ログファイルからカタログのgame_idとLLM呼び出し数を引く（圧縮済みのログも探す。中断したゲームは除く）"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        return conn.execute(
+            "SELECT game_id, llm_calls FROM games WHERE log_path IN (?, ?) AND finished_at IS NOT NULL AND aborted = 0",
+            (log_path, log_path + ".gz"),
+        ).fetchone()
+    finally:
+        conn.close()
+
+def start_game(script, variant_env, seed, out_path):
+    """1ゲームを子プロセスで開始"""
+    env = dict(os.environ, **{key: str(value) for key, value in variant_env.items()}, WEREWOLF_SEED=str(seed))
+    with open(out_path, "w", encoding="utf-8") as out:
+        return subprocess.Popen([sys.executable, script], env=env, stdout=out, stderr=subprocess.STDOUT)
+
+def collect_game(process, out_path, metric):
+    """ゲームの終了を待ち、(指標の値, LLM呼び出し数) を返す（失敗・指標なしは値がNone）"""
+    process.wait()
+    with open(out_path, encoding="utf-8", errors="replace") as f:
+        match = LOG_FILE_PATTERN.search(f.read())
+    game = find_game(match.group(1)) if match else None
+    if game is None:
+        return None, 0
+    game_id, llm_calls = game
+    return metric(load_games(game_ids=[game_id])), llm_calls or 0
+
+# --------------------------------------------------------------------
+# 4. メイン実行部分
+# --------------------------------------------------------------------
+def main():
+    """A/B実験を実行し、差が有意になるか予算を使い切るまでゲームを続ける"""
+    parser = argparse.ArgumentParser(description="人狼ゲームのA/B実験（ベイズ逐次検定で早期打ち切り）")
+    parser.add_argument("config", help="実験の設定ファイル（例: experiments/personalities.yaml）")
+    parser.add_argument("--metric", choices=sorted(METRICS), help="比較する指標（既定: 設定ファイルの metric）")
+    parser.add_argument("--max-games", type=int, default=40, help="両変種合計のゲーム数の上限（予算）")
+    parser.add_argument("--min-games", type=int, default=5, help="打ち切りを判定し始める各変種のゲーム数")
+    parser.add_argument("--alpha", type=float, default=0.05, help="P(B>A) がこの値以下か1-この値以上で打ち切る")
+    parser.add_argument("--loss", type=float, default=0.002, help="期待損失がこの値を下回ったら「同等」として打ち切る")
+    parser.add_argument("--seed", type=int, default=1, help="最初のゲームのシード（組ごとに1ずつ増やす）")
+    args = parser.parse_args()
+
+    with open(args.config, encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    variants = config["variants"]
+    if set(variants) != {"A", "B"}:
+        raise ValueError(f"variants には A と B の2つを指定してください: {args.config}")
+    metric_name = args.metric or config.get("metric", "village_accuracy")
+    metric_label, metric = METRICS[metric_name]
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), GAME_SCRIPTS[config.get("mode", "anonymous")])
+
+    run_dir = os.path.join(EXPERIMENT_DIR, f"{config.get('name', 'experiment')}_{time.strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(run_dir, exist_ok=True)
+    test = SequentialTest(alpha=args.alpha, loss=args.loss, min_games=args.min_games, seed=args.seed)
+
+    print("=" * 60)
+    print(f"🧪 A/B実験: {config.get('name', args.config)}（{metric_label}・最大{args.max_games}ゲーム）")
+    for key in ("A", "B"):
+        print(f"  {key}: {variants[key].get('label', key)}")
+    print("=" * 60)
+
+    started = time.perf_counter()
+    history = []
+    games = calls = 0
+    decision = None
+    pair = 0
+    while games + 2 <= args.max_games and decision is None:
+        # 同じシードの組をA/Bで並行に実行する（配役などの偶然の差を打ち消す）
+        seed = args.seed + pair
+        running = {}
+        for key in ("A", "B"):
+            out_path = os.path.join(run_dir, f"{pair:03d}_{key}.out")
+            running[key] = (start_game(script, variants[key].get("env") or {}, seed, out_path), out_path)
+        values = {}
+        for key, (process, out_path) in running.items():
+            value, game_calls = collect_game(process, out_path, metric)
+            games += 1
+            calls += game_calls
+            values[key] = value
+            if value is not None:
+                test.update(key, value)
+        pair += 1
+        if pair == 1 and all(value is None for value in values.values()):
+            # 指標が求められないまま予算を使い切らないよう、最初の組で観測が無ければ打ち切る
+            print(f"❌ 最初の組（シード {seed}）のどちらのゲームからも{metric_label}が求められませんでした。ログを確認してください: {run_dir}")
+            return 1
+
+        prob_b, _, _ = test.posterior()
+        decision = test.decision()
+        history.append({"pair": pair, "seed": seed, "values": values, "prob_b": prob_b})
+        shown = " / ".join(f"{key} {'-' if value is None else f'{value:.2f}'}" for key, value in values.items())
+        print(
+            f"🎲 {pair}組目（シード {seed}）: {shown} | "
+            f"平均 A {test.mean('A'):.3f}・B {test.mean('B'):.3f} | P(B>A) {prob_b:.1%}"
+        )
+
+    prob_b, loss_a, loss_b = test.posterior()
+    conclusion = {
+        "A": f"Aの方が{metric_label}が高い",
+        "B": f"Bの方が{metric_label}が高い",
+        "同等": "差は実質的に無い（期待損失が閾値未満）",
+        None: "予算内では結論が出ませんでした",
+    }[decision]
+    print("-" * 60)
+    print(f"🏁 結論: {conclusion} | P(B>A) {prob_b:.1%} | 期待損失 A {loss_a:.4f}・B {loss_b:.4f}")
+    print(f"💰 {games}ゲーム・LLM呼び出し {calls}回・{time.perf_counter() - started:.0f}秒 | 📁 {run_dir}")
+
+    with open(os.path.join(run_dir, "results.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "config": config,
+            "metric": metric_name,
+            "decision": decision,
+            "prob_b": prob_b,
+            "expected_loss": {"A": loss_a, "B": loss_b},
+            "games": games,
+            "llm_calls": calls,
+            "history": history,
+        }, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
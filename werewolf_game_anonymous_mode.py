@@ -3,7 +3,28 @@ import os
 import random
 import datetime
 import re
-from crewai import Agent, Task, Crew, LLM
+import yaml
+from crewai import Agent, Task
+from werewolf_memory import MemoryMonitor
+from werewolf_profiler import PhaseProfiler
+from werewolf_trace import TraceRecorder
+from werewolf_config import resolve_seed
+from werewolf_catalog import GameCatalog
+from werewolf_search import TranscriptIndex
+from werewolf_ledger import ClaimLedger
+from werewolf_channels import PrivateChannels
+from werewolf_bots import assign_bot_seats, assign_game_master
+from werewolf_consensus import DiscussionController
+from werewolf_spectator import open_spectator_channel, SECRET_PHASES
+from werewolf_llm_client import setup_llm, format_pool_report
+from werewolf_llm_guard import KickoffGuard
+from werewolf_validator import OutputValidator
+from werewolf_bulk_vote import BulkVoter
+from werewolf_budget import GameBudget
+from werewolf_speculation import SpeculativeDiscussion
+from werewolf_thinking import ThinkingPolicy
+from werewolf_branch import BranchPoint
+from werewolf_transcript import TranscriptStore
 
 # --------------------------------------------------------------------
 # 1. ユーティリティ関数
@@ -43,7 +64,7 @@ def extract_clean_speech(raw_output):
     
     for line in lines:
         line = line.strip()
-        if line and re.search(r'[ひらがなカタカナ漢字]', line):
+        if line and re.search(r'[\u3040-\u30ff\u3400-\u9fff]', line):
             japanese_lines.append(line)
     
     if japanese_lines:
@@ -56,32 +77,31 @@ def extract_clean_speech(raw_output):
     
     return "（発言なし）"
 
-# --------------------------------------------------------------------
-# 2. LLM（大規模言語モデル）のセットアップ
-# --------------------------------------------------------------------
-def setup_llm():
-    """Gemini LLMを初期化（CrewAI 0.134.0版）"""
-    try:
-        api_key = os.environ.get("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY環境変数が設定されていません")
-        
-        llm = LLM(
-            model="gemini/gemini-2.5-flash",
-            api_key=api_key,
-            temperature=0.8  # 人狼ゲームは創造性が重要なので高めに設定
-        )
-        print("✅ LLM初期化成功")
-        return llm
-    except Exception as e:
-        print(f"❌ LLM初期化エラー: {e}")
-        exit(1)
+def load_personalities(path):
+    """性格パターンの一覧をYAMLファイルから読み込む（未指定ならNone）
+
+    形式: [{name: 性格名, description: 説明}, ...]（人数に足りなければ先頭から繰り返して使う）
+    """
+    if not path:
+        return None
+    with open(path, encoding="utf-8") as f:
+        entries = yaml.safe_load(f)
+    if not entries:
+        raise ValueError(f"性格パターンがありません: {path}")
+    return [(entry["name"], entry["description"]) for entry in entries]
 
 # --------------------------------------------------------------------
 # 2. ログ管理クラス
 # --------------------------------------------------------------------
 class WerewolfLogger:
-    def __init__(self):
+    def __init__(self, tracer=None):
+        # 発言などの構造化イベントを受け取るリスナー（検索インデックス・観戦サーバーなど）
+        self.listeners = []
+        # ログ出力・リスナーの処理時間をタイムラインに記録（WEREWOLF_TRACE=1 のときのみ）
+        self.tracer = tracer if tracer is not None else TraceRecorder(enabled=False)
+        # 観戦中だけ、発言・投票をUTF-8のバッファ1つにまとめた発言ログに保持し、リスナーにはビューを渡す
+        self.transcript = None
+        
         # warewolf_logs ディレクトリを作成（既存でもエラーなし）
         os.makedirs("warewolf_logs", exist_ok=True)
         
@@ -90,6 +110,12 @@ class WerewolfLogger:
         timestamp_str = timestamp.strftime("%Y%m%d%H%M%S")
         self.log_file = f"warewolf_logs/anonymous_mode_{timestamp_str}.md"
         
+        # 同じ秒に複数ゲームが始まった場合（圧縮済みログを含む）は連番を付けて上書きを防ぐ
+        suffix = 1
+        while os.path.exists(self.log_file) or os.path.exists(self.log_file + ".gz"):
+            suffix += 1
+            self.log_file = f"warewolf_logs/anonymous_mode_{timestamp_str}_{suffix}.md"
+        
         # ログファイルを初期化
         with open(self.log_file, 'w', encoding='utf-8') as f:
             f.write(f"🎭 CrewAI人狼ゲーム（匿名モード） ログ - {timestamp.strftime('%Y%m%d%H%M%S')}\n")
@@ -97,11 +123,49 @@ class WerewolfLogger:
         
         print(f"📝 ログファイル作成: {self.log_file}")
     
+    def add_listener(self, listener):
+        """構造化イベント（dict）を受け取るリスナーを登録"""
+        self.listeners.append(listener)
+    
+    def emit(self, event):
+        """リスナーにイベントを通知（リスナーの失敗でゲームを止めない）"""
+        for listener in self.listeners:
+            try:
+                with self.tracer.span(getattr(listener, "__qualname__", "listener").split(".<locals>")[0], "listener"):
+                    listener(event)
+            except Exception as e:
+                print(f"⚠️ ログリスナーエラー: {e}")
+    
+    def log_speech(self, day_num, phase, speaker, display_name, text, label=""):
+        """発言・投票を表示・記録し、リスナーに通知（発言ログがあればイベントはそのビュー）"""
+        if self.transcript is None:
+            speech = {
+                "type": "speech",
+                "day": day_num,
+                "phase": phase,
+                "speaker": speaker,
+                "display_name": display_name,
+                "text": text,
+            }
+            self.log_and_print(f"\n{display_name}{label}: {text}")
+            self.emit(speech)
+            return speech
+        speech = self.transcript.add(day_num, phase, speaker, display_name, text, label)
+        self._write(speech.log["message"])
+        self.emit(speech.log)
+        self.emit(speech)
+        return speech
+    
     def log_and_print(self, message):
         """メッセージをコンソールに表示し、ログファイルにも記録"""
-        print(message)
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(message + "\n")
+        self._write(message)
+        self.emit({"type": "log", "message": message})
+    
+    def _write(self, message):
+        with self.tracer.span("ログ出力", "logger"):
+            print(message)
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(message + "\n")
     
     def log_phase(self, phase_name, day_num=None):
         """フェーズの開始をログ"""
@@ -130,6 +194,19 @@ class WerewolfGameState:
         self.game_over = False
         self.winner = None
         
+        # 再現用の乱数シードとゲームごとの乱数生成器
+        self.seed = None
+        self.rng = random.Random()
+        
+        # LLM呼び出し回数（カタログに記録）
+        self.llm_calls = 0
+        
+        # 投票・CO・占い結果の情報整理表（ClaimLedger）
+        self.ledger = None
+        
+        # 陣営・役職ごとの秘密チャンネル（PrivateChannels）
+        self.channels = None
+        
         # ランダム化された役職配置（実行時まで不明）
         self.werewolves = []
         self.madman = None
@@ -156,13 +233,13 @@ def setup_random_roles(game_state):
     ]
     
     # 9つの名前をランダム選択
-    selected_names = random.sample(possible_names, 9)
+    selected_names = game_state.rng.sample(possible_names, 9)
     
     # 役職リストを作成
     roles = ['werewolf'] * 2 + ['madman'] + ['fortune_teller'] + ['knight'] + ['citizen'] * 4
     
     # シャッフル
-    random.shuffle(roles)
+    game_state.rng.shuffle(roles)
     
     # 役職とプレイヤー名をマッピング
     for i, (name, role) in enumerate(zip(selected_names, roles)):
@@ -185,12 +262,12 @@ def setup_random_roles(game_state):
 # --------------------------------------------------------------------
 # 4. 匿名化されたエージェント作成
 # --------------------------------------------------------------------
-def create_werewolf_agents(llm, player_names):
+def create_werewolf_agents(llm, player_names, rng=random):
     """人狼ゲームの各プレイヤーエージェントを作成（ランダム名前版）"""
     agents = {}
     
-    # プレイヤー性格パターン
-    personalities = [
+    # プレイヤー性格パターン（WEREWOLF_PERSONALITIES のYAMLで差し替え可能。A/B実験の変種などに使う）
+    personalities = load_personalities(os.environ.get("WEREWOLF_PERSONALITIES")) or [
         ("論理的思考", "冷静沈着で戦略的思考に優れ、論理的な推理と分析を得意とします"),
         ("演技力・心理戦", "卓越した演技力を持ち、相手の心を読み取ることが得意です"),
         ("大胆・予測不能", "常識にとらわれない発想と行動力で、予測不可能な行動を取ります"),
@@ -219,12 +296,12 @@ def create_werewolf_agents(llm, player_names):
     
     # ランダムなプレイヤーたちを作成
     for i, name in enumerate(player_names):
-        personality_name, personality_desc = personalities[i]
+        personality_name, personality_desc = personalities[i % len(personalities)]
         
         agent = Agent(
             role=f'{name}',
             goal='戦略的思考と推理力で勝利を目指す',
-            backstory=f"""あなたは{personality_desc}。人狼ゲーム歴{random.randint(2,5)}年のプレイヤーで、
+            backstory=f"""あなたは{personality_desc}。人狼ゲーム歴{rng.randint(2,5)}年のプレイヤーで、
             {personality_name}のスタイルで他のプレイヤーとの駆け引きを楽しみます。
             勝利に向けて最適な戦略を練り、場の流れを読みながら行動します。
             
@@ -295,6 +372,9 @@ def create_day_discussion_tasks(agents, game_state, day_num):
     """昼の議論タスクを作成"""
     tasks = []
     
+    # 投票・CO・占い結果の情報整理表（議論の全文の代わりに要点だけを渡す）
+    ledger_text = game_state.ledger.render(day_num) if game_state.ledger else ""
+    
     # ゲームマスターの朝の発表
     morning_announcement = Task(
         description=f"""
@@ -325,6 +405,8 @@ def create_day_discussion_tasks(agents, game_state, day_num):
             
             現在の生存者: {', '.join(game_state.alive_players)}
             
+            {ledger_text}
+            
             他のプレイヤーの発言を注意深く聞き、推理と意見を述べてください。
             - 疑わしいと思う相手への質問
             - これまでの発言の矛盾点の指摘
@@ -347,6 +429,9 @@ def create_voting_tasks(agents, game_state):
     """投票フェーズのタスクを作成"""
     tasks = []
     
+    # 投票・CO・占い結果の情報整理表（議論の全文の代わりに要点だけを渡す）
+    ledger_text = game_state.ledger.render(game_state.day_count) if game_state.ledger else ""
+    
     alive_players = [name for name in game_state.alive_players if name != 'game_master']
     
     for agent_name in alive_players:
@@ -356,6 +441,8 @@ def create_voting_tasks(agents, game_state):
             
             投票候補者: {', '.join(alive_players)}
             
+            {ledger_text}
+            
             以下を考慮して投票してください：
             - これまでの発言の整合性
             - 疑わしい行動パターン
@@ -382,8 +469,20 @@ def create_voting_tasks(agents, game_state):
 # --------------------------------------------------------------------
 def main():
     """人狼ゲームのメイン実行関数（匿名モード）"""
+    # タイムライン記録（WEREWOLF_TRACE=1 で有効、Perfettoで開けるJSONを出力）
+    tracer = TraceRecorder()
+    tracer.phase("準備")
+    
     # ログシステム初期化
-    logger = WerewolfLogger()
+    logger = WerewolfLogger(tracer)
+    
+    # メモリ計測（WEREWOLF_MEMORY_PROFILE=1 で有効）と履歴保持上限
+    memory = MemoryMonitor(game_label=logger.log_file)
+    memory.sample("ゲーム開始")
+    
+    # CPUプロファイル（WEREWOLF_PROFILE=cprofile で有効、フェーズごとに計測）
+    profiler = PhaseProfiler(game_label=logger.log_file)
+    profiler.begin("準備")
     
     logger.log_and_print("=" * 80)
     logger.log_and_print("🎭 CrewAI人狼ゲーム - 10人村（匿名モード）🎭")
@@ -396,138 +495,330 @@ def main():
     logger.log_and_print("🤖 LLM初期化中...")
     llm = setup_llm()
     
+    # LLM呼び出しの期限・再試行・ヘッジ・フォールバックと、出力の検証・修復を管理（夜の行動の通知は内容を伏せる）
+    guard = KickoffGuard(validator=OutputValidator(), profiler=profiler, tracer=tracer, secret_kinds=SECRET_PHASES)
+    
+    # 実行時間・呼び出し回数・トークンの予算（WEREWOLF_BUDGET_*、残りが減ると段階的に縮退）
+    budget = GameBudget()
+    budget.attach(guard)
+    
+    # タスクの種類ごとの思考予算（GMの発表・投票は思考なし、人狼の作戦会議は多め。WEREWOLF_THINKING=0 で無効）
+    thinking = ThinkingPolicy(llm)
+    thinking.attach(guard)
+    
+    # 応答の記録（WEREWOLF_RECORD=1）と、werewolf_branch.py による分岐実行での分岐前の再生
+    branches = BranchPoint(logger.log_file, log=logger.log_and_print)
+    branches.attach(guard)
+    
+    # 次の発言者の先読み（WEREWOLF_SPECULATE=1 で有効）
+    speculator = SpeculativeDiscussion(guard, lambda: game_state.ledger)
+    
     # ゲーム状態初期化とランダム役職配置
     logger.log_and_print("🎲 ランダム役職配置中...")
     game_state = WerewolfGameState()
+    game_state.seed = resolve_seed()
+    game_state.rng.seed(game_state.seed)
+    branches.start("anonymous", game_state.seed)
     player_names = setup_random_roles(game_state)
     
-    # エージェント作成
-    logger.log_and_print("👥 9人の匿名プレイヤー作成中...")
-    agents = create_werewolf_agents(llm, player_names)
-    logger.log_and_print("✅ 人狼ゲームエージェント作成完了")
+    # ゲームカタログに登録（前回までのログは圧縮・ローテーション）
+    catalog = GameCatalog()
+    game_id = catalog.register_game("anonymous", game_state.seed, logger.log_file, game_state.player_role_mapping)
+    catalog.maintain(exclude_game_id=game_id)
     
-    logger.log_and_print("\n🎯 今回のプレイヤー構成:")
-    for name in player_names:
-        logger.log_and_print(f"👤 {name}さん")
-    logger.log_and_print("")
-    logger.log_and_print("🔍 役職は完全にランダム配置されました！")
-    logger.log_and_print("🐺 人狼2名 | 🃏 狂人1名 | 🔮 占い師1名 | 🛡️ 騎士1名 | 👥 市民4名")
-    logger.log_and_print("📝 ソースコードを読んでも役職配置はわかりません！")
-    logger.log_and_print("")
-    
-    # ゲームループ開始
-    max_days = 4  # 最大4日間で制限
-    while not game_state.game_over and game_state.day_count < max_days:
-        game_state.day_count += 1
-        
-        logger.log_phase(f"📅 {game_state.day_count}日目開始", game_state.day_count)
-        logger.log_and_print(f"生存者: {len(game_state.alive_players)}名")
-        
-        # 夜フェーズ（人狼会話は非表示）
-        logger.log_and_print(f"\n🌙 {game_state.day_count}日目の夜")
-        if game_state.day_count == 1:
-            logger.log_and_print("※ 初日なので襲撃は行われません")
-        logger.log_and_print("※ 人狼の会話は見えません...")
-        logger.log_and_print("-" * 60)
-        
-        # 夜の行動（完全秘匿実行）
-        logger.log_and_print(f"\n🌙 夜が更けていきます...")
-        logger.log_and_print("💤 村は静寂に包まれています...")
-        logger.log_and_print("🌟 何かが起こっているかもしれませんが、誰にもわかりません...")
-        
-        night_action_tasks = create_night_action_tasks(agents, game_state, game_state.day_count)
-        
-        if night_action_tasks:
-            # 完全に裏で実行（一切の情報を隠蔽）
-            for task in night_action_tasks:
-                try:
-                    single_crew = Crew(
-                        agents=[task.agent],
-                        tasks=[task],
-                        verbose=False
-                    )
-                    result = single_crew.kickoff()
-                    # 結果は内部処理のみ、一切表示しない
-                except Exception as e:
-                    # エラーも隠蔽（ゲームの公平性のため）
-                    pass
-        
-        logger.log_and_print("🌅 夜が明けようとしています...")
-        
-        # 昼フェーズ
-        logger.log_and_print(f"\n☀️ {game_state.day_count}日目の昼 - 議論フェーズ")
-        logger.log_and_print("-" * 60)
-        
-        day_discussion_tasks = create_day_discussion_tasks(agents, game_state, game_state.day_count)
-        
-        if day_discussion_tasks:
-            # 各プレイヤーの発言を個別に実行
-            for i, task in enumerate(day_discussion_tasks):
-                try:
-                    single_crew = Crew(
-                        agents=[task.agent],
-                        tasks=[task],
-                        verbose=False  # Agent Final Answerを隠すため
-                    )
-                    
-                    # プレイヤー名を特定
-                    if i == 0:
-                        player_name = "🎭ゲームマスター"
-                    else:
-                        current_players = [name for name in game_state.alive_players if name != 'game_master']
-                        player_name = f"👤{current_players[i-1]}さん" if i-1 < len(current_players) else f"プレイヤー{i}"
+    # 例外やCtrl+Cで止まったゲームも中断として終了扱いにする（ログの圧縮・ローテーションと分析の対象にする）
+    finished = False
+    transcript_index = None
+    spectators = None
+    try:
+        # 発言・投票を全文検索インデックスへ逐次登録
+        transcript_index = TranscriptIndex()
+        logger.add_listener(transcript_index.listener(game_id))
+    
+        # 発言・投票から情報整理表を逐次更新
+        game_state.ledger = ClaimLedger(game_state.alive_players)
+        logger.add_listener(game_state.ledger.listener())
+    
+        # 議論の疑いの集中度を発言ごとに集計（WEREWOLF_CONSENSUS_THRESHOLD で早期終了）
+        consensus = DiscussionController()
+        logger.add_listener(consensus.listener(lambda: game_state.alive_players))
+    
+        # 調査結果・保護履歴（本人のプロンプトにだけ差し込む。匿名版には人狼の夜会話は無い）
+        game_state.channels = PrivateChannels()
+        game_state.channels.open('fortune', "【あなたの調査結果（あなただけが知っています）】", [game_state.fortune_teller], max_entries=8, max_chars=60, retention_days=0)
+        game_state.channels.open('knight', "【あなたの保護履歴（あなただけが知っています）】", [game_state.knight], max_entries=4, max_chars=60)
+    
+        # ライブ観戦サーバーへ配信（WEREWOLF_SPECTATOR_PORT を指定した場合のみ）
+        spectators = open_spectator_channel(game_id, logger.log_file, secret=True)
+        if spectators:
+            logger.add_listener(spectators.listener())
+            # 途中参加の観戦者への再送は発言ログのビューで行う（観戦しないなら誰も読み返さないので持たない）
+            logger.transcript = memory.register(TranscriptStore())
+    
+        # 全員の投票を1回の呼び出しでまとめる一括投票（WEREWOLF_BULK_VOTE=1 で有効）
+        bulk_voter = BulkVoter(llm)
+    
+        # エージェント作成
+        logger.log_and_print("👥 9人の匿名プレイヤー作成中...")
+        agents = create_werewolf_agents(llm, player_names, game_state.rng)
+        logger.log_and_print("✅ 人狼ゲームエージェント作成完了")
+    
+        # 一部の席をルールベースのボットにする（WEREWOLF_BOT_SEATS、LLM呼び出しを席数に比例して削減）
+        guard.bots = assign_bot_seats(game_state, agents)
+        # 朝の発表はゲームの状態から定型文で組み立てる（WEREWOLF_GM_MODE=llm でLLMのゲームマスター）
+        guard.bots.update(assign_game_master(game_state, agents))
+    
+        logger.log_and_print("\n🎯 今回のプレイヤー構成:")
+        for name in player_names:
+            logger.log_and_print(f"👤 {name}さん")
+        logger.log_and_print("")
+        logger.log_and_print("🔍 役職は完全にランダム配置されました！")
+        logger.log_and_print("🐺 人狼2名 | 🃏 狂人1名 | 🔮 占い師1名 | 🛡️ 騎士1名 | 👥 市民4名")
+        logger.log_and_print("📝 ソースコードを読んでも役職配置はわかりません！")
+        logger.log_and_print("")
+    
+        # ゲームループ開始
+        max_days = 4  # 最大4日間で制限
+        while not game_state.game_over and game_state.day_count < max_days and not budget.exhausted():
+            game_state.day_count += 1
+        
+            logger.log_phase(f"📅 {game_state.day_count}日目開始", game_state.day_count)
+            logger.log_and_print(f"生存者: {len(game_state.alive_players)}名")
+        
+            profiler.begin(f"{game_state.day_count}日目_夜")
+            tracer.phase(f"{game_state.day_count}日目_夜")
+            branches.begin(f"{game_state.day_count}日目_夜", game_state)
+            # 夜フェーズ（人狼会話は非表示）
+            logger.log_and_print(f"\n🌙 {game_state.day_count}日目の夜")
+            if game_state.day_count == 1:
+                logger.log_and_print("※ 初日なので襲撃は行われません")
+            logger.log_and_print("※ 人狼の会話は見えません...")
+            logger.log_and_print("-" * 60)
+        
+            # 夜の行動（完全秘匿実行）
+            logger.log_and_print(f"\n🌙 夜が更けていきます...")
+            logger.log_and_print("💤 村は静寂に包まれています...")
+            logger.log_and_print("🌟 何かが起こっているかもしれませんが、誰にもわかりません...")
+        
+            night_action_tasks = create_night_action_tasks(agents, game_state, game_state.day_count)
+        
+            if night_action_tasks:
+                # 完全に裏で実行（一切の情報を隠蔽）
+                for task in night_action_tasks:
+                    try:
+                        # エージェントの役割名はプレイヤー名そのもの
+                        actor = task.agent.role
+                        game_state.channels.inject(task, actor)
+                        result = guard.kickoff(task, "night_action", verbose=False)
+                        # 結果は内部処理のみ、一切表示しない（調査結果・保護先は本人のチャンネルにだけ記録）
+                        action, value = game_state.channels.record_night_action(
+                            game_state.day_count, actor, str(result), game_state.alive_players,
+                            game_state.player_role_mapping.get, {'werewolf': '人狼', 'human': '人間', 'guard': '保護'},
+                        )
+                        if action == 'fortune':
+                            game_state.fortune_results.append((game_state.day_count,) + value)
+                        elif action == 'knight':
+                            game_state.protected_player = value
+                    except Exception as e:
+                        # エラーも隠蔽（ゲームの公平性のため）
+                        pass
+        
+            logger.log_and_print("🌅 夜が明けようとしています...")
+        
+            memory.sample(f"{game_state.day_count}日目 夜")
+        
+            if budget.exhausted():
+                break
+        
+            profiler.begin(f"{game_state.day_count}日目_議論")
+            tracer.phase(f"{game_state.day_count}日目_議論")
+            branches.begin(f"{game_state.day_count}日目_議論", game_state)
+            # 昼フェーズ
+            logger.log_and_print(f"\n☀️ {game_state.day_count}日目の昼 - 議論フェーズ")
+            logger.log_and_print("-" * 60)
+        
+            day_discussion_tasks = create_day_discussion_tasks(agents, game_state, game_state.day_count)
+        
+            if day_discussion_tasks:
+                # 発言者の順番（ゲームマスター→生存者）を先読みに登録
+                speculator.start_day(
+                    day_discussion_tasks,
+                    ['game_master'] + [name for name in game_state.alive_players if name != 'game_master'],
+                    game_state.channels.inject,
+                )
+                previous_speaker, previous_text = 'game_master', ""
+            
+                # 各プレイヤーの発言を個別に実行
+                for i, task in enumerate(day_discussion_tasks):
+                    try:
+                        # プレイヤー名を特定
+                        if i == 0:
+                            speaker = 'game_master'
+                            player_name = "🎭ゲームマスター"
+                        else:
+                            current_players = [name for name in game_state.alive_players if name != 'game_master']
+                            speaker = current_players[i-1] if i-1 < len(current_players) else f"player{i}"
+                            player_name = f"👤{current_players[i-1]}さん" if i-1 < len(current_players) else f"プレイヤー{i}"
                     
-                    logger.log_and_print(f"\n{player_name}が発言中...")
+                        logger.log_and_print(f"\n{player_name}が発言中...")
                     
-                    result = single_crew.kickoff()
-                    # 思考過程を除去してクリーンな発言のみ抽出
-                    clean_result = extract_clean_speech(str(result))
-                    logger.log_and_print(f"\n{player_name}: {clean_result}")
+                        phase = "announcement" if i == 0 else "discussion"
+                        # 先読みした下書きがあれば使い（採用・修正の前にclaimが次の発言者を先読み）、無ければ次の発言者を先読みしながら生成
+                        result = speculator.claim(i, previous_speaker, previous_text)
+                        if result is None:
+                            game_state.channels.inject(task, speaker)
+                            speculator.prefetch(i + 1)
+                            result = guard.kickoff(task, phase, verbose=False)
+                        # 思考過程を除去してクリーンな発言のみ抽出
+                        clean_result = extract_clean_speech(str(result))
+                        logger.log_speech(game_state.day_count, phase, speaker, player_name, clean_result)
+                        previous_speaker, previous_text = speaker, clean_result
                     
-                except Exception as e:
-                    logger.log_and_print(f"❌ {player_name}の発言エラー: {e}")
-        
-        # 投票フェーズ
-        logger.log_and_print(f"\n🗳️ {game_state.day_count}日目の投票フェーズ")
-        logger.log_and_print("-" * 60)
-        
-        voting_tasks = create_voting_tasks(agents, game_state)
-        
-        if voting_tasks:
-            # 各プレイヤーの投票を個別に実行
-            for i, task in enumerate(voting_tasks):
-                try:
-                    single_crew = Crew(
-                        agents=[task.agent],
-                        tasks=[task],
-                        verbose=False  # Agent Final Answerを隠すため
-                    )
+                        # 村の意見が固まったら残りの発言を省略して投票へ
+                        remaining = len(day_discussion_tasks) - 1 - i
+                        if i > 0 and consensus.should_stop(remaining, len(game_state.alive_players)):
+                            target, share = consensus.concentration()
+                            logger.log_and_print(f"\n🤝 議論が{target}さんに収束しました（疑いの集中度 {share:.0%}）。残り{remaining}人の発言を省略して投票へ進みます")
+                            break
+                        # 予算が残り少ないときは発言者を半分に減らし、使い切ったら打ち切る
+                        if i > 0 and remaining > 0 and budget.cut_discussion(i, len(day_discussion_tasks) - 1):
+                            logger.log_and_print(f"\n💸 予算節約のため残り{remaining}人の発言を省略して投票へ進みます")
+                            break
+                        if budget.exhausted():
+                            break
                     
-                    # プレイヤー名を特定
-                    current_players = [name for name in game_state.alive_players if name != 'game_master']
-                    player_name = f"👤{current_players[i]}さん" if i < len(current_players) else f"プレイヤー{i+1}"
+                    except Exception as e:
+                        logger.log_and_print(f"❌ {player_name}の発言エラー: {e}")
+        
+            speculator.finish_day()
+            memory.sample(f"{game_state.day_count}日目 議論")
+        
+            if budget.exhausted():
+                break
+        
+            profiler.begin(f"{game_state.day_count}日目_投票")
+            tracer.phase(f"{game_state.day_count}日目_投票")
+            branches.begin(f"{game_state.day_count}日目_投票", game_state)
+            # 投票フェーズ
+            logger.log_and_print(f"\n🗳️ {game_state.day_count}日目の投票フェーズ")
+            logger.log_and_print("-" * 60)
+        
+            voting_tasks = create_voting_tasks(agents, game_state)
+        
+            if voting_tasks:
+                # 一括投票が有効なら先にまとめて決める（形式が崩れた投票者だけ個別に実行）
+                voters = [name for name in game_state.alive_players if name != 'game_master']
+                bulk_votes = bulk_voter.collect(guard, voters, voters, agents, game_state)
+            
+                # 各プレイヤーの投票を個別に実行
+                for i, task in enumerate(voting_tasks):
+                    if budget.exhausted():
+                        break
+                    try:
+                        # プレイヤー名を特定
+                        current_players = [name for name in game_state.alive_players if name != 'game_master']
+                        speaker = current_players[i] if i < len(current_players) else f"player{i+1}"
+                        player_name = f"👤{current_players[i]}さん" if i < len(current_players) else f"プレイヤー{i+1}"
                     
-                    logger.log_and_print(f"\n{player_name}が投票中...")
+                        logger.log_and_print(f"\n{player_name}が投票中...")
                     
-                    result = single_crew.kickoff()
-                    # 思考過程を除去してクリーンな投票のみ抽出
-                    clean_result = extract_clean_speech(str(result))
-                    logger.log_and_print(f"\n{player_name}の投票: {clean_result}")
+                        if speaker in bulk_votes:
+                            result = bulk_votes[speaker]
+                        else:
+                            game_state.channels.inject(task, speaker)
+                            result = guard.kickoff(task, "vote", verbose=False)
+                        # 思考過程を除去してクリーンな投票のみ抽出
+                        clean_result = extract_clean_speech(str(result))
+                        logger.log_speech(game_state.day_count, "vote", speaker, player_name, clean_result, label="の投票")
                     
-                except Exception as e:
-                    logger.log_and_print(f"❌ {player_name}の投票エラー: {e}")
-        
-        logger.log_and_print(f"\n✅ {game_state.day_count}日目終了")
-    
-    logger.log_and_print(f"\n🎉 人狼ゲーム完了！")
-    logger.log_and_print(f"📊 総日数: {game_state.day_count}日")
-    logger.log_and_print("🕵️ さあ、あなたの推理は当たっていましたか？")
-    logger.log_and_print("\n🔍 答え合わせ:")
-    logger.log_and_print(f"🐺 人狼: {', '.join([f'{w}さん' for w in game_state.werewolves])}")
-    logger.log_and_print(f"🃏 狂人: {game_state.madman}さん")
-    logger.log_and_print(f"🔮 占い師: {game_state.fortune_teller}さん")
-    logger.log_and_print(f"🛡️ 騎士: {game_state.knight}さん")
-    logger.log_and_print(f"👥 市民: {', '.join([f'{c}さん' for c in game_state.citizens])}")
+                    except Exception as e:
+                        logger.log_and_print(f"❌ {player_name}の投票エラー: {e}")
+        
+            memory.sample(f"{game_state.day_count}日目 投票")
+        
+            # 保持期間を超えた履歴を破棄（長時間稼働するワーカーでのメモリ増加を防ぐ）
+            memory.enforce_cap(agents, game_state.day_count)
+        
+            logger.log_and_print(f"\n✅ {game_state.day_count}日目終了")
+    
+        # 予算を使い切って打ち切った場合は、直近の投票から判定勝ちを決める
+        # （判定理由は役職に触れるので、表示は答え合わせの後）
+        adjudication = budget.finish(game_state, game_state.player_role_mapping.get) if budget.stopped else None
+    
+        logger.log_and_print(f"\n🎉 人狼ゲーム完了！")
+        logger.log_and_print(f"📊 総日数: {game_state.day_count}日")
+        logger.log_and_print(f"🎲 シード: {game_state.seed}（WEREWOLF_SEED={game_state.seed} で同じ配役を再現できます）")
+        logger.log_and_print("🕵️ さあ、あなたの推理は当たっていましたか？")
+    
+        # 答え合わせ以降は観戦者にも役職を配信
+        if spectators:
+            spectators.reveal()
+        logger.log_and_print("\n🔍 答え合わせ:")
+        logger.log_and_print(f"🐺 人狼: {', '.join([f'{w}さん' for w in game_state.werewolves])}")
+        logger.log_and_print(f"🃏 狂人: {game_state.madman}さん")
+        logger.log_and_print(f"🔮 占い師: {game_state.fortune_teller}さん")
+        logger.log_and_print(f"🛡️ 騎士: {game_state.knight}さん")
+        logger.log_and_print(f"👥 市民: {', '.join([f'{c}さん' for c in game_state.citizens])}")
+        bot_seats = [bot.name for bot in guard.bots.values() if bot.name != 'game_master']
+        if bot_seats:
+            logger.log_and_print(f"🤖 ボット席: {', '.join([f'{name}さん' for name in bot_seats])}")
+        if adjudication:
+            logger.log_and_print("\n" + adjudication)
+    
+        # 応答の記録
+        branches.finish(game_state)
+    
+        # メモリレポート
+        if memory.enabled:
+            logger.log_and_print(memory.format_report())
+            if logger.transcript is not None:
+                logger.log_and_print(logger.transcript.format_report())
+    
+        # LLM呼び出しの統計
+        logger.log_and_print(guard.format_report())
+        pool_report = format_pool_report()
+        if pool_report:
+            logger.log_and_print(pool_report)
+        logger.log_and_print(guard.validator.format_report())
+        if consensus.enabled:
+            logger.log_and_print(consensus.format_report())
+        if bulk_voter.enabled:
+            logger.log_and_print(bulk_voter.format_report())
+        if budget.enabled:
+            logger.log_and_print(budget.format_report())
+        if speculator.enabled:
+            logger.log_and_print(speculator.format_report())
+        if branches.enabled:
+            logger.log_and_print(branches.format_report())
+        if thinking.supported:
+            logger.log_and_print(thinking.format_report())
+            thinking.finish()
+        finished = True
+    finally:
+        # 中断したゲームでも、tracemallocの利用数・検索インデックスの接続・観戦者への終了通知を後始末する
+        memory.finish()
+        if transcript_index is not None:
+            transcript_index.close()
+    
+        # タイムライン（Chrome Trace Event形式）
+        trace_path = tracer.finish(logger.log_file)
+        if trace_path:
+            logger.log_and_print(f"🧵 タイムライン: {trace_path}（https://ui.perfetto.dev で開けます）")
+    
+        # CPUプロファイル（フェーズごとの.profと、全フェーズ合算の上位N関数レポート）
+        profile_report = profiler.finish()
+        if profile_report:
+            logger.log_and_print(f"🔬 CPUプロファイル: {profile_report}")
+        if spectators:
+            spectators.finish()
+    
+        # カタログに結果を記録
+        game_state.llm_calls = guard.calls
+        catalog.finish_game(
+            game_id, game_state.winner, game_state.day_count, game_state.llm_calls, game_state.dead_players,
+            aborted=not finished,
+        )
+        catalog.close()
 
 if __name__ == "__main__":
     main()
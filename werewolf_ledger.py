@@ -0,0 +1,202 @@
+# CrewAI人狼ゲーム - 投票・CO・占い結果の情報整理表（プロンプト用）
+import re
+import numpy as np
+
+# CO（カミングアウト）として扱う役職と、発言中の表記
+CLAIM_ROLES = ['fortune_teller', 'knight', 'citizen']
+CLAIM_LABELS = {'fortune_teller': '占い師', 'knight': '騎士', 'citizen': '市民'}
+CLAIM_WORDS = {'占い師': 'fortune_teller', '占い': 'fortune_teller', '騎士': 'knight', '狩人': 'knight', '市民': 'citizen', '村人': 'citizen'}
+
+CO_PATTERN = re.compile(
+    r'(占い師|占い|騎士|狩人|市民|村人)\s*(?:を|と)?\s*(?:CO|ＣＯ|co|カミングアウト)'
+    r'|(?:私|僕|俺|わたし|ぼく|おれ)(?:は|が|こそ)(?:本物の|真の)?(占い師|騎士|狩人)(?:です|だ)'
+)
+VOTE_PATTERN = re.compile(r'【投票】\s*(.+?)\s*に投票')
+BLACK_WORDS = ('人狼', '黒', '●')
+WHITE_WORDS = ('人間', '白', '○', '村人')
+
+NO_VALUE = -1
+RESULT_LABELS = {0: '○白', 1: '●黒'}
+
+# --------------------------------------------------------------------
+# 1. 発言の簡易解析
+# --------------------------------------------------------------------
+def find_player(text, candidates):
+    """文字列に含まれるプレイヤー名を探す（長い名前を優先し、見つからなければNone）"""
+    for name in sorted(candidates, key=len, reverse=True):
+        if name and name in text:
+            return name
+    return None
+
+def parse_vote_target(text, candidates):
+    """投票発言から投票先を取り出す（形式が崩れていれば最初に出てきた候補者名）"""
+    match = VOTE_PATTERN.search(text)
+    if match:
+        target = find_player(match.group(1), candidates)
+        if target:
+            return target
+
+    # 【投票】形式が無い場合は、最初に名前が出てきたプレイヤーを投票先とみなす
+    positions = [(text.find(name), name) for name in candidates if name and name in text]
+    return min(positions)[1] if positions else None
+
+def parse_claims(text):
+    """発言からCOした役職を取り出す（最初に見つかったもの）"""
+    match = CO_PATTERN.search(text)
+    if not match:
+        return None
+    word = match.group(1) or match.group(2)
+    return CLAIM_WORDS.get(word)
+
+def parse_fortune_results(text, candidates):
+    """「○○さんは人狼でした」のような占い結果の主張を取り出す: [(対象, 0=白/1=黒)]"""
+    results = []
+    for sentence in re.split(r'[。\n！!]', text):
+        if '占' not in sentence and '結果' not in sentence and '●' not in sentence and '○' not in sentence:
+            continue
+        target = find_player(sentence, candidates)
+        if not target:
+            continue
+        tail = sentence[sentence.find(target) + len(target):]
+        if any(word in tail for word in BLACK_WORDS):
+            results.append((target, 1))
+        elif any(word in tail for word in WHITE_WORDS):
+            results.append((target, 0))
+    return results
+
+# --------------------------------------------------------------------
+# 2. 情報整理表クラス
+# --------------------------------------------------------------------
+class ClaimLedger:
+    """誰が誰に投票したか・誰が何をCOしたか・どんな占い結果が主張されたかを配列で保持
+
+    発言のたびに簡易解析で更新し、プロンプトには固定サイズの表として埋め込む。
+    ゲームが長くなっても表の大きさは変わらない。
+    """
+
+    def __init__(self, player_names, max_days=8, max_fortune_claims=32):
+        self.players = list(player_names)
+        self.index = {name: i for i, name in enumerate(self.players)}
+        count = len(self.players)
+
+        # votes[日-1, 投票者] = 投票先（未投票は-1）
+        self.votes = np.full((max_days, count), NO_VALUE, dtype=np.int8)
+        # claims[プレイヤー] = COした役職コード、claim_days[プレイヤー] = COした日
+        self.claims = np.full(count, NO_VALUE, dtype=np.int8)
+        self.claim_days = np.zeros(count, dtype=np.int16)
+        # fortune[k] = (日, 主張者, 対象, 結果) を古い順に保持し、上限を超えたら古いものから上書き
+        self.fortune = np.full((max_fortune_claims, 4), NO_VALUE, dtype=np.int16)
+        self.fortune_count = 0
+        self.updates = 0
+
+    def _ensure_day(self, day):
+        """日数が想定を超えたら投票配列を拡張"""
+        if day > self.votes.shape[0]:
+            extra = np.full((day - self.votes.shape[0], len(self.players)), NO_VALUE, dtype=np.int8)
+            self.votes = np.vstack([self.votes, extra])
+
+    def record_speech(self, day, speaker, text):
+        """昼の発言からCOと占い結果を記録し、表が変わったかを返す"""
+        if speaker not in self.index:
+            return False
+        seat = self.index[speaker]
+        changed = False
+
+        claim = parse_claims(text)
+        if claim and self.claims[seat] != CLAIM_ROLES.index(claim):
+            self.claims[seat] = CLAIM_ROLES.index(claim)
+            self.claim_days[seat] = day
+            changed = True
+
+        others = [name for name in self.players if name != speaker]
+        if self.claims[seat] == CLAIM_ROLES.index('fortune_teller'):
+            for target, result in parse_fortune_results(text, others):
+                if self._has_fortune(seat, self.index[target], result):
+                    continue
+                slot = self.fortune_count % len(self.fortune)
+                self.fortune[slot] = (day, seat, self.index[target], result)
+                self.fortune_count += 1
+                changed = True
+
+        if changed:
+            self.updates += 1
+        return changed
+
+    def _has_fortune(self, claimer, target, result):
+        rows = self.fortune[: min(self.fortune_count, len(self.fortune))]
+        return bool(((rows[:, 1] == claimer) & (rows[:, 2] == target) & (rows[:, 3] == result)).any())
+
+    def record_vote(self, day, voter, text):
+        """投票発言から投票先を記録し、投票先の名前を返す"""
+        if voter not in self.index:
+            return None
+        target = parse_vote_target(text, [name for name in self.players if name != voter])
+        if target is None:
+            return None
+        self._ensure_day(day)
+        self.votes[day - 1, self.index[voter]] = self.index[target]
+        self.updates += 1
+        return target
+
+    def listener(self):
+        """WerewolfLoggerに登録するリスナーを作成"""
+        def on_event(event):
+            if event.get("type") != "speech":
+                return
+            if event.get("phase") == "discussion":
+                self.record_speech(event["day"], event["speaker"], event["text"])
+            elif event.get("phase") == "vote":
+                self.record_vote(event["day"], event["speaker"], event["text"])
+        return on_event
+
+    def vote_tally(self, day):
+        """指定日の得票数（プレイヤー順）"""
+        if day < 1 or day > self.votes.shape[0]:
+            return np.zeros(len(self.players), dtype=np.int64)
+        day_votes = self.votes[day - 1]
+        return np.bincount(day_votes[day_votes >= 0], minlength=len(self.players))
+
+    def render(self, current_day, vote_days=2, max_fortune_rows=6):
+        """プロンプト用の固定サイズの表を作成（直近の投票と最新の占い結果のみ）"""
+        lines = ["【情報整理表】"]
+
+        # CO一覧
+        co_parts = []
+        for code, role in enumerate(CLAIM_ROLES):
+            seats = np.flatnonzero(self.claims == code)
+            if len(seats):
+                names = ", ".join(f"{self.players[s]}({self.claim_days[s]}日目)" for s in seats)
+                co_parts.append(f"{CLAIM_LABELS[role]}: {names}")
+        lines.append("CO: " + (" / ".join(co_parts) if co_parts else "なし"))
+
+        # 主張された占い結果（新しいものから）
+        stored = min(self.fortune_count, len(self.fortune))
+        if stored:
+            order = [(self.fortune_count - 1 - k) % len(self.fortune) for k in range(min(stored, max_fortune_rows))]
+            results = [
+                f"{self.players[self.fortune[k, 1]]}→{self.players[self.fortune[k, 2]]}{RESULT_LABELS[int(self.fortune[k, 3])]}({self.fortune[k, 0]}日目)"
+                for k in reversed(order)
+            ]
+            lines.append("占い結果の主張: " + ", ".join(results))
+        else:
+            lines.append("占い結果の主張: なし")
+
+        # 直近の投票
+        vote_lines = 0
+        first_day = max(1, current_day - vote_days)
+        for day in range(first_day, min(current_day, self.votes.shape[0] + 1)):
+            day_votes = self.votes[day - 1]
+            if not (day_votes >= 0).any():
+                continue
+            pairs = ", ".join(
+                f"{self.players[voter]}→{self.players[target]}"
+                for voter, target in enumerate(day_votes) if target >= 0
+            )
+            tally = self.vote_tally(day)
+            top = ", ".join(f"{self.players[s]}{tally[s]}票" for s in np.argsort(-tally, kind="stable")[:3] if tally[s] > 0)
+            lines.append(f"{day}日目の投票: {pairs}（得票: {top}）")
+            vote_lines += 1
+
+        if not vote_lines:
+            lines.append("投票: まだありません")
+        return "\n".join(lines)
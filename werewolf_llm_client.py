@@ -0,0 +1,162 @@
+# CrewAI人狼ゲーム - 共有LLMクライアント（接続プール・キープアライブ・同時実行数の制限）
+import os
+import time
+import threading
+import contextlib
+import httpx
+import litellm
+from crewai import LLM
+from litellm.llms.custom_httpx.http_handler import HTTPHandler
+from werewolf_config import env_number
+
+DEFAULT_MODEL = "gemini/gemini-2.5-flash"
+# WEREWOLF_LLM_BASE_URL（OpenAI互換のローカルサーバー）を指定したときの既定のモデル名
+LOCAL_MODEL = "openai/werewolf-local"
+# 接続の確立（TCP・TLS）の期限（秒）。応答の期限は WEREWOLF_CALL_TIMEOUT
+CONNECT_TIMEOUT = 10.0
+
+# --------------------------------------------------------------------
+# 1. 接続プール
+# --------------------------------------------------------------------
+class ConnectionPool:
+    """プロセス全体で共有するHTTP接続プールと、LLM呼び出しの同時実行数の制限
+
+    LiteLLMはGeminiへの同期呼び出しのたびに新しいHTTPクライアントを作るため、
+    短い呼び出しが続くと毎回TCP・TLSの接続をやり直すことになる。
+    ここで作った1つのhttpx.Clientを全LLMで共有し、キープアライブで接続を使い回す。
+    OpenAI互換の接続先（litellm.client_session経由）にも同じクライアントを使う。
+
+    環境変数:
+        WEREWOLF_LLM_MAX_CONNECTIONS  接続プールの最大接続数（既定: 16）
+        WEREWOLF_LLM_KEEPALIVE        使っていない接続を保持する秒数（既定: 60）
+        WEREWOLF_LLM_CONCURRENCY      LLM呼び出しの同時実行数の上限（既定: 0=無制限）
+    """
+
+    def __init__(self, max_connections=None, keepalive=None, concurrency=None, timeout=None):
+        self.max_connections = env_number("WEREWOLF_LLM_MAX_CONNECTIONS", 16) if max_connections is None else max_connections
+        self.keepalive = env_number("WEREWOLF_LLM_KEEPALIVE", 60.0, float) if keepalive is None else keepalive
+        self.concurrency = env_number("WEREWOLF_LLM_CONCURRENCY", 0) if concurrency is None else concurrency
+        timeout = env_number("WEREWOLF_CALL_TIMEOUT", 90.0, float) if timeout is None else timeout
+
+        self.client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=self.keepalive,
+            ),
+            timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT),
+        )
+        # Gemini（LiteLLMのHTTPHandler）用のラッパー。OpenAI互換の接続先はclient_sessionを使う
+        self.handler = HTTPHandler(client=self.client)
+        litellm.client_session = self.client
+
+        self.semaphore = threading.BoundedSemaphore(self.concurrency) if self.concurrency else None
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+        self.waits = 0
+        self.waited = 0.0
+
+    @contextlib.contextmanager
+    def slot(self):
+        """同時実行数の上限に空きができるまで待ってから、1回分の呼び出しを実行する"""
+        if self.semaphore is not None:
+            if not self.semaphore.acquire(blocking=False):
+                started = time.perf_counter()
+                self.semaphore.acquire()
+                with self.lock:
+                    self.waits += 1
+                    self.waited += time.perf_counter() - started
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            if self.semaphore is not None:
+                self.semaphore.release()
+
+    def close(self):
+        self.client.close()
+
+    def format_report(self):
+        """接続プールと同時実行数の統計"""
+        limit = f"{self.concurrency}" if self.concurrency else "無制限"
+        return (
+            f"🔌 接続プール: 最大{self.max_connections}接続・キープアライブ{self.keepalive:.0f}秒 | "
+            f"{self.calls}回の呼び出し | 同時実行のピーク {self.peak}（上限 {limit}） | "
+            f"空き待ち {self.waits}回（合計 {self.waited:.1f}秒）"
+        )
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def shared_pool():
+    """プロセス全体で共有する接続プール（最初の呼び出しで作成）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+def format_pool_report():
+    """接続プールの統計（プールを使っていなければNone）"""
+    return _pool.format_report() if _pool is not None else None
+
+# --------------------------------------------------------------------
+# 2. 共有プールを使うLLM
+# --------------------------------------------------------------------
+class PooledLLM(LLM):
+    """共有の接続プールを通してAPIを呼ぶLLM（同時実行数の上限付き）"""
+
+    def __init__(self, pool, **kwargs):
+        # GeminiはLiteLLMのHTTPHandlerを直接渡す（OpenAI互換はlitellm.client_sessionで共有済み）
+        if str(kwargs.get("model", "")).startswith("gemini/"):
+            kwargs.setdefault("client", pool.handler)
+        super().__init__(**kwargs)
+        self.pool = pool
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None):
+        with self.pool.slot():
+            return super().call(messages, tools=tools, callbacks=callbacks, available_functions=available_functions)
+
+def create_llm(model=None, temperature=0.8, timeout=None, **kwargs):
+    """共有の接続プールを使うLLMを作成
+
+    modelを省略すると WEREWOLF_MODEL（無ければ、WEREWOLF_LLM_BASE_URL指定時はローカル用、それ以外はGemini）。
+    WEREWOLF_LLM_BASE_URL はOpenAI互換のモデル（openai/〜）にだけ適用し、
+    フォールバックなどで指定したGeminiのモデルは通常どおりGoogleのAPIを呼ぶ。
+    """
+    base_url = os.environ.get("WEREWOLF_LLM_BASE_URL")
+    model = model or os.environ.get("WEREWOLF_MODEL") or (LOCAL_MODEL if base_url else DEFAULT_MODEL)
+    local = bool(base_url) and model.startswith("openai/")
+    return PooledLLM(
+        shared_pool(),
+        model=model,
+        base_url=base_url if local else None,
+        api_key=os.environ.get("GOOGLE_API_KEY") or ("local" if local else None),
+        temperature=temperature,
+        timeout=env_number("WEREWOLF_CALL_TIMEOUT", 90.0, float) if timeout is None else timeout,
+        **kwargs,
+    )
+
+# --------------------------------------------------------------------
+# 3. ゲーム用のセットアップ
+# --------------------------------------------------------------------
+def setup_llm():
+    """ゲームで使うLLMを初期化（CrewAI 0.134.0版）"""
+    try:
+        # OpenAI互換のローカルサーバー（llama.cppのサーバーや負荷試験用の偽LLMなど）に向ける場合はAPIキー不要
+        if not os.environ.get("GOOGLE_API_KEY") and not os.environ.get("WEREWOLF_LLM_BASE_URL"):
+            raise ValueError("GOOGLE_API_KEY環境変数が設定されていません")
+
+        llm = create_llm(temperature=0.8)  # 人狼ゲームは創造性が重要なので高めに設定
+        print(f"✅ LLM初期化成功（{llm.model}）")
+        return llm
+    except Exception as e:
+        print(f"❌ LLM初期化エラー: {e}")
+        exit(1)
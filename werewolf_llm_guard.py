@@ -0,0 +1,343 @@
+# CrewAI人狼ゲーム - LLM呼び出しの期限・監視・フォールバック
+import os
+import time
+import threading
+import collections
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from crewai import Task, Crew
+from werewolf_config import env_flag, env_number
+from werewolf_validator import OutputSpec
+from werewolf_llm_client import create_llm
+
+# 再試行・フォールバックがすべて失敗したときの定型応答（タスクの種類ごと）
+CANNED_RESPONSES = {
+    'announcement': "朝になりました。皆さん、今日も議論を始めてください。",
+    'discussion': "（少し考えがまとまりませんでした。皆さんの意見を聞いてから判断したいと思います。）",
+    'vote': "【投票】今回は棄権します。\n理由：判断材料が足りないためです。",
+    'night_action': "（今夜は行動を見送ります）",
+    'werewolf_meeting': "（今夜は様子見とし、昼の議論の流れに合わせます）",
+}
+DEFAULT_CANNED_RESPONSE = "（発言なし）"
+
+# p95がこれより短いときはヘッジしない（速い応答の揺らぎで重複送信を増やさないため）
+HEDGE_MIN_DELAY = 1.0
+
+# --------------------------------------------------------------------
+# 1. ユーティリティ関数
+# --------------------------------------------------------------------
+def run_in_thread(fn):
+    """関数をデーモンスレッドで実行しFutureを返す
+
+    ハングした呼び出しはPythonから強制終了できないため、スレッドプールではなく
+    使い捨てのデーモンスレッドで実行し、見捨てても他の呼び出しやプロセス終了を妨げないようにする。
+    """
+    future = Future()
+
+    def runner():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=runner, name="llm-call", daemon=True).start()
+    return future
+
+def clone_task(task, llm=None, description=None):
+    """同じ内容のタスクを別エージェントのコピーで作成（並行実行・別モデルでの再実行・再質問用）"""
+    agent = task.agent.copy() if hasattr(task.agent, "copy") else task.agent
+    if llm is not None:
+        agent.llm = llm
+    return Task(description=description or task.description, expected_output=task.expected_output, agent=agent)
+
+def with_text(result, text):
+    """結果の本文を差し替える（CrewOutputはトークン数などを残したまま本文だけ置き換える）"""
+    if hasattr(result, "raw"):
+        result.raw = text
+        return result
+    return text
+
+def agent_tokens(agent):
+    """エージェントがこれまでに使ったトークン数（取得できなければ0）"""
+    token_process = getattr(agent, "_token_process", None)
+    return token_process.get_summary().total_tokens if token_process is not None else 0
+
+def percentile(values, q):
+    """値の列のパーセンタイル（値が無ければNone）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+# --------------------------------------------------------------------
+# 2. kickoffの監視クラス
+# --------------------------------------------------------------------
+class KickoffGuard:
+    """各タスクのkickoffを期限付きで実行し、1回の呼び出しでゲーム全体が止まらないようにする
+
+    - 期限（WEREWOLF_CALL_TIMEOUT 秒）を過ぎた呼び出しは見捨てて再試行
+    - 経過時間がこれまでのp95を超えたら、同じリクエストを重複送信（ヘッジ）して早い方を採用
+    - 再試行が尽きたらフォールバックモデル（WEREWOLF_FALLBACK_MODEL）、それも駄目なら定型応答
+
+    環境変数:
+        WEREWOLF_CALL_TIMEOUT       1回の呼び出しの期限（秒、既定: 90）
+        WEREWOLF_CALL_RETRIES       期限切れ・エラー時の再試行回数（既定: 2）
+        WEREWOLF_HEDGE              0でヘッジ送信を無効化（既定: 有効）
+        WEREWOLF_HEDGE_MIN_SAMPLES  ヘッジを始めるまでに必要な計測数（既定: 5）
+        WEREWOLF_FALLBACK_MODEL     再試行が尽きたときに使うモデル（例: gemini/gemini-2.0-flash）
+
+    secret_kinds に指定したタスクの種類（匿名モードの夜の行動など）は、再質問・失敗の通知に
+    検証の指摘やエラーの内容を出さない（対象のプレイヤー名などが漏れないように）。
+    """
+
+    def __init__(self, timeout=None, retries=None, hedge=None, fallback_model=None, validator=None, profiler=None, tracer=None, log=print, secret_kinds=()):
+        self.timeout = env_number("WEREWOLF_CALL_TIMEOUT", 90.0, float) if timeout is None else timeout
+        self.retries = env_number("WEREWOLF_CALL_RETRIES", 2) if retries is None else retries
+        self.hedge = env_flag("WEREWOLF_HEDGE", True) if hedge is None else hedge
+        self.hedge_min_samples = env_number("WEREWOLF_HEDGE_MIN_SAMPLES", 5)
+        self.fallback_model = os.environ.get("WEREWOLF_FALLBACK_MODEL", "") if fallback_model is None else fallback_model
+        self._fallback_llm = None
+        self.validator = validator
+        # ワーカースレッドでの実行もフェーズごとのプロファイルに含める（PhaseProfiler）
+        self.profiler = profiler
+        # 呼び出しをタイムライン（TraceRecorder）に記録する
+        self.tracer = tracer
+        # 予算の監視と縮退（GameBudget.attach で設定）
+        self.budget = None
+        # タスクの種類ごとの思考予算（ThinkingPolicy.attach で設定）
+        self.thinking = None
+        # 応答の記録と、分岐実行での分岐前の応答の再生（BranchPoint.attach で設定）
+        self.replay = None
+        self.log = log
+        self.secret_kinds = secret_kinds
+        # ルールベースのボットが担当する席（{エージェントのid: ボット}）。該当タスクはLLMを呼ばない
+        self.bots = {}
+
+        # 直近の成功した呼び出しの所要時間（p95の算出用）
+        self.latencies = collections.deque(maxlen=200)
+        self.lock = threading.Lock()
+        self.stats = collections.Counter()
+
+    @property
+    def calls(self):
+        """実際に送ったLLM呼び出しの回数（再試行・ヘッジ・フォールバックを含む）"""
+        return self.stats["calls"]
+
+    @property
+    def tokens(self):
+        """完了したLLM呼び出しで使ったトークン数（期限切れで見捨てた呼び出しも完了すれば含む）"""
+        return self.stats["tokens"]
+
+    def hedge_delay(self):
+        """ヘッジを送るまでの待ち時間（観測したp95、計測数が足りなければNone）"""
+        with self.lock:
+            if not self.hedge or len(self.latencies) < self.hedge_min_samples:
+                return None
+            return max(percentile(list(self.latencies), 95), HEDGE_MIN_DELAY)
+
+    def _start(self, task, verbose, label="LLM呼び出し", kind=None):
+        """1回分の呼び出しを開始"""
+        with self.lock:
+            self.stats["calls"] += 1
+
+        def call():
+            crew = Crew(agents=[task.agent], tasks=[task], verbose=verbose)
+            tokens_before = agent_tokens(task.agent)
+            result = crew.kickoff()
+            with self.lock:
+                used = agent_tokens(task.agent) - tokens_before
+                self.stats["tokens"] += used
+                self.stats[f"tokens:{kind}"] += used
+            return result
+
+        if self.profiler is not None:
+            call = self.profiler.wrap(call)
+        if self.tracer is not None:
+            call = self.tracer.wrap(call, label, agent=str(task.agent.role))
+        return run_in_thread(call)
+
+    def _attempt(self, task, verbose, kind=None):
+        """期限付きで1回試行（必要ならヘッジ送信）し、結果を返す。失敗時は例外"""
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        primary = self._start(task, verbose, kind=kind)
+        pending = {primary}
+
+        delay = self.hedge_delay()
+        if delay is not None and delay < self.timeout:
+            done, _ = wait(pending, timeout=delay)
+            if not done:
+                # p95を超えたので、エージェントのコピーで同じリクエストを重複送信する
+                with self.lock:
+                    self.stats["hedges"] += 1
+                pending.add(self._start(clone_task(task), verbose, label="LLM呼び出し（ヘッジ）", kind=kind))
+
+        errors = []
+        while pending:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    elapsed = time.perf_counter() - started
+                    with self.lock:
+                        self.latencies.append(elapsed)
+                        if future is not primary:
+                            self.stats["hedge_wins"] += 1
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                errors.append(future.exception())
+
+        for future in pending:
+            future.cancel()
+        if errors and not pending:
+            raise errors[-1]
+        with self.lock:
+            self.stats["timeouts"] += 1
+        raise TimeoutError(f"{self.timeout:.0f}秒以内に応答がありませんでした")
+
+    def _fallback_task(self, task):
+        """フォールバックモデルで同じタスクを作成（モデル未設定ならNone）"""
+        if not self.fallback_model:
+            return None
+        if self._fallback_llm is None:
+            self._fallback_llm = create_llm(self.fallback_model, timeout=self.timeout)
+        return clone_task(task, llm=self._fallback_llm)
+
+    def kickoff(self, task, kind, verbose=False, fallback_text=None, validate=True):
+        """タスクを実行して結果を返す（例外は投げず、最終的には定型応答を返す）
+
+        validatorがあれば出力を検証・修復し、手元で直せないときだけ再質問する。
+        JSONなど発言以外の出力を求めるタスクは validate=False で検証を省く。
+        """
+        # ボット席は乱数を消費するので、記録・再生せずに毎回実行する
+        key = None
+        if self.replay is not None and id(task.agent) not in self.bots:
+            key = self.replay.key(task, kind)
+            cached = self.replay.lookup(key, kind)
+            if cached is not None:
+                with self.lock:
+                    self.stats["replayed"] += 1
+                return cached
+
+        if self.tracer is None:
+            result = self._kickoff(task, kind, verbose, fallback_text, validate)
+        else:
+            with self.tracer.span(kind, "kickoff", agent=str(task.agent.role)):
+                result = self._kickoff(task, kind, verbose, fallback_text, validate)
+        if key is not None:
+            self.replay.store(key, kind, str(result))
+        return result
+
+    def _kickoff(self, task, kind, verbose, fallback_text, validate):
+        bot = self.bots.get(id(task.agent))
+        if bot is not None:
+            with self.lock:
+                self.stats["bot"] += 1
+            return bot.respond(task, kind)
+
+        if self.budget is not None:
+            notice = self.budget.update()
+            if notice:
+                self.log(notice)
+            if self.budget.skip_narration(kind):
+                with self.lock:
+                    self.stats["skipped"] += 1
+                return CANNED_RESPONSES[kind]
+        if self.thinking is not None:
+            task = self.thinking.apply(task, kind)
+        if self.budget is not None:
+            task = self.budget.adjust(task, kind)
+
+        started = time.perf_counter()
+        result, answered = self._run(task, kind, verbose, fallback_text)
+        if self.validator is None or not validate or not answered:
+            self._record_thinking(kind, started, answered)
+            return result
+
+        spec = OutputSpec.from_task(task, kind)
+        text, repairs, problems = self._check(spec, str(result))
+        reasked = False
+        for _ in range(self.validator.reasks):
+            if not problems:
+                break
+            reasked = True
+            self.log(f"🔁 出力を再質問します（{kind}）{self._detail(kind, '、'.join(problems))}")
+            retry_task = clone_task(task, description=self.validator.reask_description(task, problems))
+            retry, answered = self._run(retry_task, kind, verbose, fallback_text)
+            if not answered:
+                break
+            result = retry
+            text, repairs, problems = self._check(spec, str(retry))
+
+        self.validator.record(kind, repairs, problems, reasked)
+        self._record_thinking(kind, started, True)
+        return with_text(result, text)
+
+    def _record_thinking(self, kind, started, answered):
+        """思考予算の比較用に、応答が得られたタスクの所要時間（再質問を含む）を記録"""
+        if self.thinking is not None and answered:
+            self.thinking.record(kind, time.perf_counter() - started)
+
+    def _check(self, spec, text):
+        """出力の検証・修復（タイムラインには解析として記録）"""
+        if self.tracer is None:
+            return self.validator.check(spec, text)
+        with self.tracer.span("出力検証", "parse", kind=spec.kind):
+            return self.validator.check(spec, text)
+
+    def _detail(self, kind, detail):
+        """通知に添える指摘・エラーの内容（秘密の種類では伏せる）"""
+        return "" if kind in self.secret_kinds else f": {detail}"
+
+    def _run(self, task, kind, verbose, fallback_text):
+        """再試行・フォールバック込みで実行し、(結果, LLMが応答したか)を返す"""
+        started = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                # 期限切れで見捨てたスレッドはまだ元のタスク・エージェントで実行中のことがあるため、
+                # 再試行はエージェントのコピーで行う（実行状態とトークン数の計測が重ならないように）
+                result = self._attempt(task if attempt == 0 else clone_task(task), verbose, kind)
+                with self.lock:
+                    self.stats[f"ok:{kind}"] += 1
+                return result, True
+            except Exception as e:
+                self.log(f"⚠️ LLM呼び出し失敗（{kind}・{attempt + 1}回目）{self._detail(kind, e)}")
+                if attempt < self.retries:
+                    with self.lock:
+                        self.stats["retries"] += 1
+                    time.sleep(min(2 ** attempt, 8))
+
+        fallback_task = self._fallback_task(task)
+        if fallback_task is not None:
+            try:
+                result = self._attempt(fallback_task, verbose, kind)
+                with self.lock:
+                    self.stats["fallbacks"] += 1
+                self.log(f"🔁 フォールバックモデル（{self.fallback_model}）で応答しました")
+                return result, True
+            except Exception as e:
+                self.log(f"⚠️ フォールバックモデルも失敗{self._detail(kind, e)}")
+
+        with self.lock:
+            self.stats["canned"] += 1
+        self.log(f"🥫 {time.perf_counter() - started:.0f}秒で応答が得られなかったため定型応答を使用します（{kind}）")
+        return (fallback_text if fallback_text is not None else CANNED_RESPONSES.get(kind, DEFAULT_CANNED_RESPONSE)), False
+
+    def format_report(self):
+        """呼び出しの遅延と監視の統計"""
+        with self.lock:
+            latencies = list(self.latencies)
+        p50 = percentile(latencies, 50)
+        p95 = percentile(latencies, 95)
+        worst = max(latencies) if latencies else None
+        fmt = lambda v: f"{v:.1f}秒" if v is not None else "-"
+        return (
+            f"⏱️ LLM呼び出し: {self.stats['calls']}回 | p50 {fmt(p50)} | p95 {fmt(p95)} | 最大 {fmt(worst)}\n"
+            f"🛟 期限切れ {self.stats['timeouts']}回 | 再試行 {self.stats['retries']}回 | ヘッジ {self.stats['hedges']}回（勝ち {self.stats['hedge_wins']}回） | "
+            f"フォールバック {self.stats['fallbacks']}回 | 定型応答 {self.stats['canned']}回 | ボット応答 {self.stats['bot']}回"
+        )
@@ -0,0 +1,402 @@
+# CrewAI人狼ゲーム - 負荷試験（ローカルの偽LLMサーバーに対してM並行でゲームを実行）
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from werewolf_llm_guard import percentile
+from werewolf_validator import LENGTH_PATTERN, FORMAT_PATTERN, FORMAT_VERBS, CANDIDATES_PATTERN
+
+GAME_SCRIPTS = {
+    "open": "werewolf_game_open_mode.py",
+    "anonymous": "werewolf_game_anonymous_mode.py",
+}
+RUN_DIR = "loadtest_runs"
+# 偽の応答で要求文字数を満たすための埋め草
+FILLER = "これまでの発言の流れと投票の傾向を踏まえて、慎重に考えました。"
+
+# --------------------------------------------------------------------
+# 1. 遅延の分布（対数正規分布＋429・タイムアウトの集中発生）
+# --------------------------------------------------------------------
+class LatencyModel:
+    """偽LLMサーバーの応答時間と障害を決める
+
+    通常は対数正規分布（中央値 median 秒、ばらつき sigma）で待ってから応答する。
+    1リクエストごとに burst_rate の確率で障害の集中発生（バースト）が始まり、
+    burst_seconds 秒間は全リクエストが429か、クライアントの期限を超えるまで応答しない。
+    """
+
+    def __init__(self, median=0.5, sigma=0.5, burst_rate=0.0, burst_seconds=5.0, burst_kinds=("429", "timeout"), hang_seconds=30.0, seed=None):
+        self.median = median
+        self.sigma = sigma
+        self.burst_rate = burst_rate
+        self.burst_seconds = burst_seconds
+        self.burst_kinds = tuple(burst_kinds)
+        self.hang_seconds = hang_seconds
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.burst_until = 0.0
+        self.burst_kind = None
+
+    def sample(self):
+        """(種類, 待ち時間) を返す（種類: ok / 429 / timeout）"""
+        with self.lock:
+            now = time.monotonic()
+            if now >= self.burst_until and self.burst_kinds and self.rng.random() < self.burst_rate:
+                self.burst_until = now + self.burst_seconds
+                self.burst_kind = self.rng.choice(self.burst_kinds)
+            if now < self.burst_until:
+                return self.burst_kind, (self.hang_seconds if self.burst_kind == "timeout" else 0.0)
+            return "ok", self.rng.lognormvariate(0.0, self.sigma) * self.median
+
+# --------------------------------------------------------------------
+# 2. 偽LLMサーバー（OpenAI互換の /v1/chat/completions）
+# --------------------------------------------------------------------
+def pad(body, prompt):
+    """プロンプトの最後の文字数指定（○-○文字程度）の下限まで埋め草を足す"""
+    lengths = LENGTH_PATTERN.findall(prompt)
+    min_chars = int(lengths[-1][0]) if lengths else 0
+    while len(body) < min_chars:
+        body += FILLER
+    return body
+
+def fake_reply(prompt, rng):
+    """プロンプトの形式指定・候補者・文字数に合わせた偽の応答"""
+    candidates_lines = CANDIDATES_PATTERN.findall(prompt)
+    candidates = [name.strip() for name in candidates_lines[-1].split(",")] if candidates_lines else ["たろう"]
+    target = rng.choice(candidates)
+
+    if "プレイヤー一覧" in prompt:
+        # 一括投票（JSON配列）
+        voters = re.findall(r'^\s*### (\S+)', prompt, re.MULTILINE)
+        entries = [
+            {"voter": voter, "target": rng.choice([c for c in candidates if c != voter] or candidates), "reason": pad("発言の一貫性に欠けると感じたからです。", prompt)}
+            for voter in voters
+        ]
+        return json.dumps(entries, ensure_ascii=False)
+
+    format_match = FORMAT_PATTERN.search(prompt)
+    if format_match:
+        tag = format_match.group(1)
+        body = f"【{tag}】{target}{FORMAT_VERBS[tag]}。\n理由：{target}さんの発言に気になる点があったからです。"
+    else:
+        body = f"私は{target}さんが怪しいと思います。昨日からの発言が曖昧で、村のための情報がほとんど出ていません。"
+
+    return pad(body, prompt)
+
+class FakeLLMServer:
+    """遅延の分布に従って応答する、OpenAI互換の偽LLMサーバー（バックグラウンドスレッドで動く）"""
+
+    def __init__(self, latency, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "connections": 0, "ok": 0, "429": 0, "timeout": 0}
+        self.reply_rng = random.Random(0)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                # 1接続ごとに1回呼ばれる（キープアライブで使い回されていれば接続数はリクエスト数より少ない）
+                super().setup()
+                with server.lock:
+                    server.stats["connections"] += 1
+
+            def _send(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if status == 429:
+                    self.send_header("Retry-After", "1")
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                server.handle(self, request)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-llm-server", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def handle(self, handler, request):
+        kind, delay = self.latency.sample()
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats[kind] += 1
+        if delay:
+            time.sleep(delay)
+        if kind == "429":
+            handler._send(429, {"error": {"message": "Rate limit exceeded (fake)", "type": "rate_limit_error", "code": 429}})
+            return
+
+        prompt = "\n".join(str(message.get("content", "")) for message in request.get("messages", []))
+        with self.lock:
+            content = fake_reply(prompt, self.reply_rng)
+        handler._send(200, {
+            "id": f"chatcmpl-fake-{self.stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "werewolf-local"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": f"Thought: 考えがまとまりました\nFinal Answer: {content}"},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": len(prompt) // 2, "completion_tokens": len(content), "total_tokens": len(prompt) // 2 + len(content)},
+        })
+
+# --------------------------------------------------------------------
+# 3. 子プロセスの資源計測
+# --------------------------------------------------------------------
+def read_process_usage(pid):
+    """(スレッド数, 開いているファイル数, RSS MB)。/procが無い環境では(0, 0, 0.0)"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            status = f.read()
+        threads = int(re.search(r'^Threads:\s+(\d+)', status, re.MULTILINE).group(1))
+        rss_kb = int(re.search(r'^VmRSS:\s+(\d+)', status, re.MULTILINE).group(1))
+        files = len(os.listdir(f"/proc/{pid}/fd"))
+        return threads, files, rss_kb / 1024
+    except (OSError, AttributeError, ValueError):
+        return 0, 0, 0.0
+
+class ResourceSampler:
+    """実行中の子プロセスのスレッド数・ファイル数・RSSを定期的に計測し、ピークを記録"""
+
+    def __init__(self, processes, interval=0.5):
+        self.processes = processes
+        self.interval = interval
+        self.peak = {"threads": 0, "files": 0, "rss_mb": 0.0, "per_game_threads": 0, "per_game_files": 0, "per_game_rss_mb": 0.0}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="resource-sampler", daemon=True)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            totals = [0, 0, 0.0]
+            for process in self.processes:
+                if process.poll() is not None:
+                    continue
+                threads, files, rss_mb = read_process_usage(process.pid)
+                totals[0] += threads
+                totals[1] += files
+                totals[2] += rss_mb
+                self.peak["per_game_threads"] = max(self.peak["per_game_threads"], threads)
+                self.peak["per_game_files"] = max(self.peak["per_game_files"], files)
+                self.peak["per_game_rss_mb"] = max(self.peak["per_game_rss_mb"], rss_mb)
+            self.peak["threads"] = max(self.peak["threads"], totals[0])
+            self.peak["files"] = max(self.peak["files"], totals[1])
+            self.peak["rss_mb"] = max(self.peak["rss_mb"], totals[2])
+            self.stop_event.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+        return False
+
+# --------------------------------------------------------------------
+# 4. ゲームの並行実行と集計
+# --------------------------------------------------------------------
+def parse_game_output(path, cwd):
+    """ゲームの標準出力から、呼び出し数・失われた発言・フェーズごとの所要時間を取り出す"""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        output = f.read()
+    result = {"completed": "人狼ゲーム完了" in output, "calls": 0, "lost_turns": 0, "turns": 0, "phases": {}}
+
+    calls = re.search(r'LLM呼び出し: (\d+)回', output)
+    if calls:
+        result["calls"] = int(calls.group(1))
+    # 定型応答に置き換わった発言と、例外で飛ばされた発言を「失われた発言」とみなす
+    canned = re.search(r'定型応答 (\d+)回', output)
+    result["lost_turns"] = (int(canned.group(1)) if canned else 0) + len(re.findall(r'❌ .+の(?:発言|投票|行動)エラー', output))
+
+    trace = re.search(r'🧵 タイムライン: (\S+?\.trace\.json)', output)
+    if trace and os.path.exists(os.path.join(cwd, trace.group(1))):
+        with open(os.path.join(cwd, trace.group(1)), encoding="utf-8") as f:
+            events = json.load(f)["traceEvents"]
+        for event in events:
+            if event.get("cat") == "phase" and "_" in event["name"]:
+                kind = event["name"].split("_", 1)[1]
+                result["phases"].setdefault(kind, []).append(event["dur"] / 1e6)
+            elif event.get("cat") == "kickoff":
+                result["turns"] += 1
+    return result
+
+def jain_fairness(values):
+    """Jainの公平性指数（全ゲームの所要時間が等しければ1.0、偏るほど1/nに近づく）"""
+    if not values:
+        return 0.0
+    return sum(values) ** 2 / (len(values) * sum(v * v for v in values))
+
+def run_level(concurrency, args, server, run_dir):
+    """M並行でゲームを実行し、その並行数の集計結果を返す"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), GAME_SCRIPTS[args.mode])
+    level_dir = os.path.join(run_dir, f"m{concurrency:03d}")
+    os.makedirs(level_dir, exist_ok=True)
+    env = dict(
+        os.environ,
+        WEREWOLF_LLM_BASE_URL=server.url,
+        WEREWOLF_MODEL="openai/werewolf-local",
+        WEREWOLF_TRACE="1",
+        WEREWOLF_CALL_TIMEOUT=str(args.call_timeout),
+        OTEL_SDK_DISABLED="true",
+        CREWAI_DISABLE_TELEMETRY="true",
+        PYTHONUNBUFFERED="1",
+    )
+
+    processes, outputs, started_at, finished_at = [], [], [], {}
+    started = time.perf_counter()
+    for k in range(concurrency):
+        output_path = os.path.join(level_dir, f"game_{k:03d}.out")
+        outputs.append(output_path)
+        with open(output_path, "w", encoding="utf-8") as out:
+            processes.append(subprocess.Popen([sys.executable, script], cwd=level_dir, env=env, stdout=out, stderr=subprocess.STDOUT))
+        started_at.append(time.perf_counter())
+
+    with ResourceSampler(processes) as sampler:
+        while len(finished_at) < len(processes):
+            for k, process in enumerate(processes):
+                if k not in finished_at and process.poll() is not None:
+                    finished_at[k] = time.perf_counter()
+            time.sleep(0.2)
+    elapsed = time.perf_counter() - started
+
+    games = [parse_game_output(path, level_dir) for path in outputs]
+    durations = [finished_at[k] - started_at[k] for k in range(len(processes))]
+    phases = {}
+    for game in games:
+        for kind, values in game["phases"].items():
+            phases.setdefault(kind, []).extend(values)
+    completed = sum(1 for game in games if game["completed"])
+    turns = sum(game["turns"] for game in games)
+    return {
+        "concurrency": concurrency,
+        "completed": completed,
+        "failed": concurrency - completed,
+        "elapsed_sec": round(elapsed, 2),
+        "games_per_min": round(completed / elapsed * 60, 2) if elapsed else 0.0,
+        "turns_per_sec": round(turns / elapsed, 2) if elapsed else 0.0,
+        "calls": sum(game["calls"] for game in games),
+        "turns": turns,
+        "lost_turns": sum(game["lost_turns"] for game in games),
+        "phase_latency": {
+            kind: {"p50": round(percentile(values, 50), 2), "p99": round(percentile(values, 99), 2)}
+            for kind, values in phases.items()
+        },
+        "fairness": round(jain_fairness(durations), 3),
+        "resources": {key: round(value, 1) for key, value in sampler.peak.items()},
+    }
+
+def format_level(result):
+    """1つの並行数の結果を1行にまとめる"""
+    phases = " ".join(
+        f"{kind} {values['p50']:.1f}/{values['p99']:.1f}秒" for kind, values in result["phase_latency"].items()
+    ) or "-"
+    resources = result["resources"]
+    return (
+        f"M={result['concurrency']:>3} | 完了 {result['completed']}/{result['concurrency']} | {result['elapsed_sec']:.0f}秒 | "
+        f"{result['games_per_min']:.2f}ゲーム/分 {result['turns_per_sec']:.2f}発言/秒 | 失われた発言 {result['lost_turns']}/{result['turns']} | "
+        f"フェーズ p50/p99: {phases} | 公平性 {result['fairness']:.3f} | "
+        f"ピーク スレッド {resources['threads']:.0f} ファイル {resources['files']:.0f} RSS {resources['rss_mb']:.0f}MB"
+    )
+
+# --------------------------------------------------------------------
+# 5. メイン実行部分
+# --------------------------------------------------------------------
+def main():
+    """並行数を段階的に増やしながらゲームを実行し、スループット・遅延・資源の変化を表示"""
+    parser = argparse.ArgumentParser(description="偽LLMサーバーを使った人狼ゲームの負荷試験")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="同時に実行するゲーム数（カンマ区切りで段階的に増やす）")
+    parser.add_argument("--mode", choices=sorted(GAME_SCRIPTS), default="open")
+    parser.add_argument("--median", type=float, default=0.5, help="応答時間の中央値（秒）")
+    parser.add_argument("--sigma", type=float, default=0.5, help="応答時間の対数正規分布のばらつき")
+    parser.add_argument("--burst-rate", type=float, default=0.0, help="1リクエストごとに障害の集中発生が始まる確率")
+    parser.add_argument("--burst-seconds", type=float, default=5.0, help="障害の集中発生が続く秒数")
+    parser.add_argument("--burst-kinds", default="429,timeout", help="集中発生する障害の種類（429 / timeout）")
+    parser.add_argument("--call-timeout", type=float, default=10.0, help="ゲーム側のLLM呼び出しの期限（WEREWOLF_CALL_TIMEOUT）")
+    parser.add_argument("--seed", type=int, help="遅延・障害の乱数シード")
+    parser.add_argument("--serve-only", action="store_true", help="偽LLMサーバーだけを起動する（Ctrl+Cで終了）")
+    parser.add_argument("--port", type=int, default=0, help="偽LLMサーバーのポート（0で空いているポート）")
+    args = parser.parse_args()
+
+    latency = LatencyModel(
+        median=args.median,
+        sigma=args.sigma,
+        burst_rate=args.burst_rate,
+        burst_seconds=args.burst_seconds,
+        burst_kinds=[kind for kind in args.burst_kinds.split(",") if kind in ("429", "timeout")],
+        hang_seconds=args.call_timeout + 5,
+        seed=args.seed,
+    )
+    server = FakeLLMServer(latency, port=args.port).start()
+    print(f"🧪 偽LLMサーバー: {server.url}（中央値 {args.median}秒・σ {args.sigma}・バースト確率 {args.burst_rate}）")
+
+    if args.serve_only:
+        print(f"💡 WEREWOLF_LLM_BASE_URL={server.url} を指定してゲームを起動してください")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.stop()
+        return 0
+
+    run_dir = os.path.join(RUN_DIR, datetime.datetime.now().strftime("%Y%m%d_%H%M%S"))
+    os.makedirs(run_dir, exist_ok=True)
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+
+    print("=" * 60)
+    print(f"🏋️ 負荷試験: {args.mode}モード × 並行数 {', '.join(map(str, levels))}")
+    print("=" * 60)
+    results = []
+    for level in levels:
+        result = run_level(level, args, server, run_dir)
+        result["server"] = dict(server.stats)
+        results.append(result)
+        print(format_level(result))
+
+    server.stop()
+    results_path = os.path.join(run_dir, "results.json")
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump({"args": vars(args), "levels": results}, f, ensure_ascii=False, indent=2)
+    print("-" * 60)
+    print(
+        f"📡 偽LLMサーバー: {server.stats['requests']}リクエスト・{server.stats['connections']}接続"
+        f"（429 {server.stats['429']}回・タイムアウト {server.stats['timeout']}回）"
+    )
+    print(f"📁 結果: {results_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+# CrewAI人狼ゲーム - メモリ計測・保持上限管理
+import os
+import gc
+import time
+import threading
+import tracemalloc
+from werewolf_config import env_flag, env_number
+
+# 同一プロセスで複数ゲームが並行する場合に備え、tracemallocの利用者数を数える
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+# --------------------------------------------------------------------
+# 1. ユーティリティ関数
+# --------------------------------------------------------------------
+def read_rss_mb():
+    """現在のプロセスの常駐メモリ（RSS）をMB単位で取得"""
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+
+    # /procが無い環境（macOSなど）ではピーク値で代用
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except (ImportError, OSError):
+        return 0.0
+
+def trim_agent_history(agent):
+    """エージェントに残っているステップ履歴（executorのメッセージ・ツール結果）を破棄"""
+    tools_results = getattr(agent, "tools_results", None)
+    if isinstance(tools_results, list):
+        tools_results.clear()
+
+    # CrewAIはタスクごとにexecutorを作り直すが、直前のexecutorと履歴を保持し続ける
+    executor = getattr(agent, "agent_executor", None)
+    if executor is not None:
+        messages = getattr(executor, "messages", None)
+        if isinstance(messages, list):
+            messages.clear()
+
+# --------------------------------------------------------------------
+# 2. メモリ計測・上限管理クラス
+# --------------------------------------------------------------------
+class MemoryMonitor:
+    """フェーズ境界でのメモリ計測と、保持期間を超えた履歴の破棄を行う
+
+    環境変数:
+        WEREWOLF_MEMORY_PROFILE        1でtracemalloc/RSS計測を有効化（既定: 無効）
+        WEREWOLF_MEMORY_RETENTION_DAYS 発言ログ（register したもの）を保持する日数（既定: 2日）
+        WEREWOLF_MEMORY_CAP_MB         RSSがこの値を超えたら保持期間を無視して全履歴を破棄（既定: 0=無制限）
+    """
+
+    def __init__(self, game_label="", enabled=None, retention_days=None, cap_mb=None):
+        self.game_label = game_label
+        self.enabled = env_flag("WEREWOLF_MEMORY_PROFILE") if enabled is None else enabled
+        self.retention_days = env_number("WEREWOLF_MEMORY_RETENTION_DAYS", 2) if retention_days is None else retention_days
+        self.cap_mb = env_number("WEREWOLF_MEMORY_CAP_MB", 0.0, float) if cap_mb is None else cap_mb
+
+        self.samples = []
+        self.retention_targets = []
+        self.trim_count = 0
+        self.cap_hits = 0
+
+        # tracemalloc はプロセス全体で共有し、最後の利用者が停止する
+        self._uses_tracemalloc = False
+        if self.enabled:
+            self._acquire_tracemalloc()
+        self._started_at = time.perf_counter()
+
+    def _acquire_tracemalloc(self):
+        global _tracemalloc_users
+        with _tracemalloc_lock:
+            if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            _tracemalloc_users += 1
+            self._uses_tracemalloc = True
+
+    def register(self, target):
+        """保持期間に従って古い日の情報を破棄できるオブジェクトを登録（trim_before(day)を持つこと）"""
+        self.retention_targets.append(target)
+        return target
+
+    def sample(self, label):
+        """フェーズ境界でメモリ使用量を記録"""
+        if not self.enabled:
+            return None
+
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        sample = {
+            "label": label,
+            "elapsed": time.perf_counter() - self._started_at,
+            "rss_mb": read_rss_mb(),
+            "traced_mb": current / (1024 * 1024),
+            "traced_peak_mb": peak / (1024 * 1024),
+        }
+        self.samples.append(sample)
+        return sample
+
+    def enforce_cap(self, agents, day_num):
+        """保持期間を超えた履歴を破棄し、RSS上限を超えていれば全履歴を破棄"""
+        # エージェントのステップ履歴は次のタスクでは使われないので毎回破棄する
+        for agent in agents.values():
+            trim_agent_history(agent)
+
+        keep_from_day = day_num - self.retention_days + 1
+        if self.cap_mb and read_rss_mb() > self.cap_mb:
+            # 上限超過時は当日分も含めて破棄
+            keep_from_day = day_num + 1
+            self.cap_hits += 1
+
+        for target in self.retention_targets:
+            target.trim_before(keep_from_day)
+
+        gc.collect()
+        self.trim_count += 1
+
+    def finish(self):
+        """計測を終了（他に計測中のゲームが無ければtracemallocを停止）"""
+        global _tracemalloc_users
+        if not self._uses_tracemalloc:
+            return
+        with _tracemalloc_lock:
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self._uses_tracemalloc = False
+
+    def format_report(self):
+        """ゲーム単位のメモリレポートをMarkdown表形式で作成"""
+        lines = [f"\n📈 メモリレポート {self.game_label}".rstrip()]
+        cap_text = f"{self.cap_mb:.0f}MB" if self.cap_mb else "なし"
+        lines.append(f"保持期間: {self.retention_days}日 | RSS上限: {cap_text} | 履歴破棄: {self.trim_count}回（上限超過 {self.cap_hits}回）")
+
+        if not self.samples:
+            lines.append("（計測データなし：WEREWOLF_MEMORY_PROFILE=1 で有効化できます）")
+            return "\n".join(lines)
+
+        lines.append("")
+        lines.append("| フェーズ | 経過秒 | RSS(MB) | ΔRSS(MB) | 追跡中(MB) | 追跡ピーク(MB) |")
+        lines.append("|---|---:|---:|---:|---:|---:|")
+        previous_rss = self.samples[0]["rss_mb"]
+        for sample in self.samples:
+            lines.append(
+                f"| {sample['label']} | {sample['elapsed']:.1f} | {sample['rss_mb']:.1f} "
+                f"| {sample['rss_mb'] - previous_rss:+.1f} | {sample['traced_mb']:.2f} | {sample['traced_peak_mb']:.2f} |"
+            )
+            previous_rss = sample["rss_mb"]
+
+        growth = self.samples[-1]["rss_mb"] - self.samples[0]["rss_mb"]
+        lines.append("")
+        lines.append(f"ゲーム全体のRSS増加: {growth:+.1f}MB")
+        return "\n".join(lines)
@@ -0,0 +1,156 @@
+# CrewAI人狼ゲーム - フェーズごとのCPUプロファイル（オプトイン）
+import os
+import io
+import re
+import pstats
+import cProfile
+import threading
+import importlib
+import time
+from werewolf_config import env_number
+
+PROFILE_DIR = "warewolf_logs/profiles"
+
+# --------------------------------------------------------------------
+# 1. プロファイラのバックエンド
+# --------------------------------------------------------------------
+class CProfileBackend:
+    """標準のcProfile（pstats形式で保存し、スレッド・フェーズをまたいで集計できる）
+
+    時計はスレッドごとのCPU時間なので、LLMの応答待ちで止まっている時間は数えない。
+    """
+
+    mergeable = True
+
+    def __init__(self):
+        self.profile = cProfile.Profile(time.thread_time)
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def dump(self, path):
+        self.profile.dump_stats(path)
+        return path
+
+def load_backend(spec):
+    """WEREWOLF_PROFILE の値からバックエンドのクラスを取得
+
+    "cprofile" は標準のcProfile。"パッケージ.モジュール:クラス" を指定すると、
+    start() / stop() / dump(path) を持つ独自のプロファイラ（サンプリング型など）を使える。
+    """
+    if spec.lower() in ("1", "true", "yes", "on", "cprofile"):
+        return CProfileBackend
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+# --------------------------------------------------------------------
+# 2. フェーズごとのプロファイル
+# --------------------------------------------------------------------
+class PhaseProfiler:
+    """main() の各フェーズのCPU時間をプロファイルし、フェーズごとのファイルと上位N関数のレポートを出力
+
+    begin(name) で次のフェーズに切り替わる（前のフェーズは自動で終了）。
+    LLM呼び出しはKickoffGuardのワーカースレッドで実行されるため、wrap() でそのスレッドも同じフェーズに含める。
+    無効時は begin() / wrap() が何もしないので、計測のオーバーヘッドはかからない。
+
+    環境変数:
+        WEREWOLF_PROFILE      cprofile（または 1）で有効化。"モジュール:クラス" で独自のプロファイラ
+        WEREWOLF_PROFILE_TOP  レポートに載せる関数の数（既定: 30）
+    """
+
+    def __init__(self, game_label="", spec=None, top_n=None, profile_dir=PROFILE_DIR):
+        spec = os.environ.get("WEREWOLF_PROFILE", "") if spec is None else spec
+        self.enabled = bool(spec) and spec.lower() not in ("0", "false", "no", "off")
+        self.top_n = env_number("WEREWOLF_PROFILE_TOP", 30) if top_n is None else top_n
+        self.backend = load_backend(spec) if self.enabled else None
+        label = re.sub(r'[^\w.-]', '_', os.path.splitext(os.path.basename(game_label))[0]) or "game"
+        self.output_dir = os.path.join(profile_dir, label)
+        self.lock = threading.Lock()
+        self.phase_name = None
+        self.phase_profilers = []
+        self.phase_count = 0
+        self.files = []
+
+        if self.enabled:
+            os.makedirs(self.output_dir, exist_ok=True)
+
+    def begin(self, name):
+        """フェーズを開始（前のフェーズは終了して保存）"""
+        if not self.enabled:
+            return
+        self._end_phase()
+        self.phase_name = name
+        main_profiler = self.backend()
+        self.phase_profilers = [main_profiler]
+        main_profiler.start()
+
+    def wrap(self, fn):
+        """別スレッドで実行する関数を、呼び出し時点のフェーズに含めて計測するようにする"""
+        if not self.enabled:
+            return fn
+
+        def profiled(*args, **kwargs):
+            profiler = self.backend()
+            with self.lock:
+                self.phase_profilers.append(profiler)
+            profiler.start()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.stop()
+        return profiled
+
+    def _end_phase(self):
+        if self.phase_name is None:
+            return
+        self.phase_profilers[0].stop()
+        self.phase_count += 1
+        slug = re.sub(r'[^\w-]', '_', self.phase_name)
+        base = os.path.join(self.output_dir, f"{self.phase_count:02d}_{slug}")
+        with self.lock:
+            profilers = list(self.phase_profilers)
+
+        if getattr(self.backend, "mergeable", False):
+            # メインスレッドとワーカースレッドの計測を1つのファイルにまとめる
+            stats = pstats.Stats(profilers[0].profile)
+            for profiler in profilers[1:]:
+                stats.add(profiler.profile)
+            stats.dump_stats(f"{base}.prof")
+            self.files.append((self.phase_name, f"{base}.prof"))
+        else:
+            for k, profiler in enumerate(profilers):
+                self.files.append((self.phase_name, profiler.dump(f"{base}_thread{k}" if k else base)))
+        self.phase_name = None
+
+    def finish(self):
+        """最後のフェーズを終了し、全フェーズを合算した上位N関数のレポートを書き出してパスを返す"""
+        if not self.enabled:
+            return None
+        self._end_phase()
+        if not self.files:
+            return None
+        if not getattr(self.backend, "mergeable", False):
+            return self.output_dir
+
+        report = io.StringIO()
+        merged = pstats.Stats(stream=report)
+        report.write("# フェーズごとのCPU時間\n")
+        for phase, path in self.files:
+            stats = pstats.Stats(path)
+            report.write(f"{phase}: {stats.total_tt:.3f}秒\n")
+            merged.add(stats)
+        merged.dump_stats(os.path.join(self.output_dir, "merged.prof"))
+        # 読み込んだファイルの一覧はレポートに出さない
+        merged.files = []
+        report.write(f"\n# 全フェーズ合算 上位{self.top_n}関数（自己時間順）\n")
+        merged.sort_stats("tottime").print_stats(self.top_n)
+        report.write(f"\n# 全フェーズ合算 上位{self.top_n}関数（累積時間順）\n")
+        merged.sort_stats("cumulative").print_stats(self.top_n)
+
+        report_path = os.path.join(self.output_dir, "report.txt")
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+        return report_path
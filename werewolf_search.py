@@ -0,0 +1,175 @@
+# CrewAI人狼ゲーム - 発言・投票の全文検索（SQLite FTS5）
+import sys
+import time
+import sqlite3
+import argparse
+from werewolf_catalog import CATALOG_PATH, GameCatalog
+
+# 日本語は単語の区切りが無いので、trigramトークナイザで部分一致検索する（SQLite 3.34以降）
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS speeches (
+    speech_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    game_id   INTEGER NOT NULL,
+    day       INTEGER NOT NULL,
+    phase     TEXT NOT NULL,
+    speaker   TEXT NOT NULL,
+    text      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_speeches_game ON speeches(game_id, day, phase);
+CREATE INDEX IF NOT EXISTS idx_speeches_day_phase ON speeches(day, phase);
+CREATE INDEX IF NOT EXISTS idx_speeches_speaker ON speeches(speaker);
+CREATE VIRTUAL TABLE IF NOT EXISTS speeches_fts USING fts5(
+    text, content='speeches', content_rowid='speech_id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS speeches_ai AFTER INSERT ON speeches BEGIN
+    INSERT INTO speeches_fts(rowid, text) VALUES (new.speech_id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS speeches_ad AFTER DELETE ON speeches BEGIN
+    INSERT INTO speeches_fts(speeches_fts, rowid, text) VALUES ('delete', old.speech_id, old.text);
+END;
+"""
+
+# 検索対象にするフェーズ（夜の行動は発言ではないので含めない）
+INDEXED_PHASES = ("werewolf_meeting", "announcement", "discussion", "vote")
+
+# trigramは3文字未満の語を索引できないため、その場合はLIKEで絞り込む
+TRIGRAM_MIN_CHARS = 3
+
+# --------------------------------------------------------------------
+# 1. 検索インデックスクラス
+# --------------------------------------------------------------------
+class TranscriptIndex:
+    """発言・投票をゲーム・日・フェーズ・発言者ごとに全文検索できるよう索引化
+
+    カタログと同じデータベースに置くことで、配役（game_players）と結合して
+    「占い師ではない人が占い師COしたゲーム」のような検索ができる。
+    """
+
+    def __init__(self, db_path=CATALOG_PATH):
+        # カタログ側のテーブル（games / game_players）を先に用意しておく
+        GameCatalog(db_path).close()
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def add(self, game_id, day, phase, speaker, text):
+        """発言を1件追加（書き込みと同時に索引も更新される）"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO speeches (game_id, day, phase, speaker, text) VALUES (?, ?, ?, ?, ?)",
+                (game_id, day, phase, speaker, text),
+            )
+
+    def listener(self, game_id):
+        """WerewolfLoggerに登録するリスナーを作成"""
+        def on_event(event):
+            if event.get("type") == "speech" and event.get("phase") in INDEXED_PHASES:
+                self.add(game_id, event["day"], event["phase"], event["speaker"], event["text"])
+        return on_event
+
+    def search(self, query, mode=None, day=None, phase=None, speaker=None, role=None, exclude_role=None, limit=50):
+        """キーワードで発言を検索（role/exclude_roleは発言者の本当の役職で絞り込み）"""
+        terms = query.split()
+        long_terms = [t for t in terms if len(t) >= TRIGRAM_MIN_CHARS]
+        short_terms = [t for t in terms if len(t) < TRIGRAM_MIN_CHARS]
+
+        conditions = []
+        params = []
+        if long_terms:
+            # 各語をフレーズとして扱い、全語を含む発言をFTS5の索引で探す
+            match = " AND ".join('"' + t.replace('"', '""') + '"' for t in long_terms)
+            conditions.append("s.speech_id IN (SELECT rowid FROM speeches_fts WHERE speeches_fts MATCH ?)")
+            params.append(match)
+        for term in short_terms:
+            conditions.append("s.text LIKE ?")
+            params.append(f"%{term}%")
+        if mode:
+            conditions.append("g.mode = ?")
+            params.append(mode)
+        if day is not None:
+            conditions.append("s.day = ?")
+            params.append(day)
+        if phase:
+            conditions.append("s.phase = ?")
+            params.append(phase)
+        if speaker:
+            conditions.append("s.speaker = ?")
+            params.append(speaker)
+        if role:
+            conditions.append("p.role = ?")
+            params.append(role)
+        if exclude_role:
+            conditions.append("p.role != ?")
+            params.append(exclude_role)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"""
+            SELECT s.speech_id, s.game_id, g.mode, s.day, s.phase, s.speaker, p.role, s.text
+            FROM speeches s
+            JOIN games g ON g.game_id = s.game_id
+            LEFT JOIN game_players p ON p.game_id = s.game_id AND p.player = s.speaker
+            {where}
+            ORDER BY s.game_id DESC, s.speech_id
+            LIMIT ?
+        """
+        params.append(limit)
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def games_matching(self, query, **filters):
+        """条件に合う発言があったゲームIDの一覧"""
+        filters.setdefault("limit", 1000000)
+        return sorted({row["game_id"] for row in self.search(query, **filters)}, reverse=True)
+
+# --------------------------------------------------------------------
+# 2. コマンドライン
+# --------------------------------------------------------------------
+def main():
+    """発言検索（例: 1日目に占い師以外が占い師COしたゲーム）
+
+    python werewolf_search.py "占い師 CO" --day 1 --phase discussion --exclude-role fortune_teller
+    """
+    parser = argparse.ArgumentParser(description="人狼ゲームの発言・投票を全文検索")
+    parser.add_argument("query", help="検索語（スペース区切りでAND検索）")
+    parser.add_argument("--db", default=CATALOG_PATH)
+    parser.add_argument("--mode", choices=["open", "anonymous"])
+    parser.add_argument("--day", type=int)
+    parser.add_argument("--phase", choices=INDEXED_PHASES)
+    parser.add_argument("--speaker")
+    parser.add_argument("--role", help="発言者の本当の役職（werewolf, madman, fortune_teller, knight, citizen）")
+    parser.add_argument("--exclude-role", help="この役職以外の発言者に限定（騙りの検索など）")
+    parser.add_argument("--games-only", action="store_true", help="ゲームIDだけを表示")
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    index = TranscriptIndex(args.db)
+    filters = dict(
+        mode=args.mode, day=args.day, phase=args.phase, speaker=args.speaker,
+        role=args.role, exclude_role=args.exclude_role,
+    )
+
+    started = time.perf_counter()
+    if args.games_only:
+        game_ids = index.games_matching(args.query, **filters)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(" ".join(f"#{game_id}" for game_id in game_ids))
+        print(f"🔍 {len(game_ids)}ゲーム（{elapsed:.1f}ms）")
+    else:
+        rows = index.search(args.query, limit=args.limit, **filters)
+        elapsed = (time.perf_counter() - started) * 1000
+        for row in rows:
+            text = row["text"].replace("\n", " ")
+            if len(text) > 80:
+                text = text[:80] + "…"
+            print(f"#{row['game_id']} {row['day']}日目 {row['phase']} {row['speaker']}({row['role'] or '?'}): {text}")
+        print(f"🔍 {len(rows)}件（{elapsed:.1f}ms）")
+
+    index.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+# CrewAI人狼ゲーム - ローカル観戦サーバー（Server-Sent Events）
+import os
+import json
+import asyncio
+import threading
+import collections
+from urllib.parse import urlsplit, parse_qs
+from werewolf_config import env_number
+
+# 匿名モードでは答え合わせまで配信しないフェーズ
+SECRET_PHASES = ("werewolf_meeting", "night_action")
+
+CLIENT_QUEUE_SIZE = 1000
+KEEP_FINISHED_CHANNELS = 20
+
+VIEWER_HTML = """<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<title>🐺 人狼ゲーム観戦</title>
+<style>
+body { font-family: sans-serif; background: #111; color: #eee; margin: 0; }
+header { padding: 12px 16px; background: #222; position: sticky; top: 0; }
+pre { white-space: pre-wrap; padding: 16px; margin: 0; font-size: 15px; line-height: 1.6; }
+</style>
+</head>
+<body>
+<header>🐺 人狼ゲーム ライブ観戦 <span id="status">接続中...</span></header>
+<pre id="log"></pre>
+<script>
+const params = new URLSearchParams(location.search);
+const source = new EventSource("/events" + (params.get("game") ? "?game=" + params.get("game") : ""));
+const log = document.getElementById("log");
+const status = document.getElementById("status");
+source.onopen = () => { status.textContent = "🟢 観戦中"; };
+source.onerror = () => { status.textContent = "🔴 再接続中..."; };
+source.addEventListener("log", (e) => {
+  log.textContent += JSON.parse(e.data).message + "\\n";
+  window.scrollTo(0, document.body.scrollHeight);
+});
+source.addEventListener("end", () => { status.textContent = "🏁 ゲーム終了"; source.close(); });
+</script>
+</body>
+</html>
+"""
+
+# --------------------------------------------------------------------
+# 1. ゲームごとの配信チャンネル
+# --------------------------------------------------------------------
+class SpectatorChannel:
+    """1ゲーム分のイベントを観戦者に配信する
+
+    - publishはゲームループのスレッドから呼ばれ、ブロックしない（イベントループに渡すだけ）
+    - 直近のイベントをリングバッファに保持し、途中参加の観戦者に再送する
+    - secret=True（匿名モード）では夜のイベントを答え合わせ（reveal）まで保留する
+    """
+
+    def __init__(self, server, game_id, title, secret=False, buffer_size=2000):
+        self.server = server
+        self.game_id = game_id
+        self.title = title
+        self.secret = secret
+        self.revealed = not secret
+        self.finished = False
+        self.ring = collections.deque(maxlen=buffer_size)
+        self.held = []
+        self.clients = set()
+        self.seq = 0
+        self.dropped_clients = 0
+
+    # ---- ゲームループ側（任意のスレッド）から呼ぶ ----
+    def publish(self, event):
+        """イベントを配信（非ブロッキング）"""
+        self.server.call_soon(self._dispatch, event)
+
+    def listener(self):
+        """WerewolfLoggerに登録するリスナーを作成"""
+        return self.publish
+
+    def reveal(self):
+        """答え合わせ：保留していた夜のイベントを配信し、以降は制限なしで配信"""
+        self.server.call_soon(self._reveal)
+
+    def finish(self):
+        """ゲーム終了を通知"""
+        self.server.call_soon(self._finish)
+
+    # ---- 以下はイベントループのスレッドでのみ実行 ----
+    def _is_secret(self, event):
+        return event.get("secret") or event.get("phase") in SECRET_PHASES
+
+    def _dispatch(self, event):
+        if not self.revealed and self._is_secret(event):
+            self.held.append(event)
+            return
+        self._broadcast(event)
+
+    def _broadcast(self, event):
+        self.seq += 1
+        item = (self.seq, event)
+        self.ring.append(item)
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # 読み出しが遅い観戦者はゲームの足を引っ張らないよう切断する
+                self.clients.discard(queue)
+                self.dropped_clients += 1
+
+    def _reveal(self):
+        self.revealed = True
+        held, self.held = self.held, []
+        for event in held:
+            self._broadcast(event)
+
+    def _finish(self):
+        self._broadcast({"type": "end"})
+        self.finished = True
+
+    def subscribe(self, last_seq=0):
+        """観戦者を登録し、取りこぼし分（リングバッファ）と受信キューを返す"""
+        backlog = [item for item in self.ring if item[0] > last_seq]
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        if not self.finished:
+            self.clients.add(queue)
+        return backlog, queue
+
+    def unsubscribe(self, queue):
+        self.clients.discard(queue)
+
+# --------------------------------------------------------------------
+# 2. HTTPサーバー（asyncio、標準ライブラリのみ）
+# --------------------------------------------------------------------
+class SpectatorServer:
+    """複数ゲームの観戦チャンネルを1つのポートで配信するSSEサーバー
+
+    GET /                 観戦ページ（?game=ID で対象ゲームを指定）
+    GET /events?game=ID   イベントストリーム（省略時は最新のゲーム）
+    GET /games            配信中のゲーム一覧（JSON）
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765):
+        self.host = host
+        self.port = port
+        self.channels = {}
+        self.latest_game_id = None
+        self.loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="spectator-server", daemon=True)
+        self._server = None
+        self.error = None
+
+    def start(self):
+        """別スレッドでサーバーを起動し、待ち受け開始まで待つ"""
+        self._thread.start()
+        self._ready.wait(timeout=10)
+        if self.error:
+            raise self.error
+        return self
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self._server = self.loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        except OSError as e:
+            self.error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        self.loop.run_forever()
+
+    def call_soon(self, callback, *args):
+        """他スレッドからイベントループへ処理を渡す"""
+        if self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def open_channel(self, game_id, title, secret=False):
+        """ゲームの配信チャンネルを作成"""
+        channel = SpectatorChannel(self, game_id, title, secret=secret)
+        # 長時間稼働するワーカーでも増え続けないよう、終了済みのゲームは直近分だけ残す
+        finished = [gid for gid, c in self.channels.items() if c.finished]
+        for gid in finished[:-KEEP_FINISHED_CHANNELS]:
+            del self.channels[gid]
+        self.channels[game_id] = channel
+        self.latest_game_id = game_id
+        return channel
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1")
+                if line in ("\r\n", "\n", ""):
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            parts = request_line.split()
+            if len(parts) < 2 or parts[0] != "GET":
+                await self._respond(writer, "405 Method Not Allowed", "text/plain", b"")
+                return
+
+            url = urlsplit(parts[1])
+            query = parse_qs(url.query)
+            if url.path == "/":
+                await self._respond(writer, "200 OK", "text/html; charset=utf-8", VIEWER_HTML.encode("utf-8"))
+            elif url.path == "/games":
+                games = [
+                    {"game_id": c.game_id, "title": c.title, "finished": c.finished, "spectators": len(c.clients)}
+                    for c in self.channels.values()
+                ]
+                await self._respond(writer, "200 OK", "application/json", json.dumps(games, ensure_ascii=False).encode("utf-8"))
+            elif url.path == "/events":
+                game_id = query.get("game", [self.latest_game_id])[0]
+                channel = self.channels.get(int(game_id)) if game_id is not None and str(game_id).isdigit() else None
+                if channel is None:
+                    await self._respond(writer, "404 Not Found", "text/plain", "ゲームが見つかりません".encode("utf-8"))
+                    return
+                last_seq = int(headers.get("last-event-id", "0") or 0)
+                await self._stream(writer, channel, last_seq)
+            else:
+                await self._respond(writer, "404 Not Found", "text/plain", b"")
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, content_type, body):
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    async def _stream(self, writer, channel, last_seq):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+            b"Connection: keep-alive\r\nAccess-Control-Allow-Origin: *\r\n\r\nretry: 2000\n\n"
+        )
+        backlog, queue = channel.subscribe(last_seq)
+        try:
+            for item in backlog:
+                writer.write(self._format(item))
+            await writer.drain()
+            if channel.finished and queue not in channel.clients:
+                return
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # 接続維持のためのコメント行
+                    writer.write(b": ping\n\n")
+                    await writer.drain()
+                    if queue not in channel.clients:
+                        return
+                    continue
+                writer.write(self._format(item))
+                await writer.drain()
+                if item[1].get("type") == "end":
+                    return
+        finally:
+            channel.unsubscribe(queue)
+
+    def _format(self, item):
+        seq, event = item
+        kind = event.get("type", "log")
+        # 発言のイベントは発言ログのビュー（SpeechView）なので、送る直前に文字列にする
+        data = json.dumps(dict(event), ensure_ascii=False)
+        return f"id: {seq}\nevent: {kind}\ndata: {data}\n\n".encode("utf-8")
+
+    def stop(self):
+        """サーバーを停止"""
+        def shutdown():
+            if self._server:
+                self._server.close()
+            self.loop.stop()
+        if self._thread.is_alive():
+            self.call_soon(shutdown)
+            self._thread.join(timeout=5)
+
+# --------------------------------------------------------------------
+# 3. プロセス共通のサーバー
+# --------------------------------------------------------------------
+_server = None
+_server_lock = threading.Lock()
+
+def open_spectator_channel(game_id, title, secret=False):
+    """観戦サーバーが有効ならチャンネルを作成（無効ならNone）
+
+    環境変数:
+        WEREWOLF_SPECTATOR_PORT  待ち受けポート（既定: 0=無効）
+        WEREWOLF_SPECTATOR_HOST  待ち受けアドレス（既定: 127.0.0.1、Dockerでは0.0.0.0）
+    """
+    global _server
+    port = env_number("WEREWOLF_SPECTATOR_PORT", 0)
+    if not port:
+        return None
+
+    host = os.environ.get("WEREWOLF_SPECTATOR_HOST", "127.0.0.1")
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = SpectatorServer(host, port).start()
+            except OSError as e:
+                print(f"⚠️ 観戦サーバーを起動できません（{host}:{port}）: {e}")
+                return None
+            print(f"📺 観戦サーバー起動: http://{'localhost' if host in ('0.0.0.0', '127.0.0.1') else host}:{port}/")
+    return _server.open_channel(game_id, title, secret=secret)
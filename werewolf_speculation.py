@@ -0,0 +1,119 @@
+# CrewAI人狼ゲーム - 次の発言者の先読み生成（投機的実行）
+import time
+from werewolf_config import env_flag
+from werewolf_llm_guard import run_in_thread, clone_task
+
+# 修正依頼に載せる直前の発言の最大文字数
+PREVIOUS_SPEECH_MAX_CHARS = 300
+
+# --------------------------------------------------------------------
+# 1. 先読みクラス
+# --------------------------------------------------------------------
+class SpeculativeDiscussion:
+    """発言者kの生成中に、次の発言者k+1の発言を下書きしておく
+
+    kの発言が終わったら、kがk+1に言及しておらず情報整理表（CO・占い結果・投票）も変わっていなければ
+    下書きをそのまま採用する。そうでなければ、直前の発言を踏まえて下書きを直す短い呼び出しを行う。
+
+    環境変数:
+        WEREWOLF_SPECULATE  1で次の発言者の先読みを有効化（既定: 無効）
+    """
+
+    def __init__(self, guard, ledger_of, enabled=None):
+        self.enabled = env_flag("WEREWOLF_SPECULATE") if enabled is None else enabled
+        self.guard = guard
+        # 現在の情報整理表を返す関数（日ごとに作り直されても追従できるように）
+        self.ledger_of = ledger_of
+        self.tasks = []
+        self.speakers = []
+        self.inject = None
+        self.pending = None
+
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+        self.saved_seconds = 0.0
+
+    def _ledger_updates(self):
+        ledger = self.ledger_of()
+        return ledger.updates if ledger is not None else 0
+
+    def start_day(self, tasks, speakers, inject):
+        """その日の議論タスクと発言者（同じ順番）を登録"""
+        self.finish_day()
+        self.tasks = tasks
+        self.speakers = speakers
+        self.inject = inject
+
+    def prefetch(self, index):
+        """index番目の発言の下書きを別スレッドで開始（ボット席や範囲外は何もしない）"""
+        if not self.enabled or self.pending is not None or index >= len(self.tasks):
+            return
+        task, speaker = self.tasks[index], self.speakers[index]
+        if id(task.agent) in self.guard.bots:
+            return
+        self.inject(task, speaker)
+        finished = {}
+
+        def draft():
+            try:
+                return self.guard.kickoff(task, "discussion", verbose=False)
+            finally:
+                finished["at"] = time.perf_counter()
+
+        self.pending = {
+            "index": index,
+            "future": run_in_thread(draft),
+            "started": time.perf_counter(),
+            "finished": finished,
+            "ledger_updates": self._ledger_updates(),
+        }
+
+    def claim(self, index, previous_speaker, previous_text):
+        """index番目の発言を返す（下書きが無ければNone）。直前の発言と食い違えば修正してから返す
+
+        下書きがあった場合は、採用・修正より先に次の発言者（index+1）の下書きを始める。
+        """
+        if self.pending is None or self.pending["index"] != index:
+            return None
+        pending, self.pending = self.pending, None
+        self.prefetch(index + 1)
+        previous_finished = time.perf_counter()
+        draft = pending["future"].result()
+
+        speaker = self.speakers[index]
+        # ゲームマスターの発表は生存者全員の名前を読み上げるので、言及とはみなさない
+        mentioned = previous_speaker != 'game_master' and speaker in previous_text
+        ledger_changed = self._ledger_updates() != pending["ledger_updates"]
+        if not mentioned and not ledger_changed:
+            self.hits += 1
+            draft_finished = pending["finished"].get("at", previous_finished)
+            self.saved_seconds += max(0.0, min(draft_finished, previous_finished) - pending["started"])
+            return draft
+
+        self.misses += 1
+        task = self.tasks[index]
+        reason = "あなたへの言及" if mentioned else "新しいCO・占い結果・投票の情報"
+        revise_task = clone_task(task, description=f"""{task.description}
+
+        【直前の発言】{previous_speaker}: {previous_text[:PREVIOUS_SPEECH_MAX_CHARS]}
+        【あなたが用意していた発言の下書き】{draft}
+
+        直前の発言に{reason}が含まれています。下書きをもとに、直前の発言を踏まえた内容に直した発言だけを出力してください。
+        """)
+        return self.guard.kickoff(revise_task, "discussion", verbose=False)
+
+    def finish_day(self):
+        """使われなかった下書き（議論の早期終了など）を破棄"""
+        if self.pending is not None:
+            self.wasted += 1
+            self.pending = None
+
+    def format_report(self):
+        """先読みの命中率と短縮できた待ち時間"""
+        drafts = self.hits + self.misses
+        rate = self.hits / drafts if drafts else 0.0
+        return (
+            f"🔮 先読み: 命中 {self.hits}/{drafts}回（{rate:.0%}） | 修正 {self.misses}回 | 未使用 {self.wasted}回 | "
+            f"短縮した待ち時間 {self.saved_seconds:.1f}秒"
+        )
@@ -0,0 +1,183 @@
+# CrewAI人狼ゲーム - タスクの種類ごとの思考予算（thinking budget）
+import os
+import re
+import json
+import time
+import threading
+import collections
+from werewolf_config import env_flag
+from werewolf_llm_guard import clone_task
+from werewolf_llm_client import create_llm
+
+STATS_PATH = "warewolf_logs/thinking_stats.jsonl"
+
+# タスクの種類ごとの思考トークンの上限（0で思考なし）
+# 定型的な出力（GMの発表・形式の決まった投票）は思考なし、人狼の作戦会議には多めに割り当てる
+DEFAULT_THINKING_BUDGETS = {
+    'announcement': 0,
+    'vote': 0,
+    'bulk_vote': 512,
+    'night_action': 512,
+    'discussion': 1024,
+    'werewolf_meeting': 4096,
+}
+# 思考予算を指定できるモデル（LiteLLMが thinking を thinkingBudget に変換する）
+THINKING_MODEL_PATTERN = re.compile(r'gemini-2\.5')
+# 思考を止められないモデル（proは最小128トークン）
+MIN_THINKING_BUDGET = {'gemini-2.5-pro': 128}
+
+# --------------------------------------------------------------------
+# 1. 設定の読み込み
+# --------------------------------------------------------------------
+def parse_budgets(text):
+    """"vote=0,discussion=512" 形式の指定を {種類: トークン数} にする（不正な項目は無視）"""
+    budgets = {}
+    for item in (text or "").split(","):
+        kind, _, value = item.partition("=")
+        try:
+            budgets[kind.strip()] = max(0, int(value))
+        except ValueError:
+            continue
+    return budgets
+
+# --------------------------------------------------------------------
+# 2. 思考予算クラス
+# --------------------------------------------------------------------
+class ThinkingPolicy:
+    """タスクの種類に応じて、思考予算を設定したLLMでタスクを実行させる
+
+    種類ごとにLLMのコピー（thinking={"type": "enabled", "budget_tokens": N}）を1つずつ作り、
+    KickoffGuardが各タスクの実行前に差し替える。種類ごとの応答時間とトークン数を集計し、
+    思考予算を無効にして実行したゲーム（モデル任せの思考）の記録と比べた差分を表示する。
+
+    環境変数:
+        WEREWOLF_THINKING          0で思考予算を指定しない（モデル任せ。比較の基準になる）（既定: 有効）
+        WEREWOLF_THINKING_BUDGETS  種類ごとの上限の上書き（例: vote=0,discussion=512,werewolf_meeting=8192）
+    """
+
+    def __init__(self, llm, budgets=None, enabled=None, stats_path=STATS_PATH):
+        self.enabled = env_flag("WEREWOLF_THINKING", True) if enabled is None else enabled
+        self.budgets = dict(DEFAULT_THINKING_BUDGETS)
+        self.budgets.update(parse_budgets(os.environ.get("WEREWOLF_THINKING_BUDGETS")) if budgets is None else budgets)
+        self.llm = llm
+        self.model = str(getattr(llm, "model", ""))
+        # 思考予算を指定できないモデル（ローカルの互換サーバーなど）には何も渡さない
+        self.supported = bool(THINKING_MODEL_PATTERN.search(self.model))
+        self.stats_path = stats_path
+        self.guard = None
+        self._llms = {}
+        self.lock = threading.Lock()
+        self.latencies = collections.defaultdict(list)
+
+    @property
+    def active(self):
+        return self.enabled and self.supported
+
+    def attach(self, guard):
+        """KickoffGuardの各タスクの実行前に、種類に応じた思考予算のLLMへ差し替えさせる"""
+        self.guard = guard
+        guard.thinking = self
+
+    def budget_for(self, kind):
+        """種類ごとの思考トークンの上限（設定が無ければNone＝モデル任せ）"""
+        budget = self.budgets.get(kind)
+        if budget is None:
+            return None
+        minimum = next((value for name, value in MIN_THINKING_BUDGET.items() if name in self.model), 0)
+        return max(budget, minimum)
+
+    def llm_for(self, kind):
+        """思考予算を設定したLLMのコピー（種類ごとに1つだけ作る）"""
+        budget = self.budget_for(kind)
+        if budget is None:
+            return None
+        with self.lock:
+            if budget not in self._llms:
+                self._llms[budget] = create_llm(
+                    self.llm.model,
+                    temperature=self.llm.temperature,
+                    timeout=self.llm.timeout,
+                    thinking={"type": "enabled", "budget_tokens": budget},
+                )
+            return self._llms[budget]
+
+    def apply(self, task, kind):
+        """種類に応じた思考予算のLLMで実行するタスクを返す（対象外ならそのまま）"""
+        if not self.active or getattr(task.agent, "llm", None) is not self.llm:
+            return task
+        llm = self.llm_for(kind)
+        return clone_task(task, llm=llm) if llm is not None else task
+
+    def record(self, kind, seconds):
+        """応答が得られたタスクの所要時間（再試行・再質問を含む）を記録"""
+        with self.lock:
+            self.latencies[kind].append(seconds)
+
+    def summary(self):
+        """種類ごとの {回数, 平均秒, 平均トークン}"""
+        with self.lock:
+            latencies = {kind: list(values) for kind, values in self.latencies.items()}
+        summary = {}
+        for kind, values in latencies.items():
+            tokens = self.guard.stats[f"tokens:{kind}"] if self.guard else 0
+            summary[kind] = {
+                "count": len(values),
+                "seconds": round(sum(values) / len(values), 2),
+                "tokens": round(tokens / len(values)),
+            }
+        return summary
+
+    def load_baseline(self):
+        """同じモデルで思考予算を無効にして実行したゲームの、種類ごとの平均"""
+        if not os.path.exists(self.stats_path):
+            return {}
+        totals = collections.defaultdict(lambda: [0, 0.0, 0])
+        with open(self.stats_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("model") != self.model or record.get("thinking"):
+                    continue
+                for kind, stats in record.get("kinds", {}).items():
+                    totals[kind][0] += stats["count"]
+                    totals[kind][1] += stats["seconds"] * stats["count"]
+                    totals[kind][2] += stats["tokens"] * stats["count"]
+        return {
+            kind: {"seconds": seconds / count, "tokens": tokens / count}
+            for kind, (count, seconds, tokens) in totals.items() if count
+        }
+
+    def finish(self):
+        """このゲームの種類ごとの集計を記録ファイルに追記（次回以降の比較用）"""
+        summary = self.summary()
+        if not summary or not self.supported:
+            return
+        os.makedirs(os.path.dirname(self.stats_path), exist_ok=True)
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "model": self.model,
+            "thinking": self.active,
+            "budgets": self.budgets if self.active else None,
+            "kinds": summary,
+        }
+        with open(self.stats_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def format_report(self):
+        """種類ごとの思考予算・平均応答時間・平均トークン数（基準の記録があれば差分も）"""
+        summary = self.summary()
+        baseline = self.load_baseline() if self.active else {}
+        lines = [f"🧠 思考予算: {'有効' if self.active else '無効（モデル任せ）'}（{self.model}）"]
+        for kind, stats in summary.items():
+            budget = self.budget_for(kind) if self.active else None
+            line = (
+                f"  {kind}: 上限 {budget if budget is not None else '-'} | {stats['count']}回 | "
+                f"平均 {stats['seconds']:.1f}秒・{stats['tokens']}トークン"
+            )
+            base = baseline.get(kind)
+            if base:
+                line += f" | 基準との差 {stats['seconds'] - base['seconds']:+.1f}秒・{stats['tokens'] - base['tokens']:+.0f}トークン"
+            lines.append(line)
+        return "\n".join(lines)
@@ -0,0 +1,129 @@
+# CrewAI人狼ゲーム - タイムライン記録（Chrome Trace Event形式）
+import os
+import re
+import json
+import time
+import threading
+import contextlib
+from werewolf_config import env_flag
+
+TRACE_DIR = "warewolf_logs/traces"
+
+# 無効時に返す何もしないコンテキスト（呼び出しごとにオブジェクトを作らない）
+NULL_SPAN = contextlib.nullcontext()
+
+# --------------------------------------------------------------------
+# 1. スパン
+# --------------------------------------------------------------------
+class Span:
+    """開始から終了までを1つの完了イベント（ph: X）として記録する"""
+
+    def __init__(self, recorder, name, cat, args):
+        self.recorder = recorder
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = f"{exc_type.__name__}: {exc}"
+        self.recorder.add(self.name, self.cat, self.started, time.perf_counter(), self.args)
+        return False
+
+# --------------------------------------------------------------------
+# 2. タイムライン記録クラス
+# --------------------------------------------------------------------
+class TraceRecorder:
+    """フェーズ・LLM呼び出し・ログ書き込み・解析をスパンとして記録し、Chrome Trace Event JSONに書き出す
+
+    書き出したファイルは Perfetto（https://ui.perfetto.dev）や chrome://tracing で開ける。
+    スレッドごとに行が分かれるので、メインスレッドが何を待っているか（直列化している箇所）が見える。
+    無効時は span() が共有の空コンテキストを返すだけで、記録は行わない。
+
+    環境変数:
+        WEREWOLF_TRACE  1でタイムラインを記録し、ゲーム終了時に warewolf_logs/traces/ へ書き出す（既定: 無効）
+    """
+
+    def __init__(self, enabled=None, trace_dir=TRACE_DIR):
+        self.enabled = env_flag("WEREWOLF_TRACE") if enabled is None else enabled
+        self.trace_dir = trace_dir
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.events = []
+        self.thread_names = {}
+        self.phase_span = None
+
+    def add(self, name, cat, started, finished, args=None):
+        """完了したスパンを記録（時刻はゲーム開始からのマイクロ秒）"""
+        thread = threading.current_thread()
+        tid = threading.get_native_id()
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": round((started - self.origin) * 1e6, 1),
+            "dur": round((finished - started) * 1e6, 1),
+            "pid": self.pid,
+            "tid": tid,
+        }
+        if args:
+            event["args"] = args
+        with self.lock:
+            self.events.append(event)
+            self.thread_names.setdefault(tid, thread.name)
+
+    def span(self, name, cat="game", **args):
+        """with文で囲んだ区間を記録するコンテキスト"""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, cat, args)
+
+    def wrap(self, fn, name, cat="llm", **args):
+        """別スレッドで実行する関数を、そのスレッド上のスパンとして記録するようにする"""
+        if not self.enabled:
+            return fn
+
+        def traced(*a, **kw):
+            with Span(self, name, cat, dict(args)):
+                return fn(*a, **kw)
+        return traced
+
+    def phase(self, name):
+        """フェーズを切り替える（前のフェーズのスパンを閉じ、新しいフェーズを開始）"""
+        if not self.enabled:
+            return
+        self._end_phase()
+        self.phase_span = Span(self, name, "phase", {}).__enter__()
+
+    def _end_phase(self):
+        if self.phase_span is not None:
+            self.phase_span.__exit__(None, None, None)
+            self.phase_span = None
+
+    def finish(self, game_label=""):
+        """最後のフェーズを閉じて書き出し、ファイルのパスを返す（無効時はNone）"""
+        if not self.enabled:
+            return None
+        self._end_phase()
+        with self.lock:
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+
+        # スレッド名のメタデータ（メインスレッドを先頭に並べる）
+        metadata = [{"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0, "args": {"name": "人狼ゲーム"}}]
+        for tid, thread_name in thread_names.items():
+            metadata.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": f"{thread_name} ({tid})"}})
+            if thread_name == "MainThread":
+                metadata.append({"name": "thread_sort_index", "ph": "M", "pid": self.pid, "tid": tid, "args": {"sort_index": -1}})
+
+        os.makedirs(self.trace_dir, exist_ok=True)
+        label = re.sub(r'[^\w.-]', '_', os.path.splitext(os.path.basename(game_label))[0]) or "game"
+        path = os.path.join(self.trace_dir, f"{label}.trace.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + sorted(events, key=lambda e: e["ts"]), "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        return path
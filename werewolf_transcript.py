@@ -0,0 +1,357 @@
+# CrewAI人狼ゲーム - ゲームごとの省メモリな発言ログ（UTF-8バッファ＋索引、文字列ではなくビューを渡す）
+import sys
+import random
+import argparse
+import threading
+import tracemalloc
+import collections
+import collections.abc
+import numpy as np
+
+# 1つのバッファ（チャンク）の大きさ。確保後は大きさを変えないので、渡したmemoryviewが無効にならない
+CHUNK_SIZE = 4 * 1024
+# 発言1件分の索引（どのチャンクの何バイト目から何バイトか・日・発言者・フェーズ・ラベル・渡したビューの数）
+ENTRY_DTYPE = np.dtype([
+    ("chunk", np.uint16),
+    ("offset", np.uint32),
+    ("length", np.uint32),
+    ("day", np.uint16),
+    ("speaker", np.uint16),
+    ("phase", np.uint8),
+    ("label", np.uint8),
+    ("views", np.uint32),
+])
+INITIAL_ENTRIES = 64
+# 保持期間を過ぎて本文を破棄した発言のビューが返す文字列
+TRIMMED_TEXT = "（保持期間を過ぎた発言）"
+
+# --------------------------------------------------------------------
+# 1. 発言のビュー
+# --------------------------------------------------------------------
+class SpeechView(collections.abc.Mapping):
+    """発言ログの1件を指す軽量なビュー（文字列のコピーを持たない）
+
+    WerewolfLoggerのイベント（dict）と同じように読める読み取り専用のマッピングで、
+    値を読んだときに初めてバッファから文字列を作る。kind で読めるイベントを切り替える:
+        "speech"  {"type", "day", "phase", "speaker", "display_name", "text"}
+        "log"     {"type", "message"}（ログ1行分。"\\n表示名ラベル: 発言"）
+    """
+
+    __slots__ = ("store", "index", "kind")
+
+    KEYS = {
+        "speech": ("type", "day", "phase", "speaker", "display_name", "text"),
+        "log": ("type", "message"),
+    }
+
+    def __init__(self, store, index, kind="speech"):
+        self.store = store
+        self.index = index
+        self.kind = kind
+        store.hold(index)
+
+    def __del__(self):
+        self.store.release(self.index)
+
+    def __getitem__(self, key):
+        if key not in self.KEYS[self.kind]:
+            raise KeyError(key)
+        return self.store.field(self.index, key) if key != "type" else self.kind
+
+    def __iter__(self):
+        return iter(self.KEYS[self.kind])
+
+    def __len__(self):
+        return len(self.KEYS[self.kind])
+
+    def __str__(self):
+        return self["text" if self.kind == "speech" else "message"]
+
+    def __repr__(self):
+        return f"SpeechView({self.index}, {self.kind!r})"
+
+    @property
+    def log(self):
+        """同じ発言のログ1行分のビュー"""
+        return SpeechView(self.store, self.index, "log")
+
+    @property
+    def raw(self):
+        """記録したままの発言のUTF-8バイト列（memoryview、コピーなし）"""
+        return self.store.raw(self.index)
+
+# --------------------------------------------------------------------
+# 2. 発言ログ
+# --------------------------------------------------------------------
+class TranscriptStore:
+    """1ゲーム分の発言をUTF-8のバッファ1つと索引の配列にまとめて保持する
+
+    観戦サーバーのリングバッファ（途中参加の観戦者への再送用）には、発言のイベントとログ1行分の
+    イベントがdictと文字列のまま残っていた。ここでは本文をUTF-8で1回だけバッファに書き込み
+    （同じ本文は1つにまとめる）、発言者・表示名・フェーズ・ラベルは番号にして索引（numpyの構造化配列）に持つ。
+    リスナーや観戦サーバーにはイベントとして SpeechView を渡し、文字列は読まれたときに作る。
+    保持期間（MemoryMonitorに register して trim_before）を過ぎた日の本文は破棄するが、
+    まだどこかが持っているビューの発言は破棄しない。
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.chunks = []
+        # チャンクごとの最後に書き込んだ発言の日（保持期間を過ぎたチャンクを見分ける）
+        self.chunk_days = []
+        self.used = 0
+        self.entries = np.zeros(INITIAL_ENTRIES, dtype=ENTRY_DTYPE)
+        self.count = 0
+        # これより前の発言は本文を破棄済み（trim_before）。索引の行は番号を変えないよう残す
+        self.first = 0
+        # 発言者（名前と表示名の組）・フェーズ・ラベルの番号づけ
+        self.speakers = []
+        self.phases = []
+        self.labels = []
+        self._speaker_codes = {}
+        self._phase_codes = {}
+        self._label_codes = {}
+        # 本文のハッシュ → 同じ本文を最初に書き込んだ発言の番号
+        self._interned = {}
+        # ビューの破棄（__del__）は記録中の同じスレッドで起きることがあるので、再入できるロックにする
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (SpeechView(self, i) for i in range(self.count))
+
+    def _code(self, table, codes, value, dtype):
+        """値に番号を付ける（初めての値は表に追加）"""
+        code = codes.get(value)
+        if code is None:
+            if len(table) > np.iinfo(dtype).max:
+                raise ValueError(f"発言ログの種類が多すぎます: {value}")
+            code = codes[value] = len(table)
+            table.append(value)
+        return code
+
+    def _write(self, data, day):
+        """本文をバッファに書き込み、(チャンク番号, 開始位置) を返す"""
+        if not self.chunks or self.chunks[-1] is None or self.used + len(data) > len(self.chunks[-1]):
+            # 1チャンクに収まらない長い発言は専用のチャンクに置く
+            self.chunks.append(bytearray(max(self.chunk_size, len(data))))
+            self.chunk_days.append(day)
+            self.used = 0
+        chunk, offset = len(self.chunks) - 1, self.used
+        self.chunks[chunk][offset:offset + len(data)] = data
+        self.chunk_days[chunk] = max(self.chunk_days[chunk], day)
+        self.used += len(data)
+        return chunk, offset
+
+    def add(self, day, phase, speaker, display_name, text, label=""):
+        """発言を1件記録し、その発言の SpeechView を返す"""
+        data = str(text).encode("utf-8")
+        with self.lock:
+            if self.count == len(self.entries):
+                self.entries = np.concatenate([self.entries, np.zeros(len(self.entries), dtype=ENTRY_DTYPE)])
+            key = hash(data)
+            same = self._interned.get(key)
+            if same is not None and self._raw(same) == data:
+                chunk, offset = int(self.entries[same]["chunk"]), int(self.entries[same]["offset"])
+            else:
+                chunk, offset = self._write(data, day)
+                self._interned.setdefault(key, self.count)
+            self.entries[self.count] = (
+                chunk, offset, len(data), day,
+                self._code(self.speakers, self._speaker_codes, (speaker, display_name), np.uint16),
+                self._code(self.phases, self._phase_codes, phase, np.uint8),
+                self._code(self.labels, self._label_codes, label, np.uint8),
+                0,
+            )
+            index = self.count
+            self.count += 1
+        return SpeechView(self, index)
+
+    def trim_before(self, day):
+        """指定日より前の発言の本文を破棄（MemoryMonitorの保持期間に合わせて呼ばれる）
+
+        指定日より前の発言だけを書き込んだチャンクを手放す。同じ本文をまとめたために
+        そのチャンクを指している残りの発言は、本文を今のチャンクへ書き直してから手放す。
+        まだ持たれているビューがあれば、そのうち最も古い発言から後は残す。
+        破棄した後に作ったビューは日・発言者などは読めるが、本文は TRIMMED_TEXT になる。
+        """
+        with self.lock:
+            later = np.flatnonzero(self.entries["day"][self.first:self.count] >= day)
+            first = self.first + int(later[0]) if len(later) else self.count
+            held = np.flatnonzero(self.entries["views"][self.first:first])
+            if len(held):
+                first = self.first + int(held[0])
+            if first <= self.first:
+                return
+            self.first = first
+            # 書き込み中のチャンクは、残る発言が無ければ手放す（次の発言で新しく確保する）
+            current = len(self.chunks) - 1 if first < self.count else None
+            expired = {
+                i for i, chunk in enumerate(self.chunks)
+                if chunk is not None and i != current and self.chunk_days[i] < day
+            }
+            moved = {}
+            for i in range(first, self.count):
+                entry = self.entries[i]
+                chunk, offset, length = int(entry["chunk"]), int(entry["offset"]), int(entry["length"])
+                if chunk not in expired:
+                    continue
+                if (chunk, offset) not in moved:
+                    data = bytes(self.chunks[chunk][offset:offset + length])
+                    moved[chunk, offset] = self._write(data, int(entry["day"]))
+                entry["chunk"], entry["offset"] = moved[chunk, offset]
+            for i in expired:
+                self.chunks[i] = None
+            self._interned = {key: i for key, i in self._interned.items() if i >= first}
+
+    def hold(self, index):
+        """ビューを渡した発言を数える（観戦サーバーのリングバッファなどが持っている間は本文を破棄しない）"""
+        with self.lock:
+            self.entries[index]["views"] += 1
+
+    def release(self, index):
+        with self.lock:
+            self.entries[index]["views"] -= 1
+
+    def _raw(self, index):
+        entry = self.entries[index]
+        offset = int(entry["offset"])
+        return memoryview(self.chunks[entry["chunk"]])[offset:offset + int(entry["length"])]
+
+    def raw(self, index):
+        """記録したままの発言のUTF-8バイト列（memoryview、コピーなし）"""
+        with self.lock:
+            return self._raw(index)
+
+    def text(self, index):
+        if index < self.first:
+            return TRIMMED_TEXT
+        return str(self.raw(index), "utf-8")
+
+    def field(self, index, key):
+        """SpeechViewの各項目の値を作る"""
+        entry = self.entries[index]
+        if key == "text":
+            return self.text(index)
+        if key == "message":
+            _, display_name = self.speakers[entry["speaker"]]
+            return f"\n{display_name}{self.labels[entry['label']]}: {self.text(index)}"
+        if key == "day":
+            return int(entry["day"])
+        if key == "phase":
+            return self.phases[entry["phase"]]
+        if key == "speaker":
+            return self.speakers[entry["speaker"]][0]
+        if key == "display_name":
+            return self.speakers[entry["speaker"]][1]
+        raise KeyError(key)
+
+    @property
+    def nbytes(self):
+        """確保しているバッファと索引の大きさ（バイト）"""
+        return sum(len(chunk) for chunk in self.chunks if chunk is not None) + self.entries.nbytes
+
+    @property
+    def used_bytes(self):
+        """バッファのうち書き込み済みの部分と、使用中の索引の大きさ（バイト）"""
+        if not self.chunks:
+            return 0
+        written = sum(len(chunk) for chunk in self.chunks[:-1] if chunk is not None)
+        written += self.used if self.chunks[-1] is not None else 0
+        return written + self.count * ENTRY_DTYPE.itemsize
+
+    def format_report(self):
+        """発言ログの件数とメモリ使用量"""
+        unique = len({(int(e["chunk"]), int(e["offset"])) for e in self.entries[self.first:self.count]})
+        return (
+            f"🗜️ 発言ログ: {self.count}件（保持中 {self.count - self.first}件・本文 {unique}種類） | "
+            f"バッファ＋索引 {self.nbytes / 1024:.1f}KB（書き込み済み {self.used_bytes / 1024:.1f}KB）"
+        )
+
+# --------------------------------------------------------------------
+# 3. メモリ比較（観戦サーバーのリングバッファが保持していたものとの比較）
+# --------------------------------------------------------------------
+SAMPLE_SENTENCES = [
+    "私は{name}さんが怪しいと思います。",
+    "昨日の発言と投票先が食い違っています。",
+    "占い師COします。昨夜{name}さんを占った結果は人間でした。",
+    "まだ決めつけるのは早いと思うので、もう少し話を聞きたいです。",
+    "{name}さんの意見に賛成です。",
+    "発言が少なく、議論を避けているように見えます。",
+    "今日は占い師の真贋をはっきりさせたいです。",
+    "昨夜の護衛が成功した可能性も考えるべきだと思います。",
+]
+SPEAKERS = 9
+
+def sample_speech(rng, day, turn):
+    """議論・投票の発言らしい文字列（思考過程を除去した後の長さを想定）"""
+    name = f"プレイヤー{rng.randrange(SPEAKERS) + 1}"
+    if turn >= SPEAKERS:
+        return f"【投票】{name}に投票します。理由: " + rng.choice(SAMPLE_SENTENCES).format(name=name)
+    count = rng.randint(3, 6)
+    return f"{day}日目、" + "".join(rng.choice(SAMPLE_SENTENCES).format(name=name) for _ in range(count))
+
+def play(games, days, retention_days, ring_size, store):
+    """games個のゲームの発言を観戦サーバーのリングバッファに流し、ゲーム終了時点で保持されているものを返す
+
+    変更前（store=False）はリングバッファにdictと文字列のイベントが残る。変更後（store=True）は
+    リングバッファにはビューが残り、TranscriptStore が保持期間分とビューが指している発言の本文を持つ。
+    """
+    rng = random.Random(0)
+    kept = []
+    for _ in range(games):
+        transcript = TranscriptStore() if store else None
+        ring = collections.deque(maxlen=ring_size)
+        for day in range(1, days + 1):
+            for turn in range(SPEAKERS * 2):
+                phase = "discussion" if turn < SPEAKERS else "vote"
+                label = "" if turn < SPEAKERS else "の投票"
+                speaker = f"player{turn % SPEAKERS + 1}"
+                display_name = f"👤プレイヤー{turn % SPEAKERS + 1}さん"
+                text = sample_speech(rng, day, turn)
+                if store:
+                    speech = transcript.add(day, phase, speaker, display_name, text, label)
+                    events = (speech.log, speech)
+                else:
+                    events = (
+                        {"type": "log", "message": f"\n{display_name}{label}: {text}"},
+                        {"type": "speech", "day": day, "phase": phase, "speaker": speaker,
+                         "display_name": display_name, "text": text},
+                    )
+                ring.extend((len(ring), event) for event in events)
+            if store:
+                transcript.trim_before(day - retention_days + 1)
+        kept.append((transcript, ring))
+    return kept
+
+def measure(games, days, retention_days, ring_size, store):
+    """ゲーム終了時点で保持しているメモリ（tracemallocで計測、バイト）"""
+    tracemalloc.start()
+    kept = play(games, days, retention_days, ring_size, store)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current
+
+def main():
+    """観戦中のゲームが保持するもの（リングバッファのdictと文字列）と TranscriptStore の比較"""
+    parser = argparse.ArgumentParser(description="観戦中のゲームの発言の保持に使うメモリの比較（多数のゲームを1プロセスで保持）")
+    parser.add_argument("--games", type=int, default=300, help="同時に保持するゲーム数")
+    parser.add_argument("--days", type=int, default=5, help="1ゲームの日数（1日に9人の発言と9票）")
+    parser.add_argument("--retention-days", type=int, default=2, help="発言ログの保持日数（WEREWOLF_MEMORY_RETENTION_DAYS）")
+    parser.add_argument("--ring-size", type=int, default=2000, help="観戦サーバーのリングバッファの件数")
+    args = parser.parse_args()
+
+    print(
+        f"🗜️ 観戦中の発言の保持: {args.games}ゲーム × {args.days}日"
+        f"（1日{SPEAKERS * 2}件・保持 {args.retention_days}日・リングバッファ {args.ring_size}件）"
+    )
+    before = measure(args.games, args.days, args.retention_days, args.ring_size, store=False)
+    after = measure(args.games, args.days, args.retention_days, args.ring_size, store=True)
+    print(f"  変更前 {before / args.games / 1024:.1f}KB/ゲーム | TranscriptStore {after / args.games / 1024:.1f}KB/ゲーム")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
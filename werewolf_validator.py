@@ -0,0 +1,219 @@
+# CrewAI人狼ゲーム - 出力の検証と手元での修復
+import re
+import difflib
+import collections
+from werewolf_config import env_number
+from werewolf_ledger import find_player
+
+JAPANESE_CHAR = re.compile(r'[\u3040-\u30ff\u3400-\u9fff]')
+# 空白を含む英語の文（思考過程や英語の言い訳）。プレイヤー名（werewolf1など）は空白を含まないので残る
+ENGLISH_RUN = re.compile(r"[A-Za-z][A-Za-z0-9'’,.:;!?()\- ]*\s[A-Za-z0-9'’,.:;!?()\- ]*[A-Za-z.!?]")
+REASONING_PREFIX = re.compile(r'^\s*(?:Thought|Final Answer|Agent Final Answer|Action|Observation)\s*:\s*', re.IGNORECASE)
+
+# タスク説明文から読み取る制約
+LENGTH_PATTERN = re.compile(r'(\d+)\s*[-〜~]\s*(\d+)\s*文字程度')
+FORMAT_PATTERN = re.compile(r'【(投票|占い|調査|護衛|保護)】○○')
+CANDIDATES_PATTERN = re.compile(r'^\s*(?:投票候補者|現在の生存者|生存者)\s*:\s*(.+)$', re.MULTILINE)
+
+# 形式ごとの動詞（【投票】○○に投票します。など）
+FORMAT_VERBS = {'投票': 'に投票します', '占い': 'を占います', '調査': 'を調査します', '護衛': 'を護衛します', '保護': 'を保護します'}
+TARGET_PATTERN = re.compile(r'【(投票|占い|調査|護衛|保護)】\s*(.+?)\s*(?:さん)?\s*(?:に投票|を占|を調査|を護衛|を保護|を守)')
+
+# 長さの許容幅（指定範囲に対して）
+TOO_SHORT_RATIO = 0.3
+TOO_LONG_RATIO = 1.5
+MAX_ENGLISH_RATIO = 0.3
+
+# --------------------------------------------------------------------
+# 1. タスクごとの出力仕様
+# --------------------------------------------------------------------
+class OutputSpec:
+    """1つのタスクに求められる出力の制約（説明文から読み取る）"""
+
+    def __init__(self, kind, min_chars=None, max_chars=None, tag=None, candidates=()):
+        self.kind = kind
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.tag = tag
+        self.candidates = list(candidates)
+
+    @classmethod
+    def from_task(cls, task, kind):
+        """タスクの説明文から文字数・形式・対象候補を読み取る"""
+        description = task.description
+        min_chars = max_chars = None
+        lengths = LENGTH_PATTERN.findall(description)
+        if lengths:
+            # 最後の指定が全体の文字数（投票の「理由：150文字程度」より後に書かれている）
+            min_chars, max_chars = (int(v) for v in lengths[-1])
+
+        tag_match = FORMAT_PATTERN.search(description)
+        tag = tag_match.group(1) if tag_match else None
+
+        # 候補者名は形式の対象チェックに加え、英字の割合の計算からも除外するのに使う
+        candidates = []
+        candidates_match = CANDIDATES_PATTERN.search(description)
+        if candidates_match:
+            candidates = [name.strip() for name in candidates_match.group(1).split(',') if name.strip()]
+        return cls(kind, min_chars, max_chars, tag, candidates)
+
+# --------------------------------------------------------------------
+# 2. 検証・修復関数
+# --------------------------------------------------------------------
+def count_chars(text):
+    """空白・改行を除いた文字数"""
+    return len(re.sub(r'\s', '', text))
+
+def english_ratio(text, candidates=()):
+    """英字の割合（プレイヤー名と、誤字のあるプレイヤー名は除外）"""
+    for name in candidates:
+        text = text.replace(name, '')
+    if candidates:
+        text = re.sub(r'[A-Za-z][A-Za-z0-9_]*', lambda m: '' if snap_name(m.group(), candidates) else m.group(), text)
+    total = count_chars(text)
+    if not total:
+        return 0.0
+    return len(re.findall(r'[A-Za-z]', text)) / total
+
+def strip_english(text):
+    """思考過程の見出しと英語だけの行・英文を取り除く"""
+    lines = []
+    for line in text.split('\n'):
+        line = REASONING_PREFIX.sub('', line).strip()
+        if not line or not JAPANESE_CHAR.search(line):
+            continue
+        line = ENGLISH_RUN.sub('', line).strip()
+        if line:
+            lines.append(line)
+    return '\n'.join(lines)
+
+def snap_name(name, candidates):
+    """表記揺れ・誤字のある名前を最も近い候補者名に寄せる（近い候補が無ければNone）"""
+    name = name.strip().strip('「」『』"\'').removesuffix('さん')
+    if name in candidates:
+        return name
+    lowered = {candidate.lower(): candidate for candidate in candidates}
+    if name.lower() in lowered:
+        return lowered[name.lower()]
+    match = difflib.get_close_matches(name.lower(), list(lowered), n=1, cutoff=0.5)
+    return lowered[match[0]] if match else None
+
+def truncate(text, max_chars):
+    """文の区切りで指定文字数以内に切り詰める（1行目の形式行は必ず残す）"""
+    if count_chars(text) <= max_chars:
+        return text
+    sentences = re.findall(r'[^。！？!?\n]*[。！？!?\n]|[^。！？!?\n]+$', text)
+    kept = ''
+    for sentence in sentences:
+        if kept and count_chars(kept + sentence) > max_chars:
+            break
+        kept += sentence
+    return kept.strip()
+
+# --------------------------------------------------------------------
+# 3. 出力検証クラス
+# --------------------------------------------------------------------
+class OutputValidator:
+    """タスクの種類ごとに出力を検証し、手元で直せるものは直す
+
+    - 文字種: 英語の思考過程や英文を取り除く
+    - 形式: 【投票】などの形式行が無ければ、本文中の候補者名から補う
+    - 対象: 生存者にいない名前は最も近い生存者名に寄せる
+    - 長さ: 長すぎる出力は文の区切りで切り詰める
+    直せない場合（日本語がほぼ無い・対象が特定できない・短すぎる）だけ再質問する。
+
+    環境変数:
+        WEREWOLF_VALIDATE_REASKS  直せない出力を再質問する回数（既定: 1、0で再質問しない）
+    """
+
+    def __init__(self, reasks=None):
+        self.reasks = env_number("WEREWOLF_VALIDATE_REASKS", 1) if reasks is None else reasks
+        self.stats = collections.defaultdict(collections.Counter)
+
+    def check(self, spec, text):
+        """出力を検証・修復し、(修復後の文字列, 修復内容のリスト, 直せなかった問題のリスト)を返す"""
+        repairs = []
+        problems = []
+
+        # 1. 文字種
+        cleaned = strip_english(text)
+        if cleaned != text.strip():
+            repairs.append("英語除去")
+        if not cleaned or english_ratio(cleaned, spec.candidates) > MAX_ENGLISH_RATIO:
+            problems.append("日本語で書かれていません")
+            return cleaned, repairs, problems
+
+        # 2. 形式と対象
+        if spec.tag:
+            verb = FORMAT_VERBS[spec.tag]
+            match = TARGET_PATTERN.search(cleaned)
+            if match:
+                written = match.group(2)
+                target = find_player(written, spec.candidates) or snap_name(written, spec.candidates)
+                if target is None:
+                    problems.append(f"{written}は生存者にいません")
+                elif target != written:
+                    cleaned = cleaned[:match.start(2)] + target + cleaned[match.end(2):]
+                    repairs.append("名前補正")
+            else:
+                target = find_player(cleaned, spec.candidates)
+                if target is None:
+                    problems.append(f"【{spec.tag}】の形式で対象が書かれていません")
+                else:
+                    cleaned = f"【{spec.tag}】{target}{verb}。\n{cleaned}"
+                    repairs.append("形式補完")
+
+        # 3. 長さ
+        if spec.max_chars and count_chars(cleaned) > spec.max_chars * TOO_LONG_RATIO:
+            cleaned = truncate(cleaned, spec.max_chars)
+            repairs.append("切り詰め")
+        if spec.min_chars and count_chars(cleaned) < spec.min_chars * TOO_SHORT_RATIO:
+            problems.append(f"{spec.min_chars}文字程度以上で書かれていません")
+
+        return cleaned, repairs, problems
+
+    def reask_description(self, task, problems):
+        """再質問用の説明文（元の指示に問題点を追記）"""
+        return (
+            f"{task.description}\n\n"
+            f"            ★前回の出力は次の点で指示に従っていませんでした: {'、'.join(problems)}。\n"
+            f"            指示の形式・文字数・日本語のみを守って、もう一度出力してください。"
+        )
+
+    def record(self, kind, repairs, problems, reasked):
+        """統計を記録"""
+        stats = self.stats[kind]
+        stats["outputs"] += 1
+        if repairs:
+            stats["repaired"] += 1
+        for repair in repairs:
+            stats[repair] += 1
+        if reasked:
+            stats["reasked"] += 1
+        if problems:
+            stats["unresolved"] += 1
+
+    def format_report(self):
+        """タスクの種類ごとの修復率・再質問率"""
+        lines = [
+            "🧹 出力検証レポート",
+            "| 種類 | 出力数 | 修復率 | 再質問率 | 未解決 | 内訳 |",
+            "|---|---|---|---|---|---|",
+        ]
+        totals = collections.Counter()
+        for kind, stats in self.stats.items():
+            totals.update(stats)
+            lines.append(self._format_row(kind, stats))
+        if len(self.stats) > 1:
+            lines.append(self._format_row("合計", totals))
+        return "\n".join(lines)
+
+    def _format_row(self, kind, stats):
+        outputs = stats["outputs"] or 1
+        breakdown = ", ".join(
+            f"{name}{stats[name]}" for name in ("英語除去", "名前補正", "形式補完", "切り詰め") if stats[name]
+        ) or "-"
+        return (
+            f"| {kind} | {stats['outputs']} | {stats['repaired'] / outputs:.0%} | "
+            f"{stats['reasked'] / outputs:.0%} | {stats['unresolved']} | {breakdown} |"
+        )